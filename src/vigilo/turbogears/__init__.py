@@ -12,6 +12,7 @@ from paste.deploy import loadapp as deploy_loader
 from ConfigParser import SafeConfigParser
 from logging.config import fileConfig
 from tg import config
+from paste.deploy.converters import asbool
 from vigilo.turbogears.app_cfg import VigiloAppConfig
 
 __all__ = ['populate_db', 'VigiloAppConfig', 'loadapp']
@@ -28,7 +29,14 @@ def populate_db():
     # Cette méthode se contente d'appeler le websetup du modèle
     # en réutilisant la configuration de l'application déjà chargée.
     from vigilo.models import websetup
-    return websetup.populate_db(engine)
+    result = websetup.populate_db(engine)
+
+    # Index trigrammes accélérant les recherches de l'auto-compléteur
+    # (uniquement sous PostgreSQL).
+    if asbool(config.get('autocomplete_trigram', False)):
+        from vigilo.turbogears.trigram import create_trigram_indexes
+        create_trigram_indexes(engine)
+    return result
 
 def loadapp(ini_file):
     """
@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Contexte de contrôle d'accès associé à la requête en cours.
+
+Les informations nécessaires au contrôle d'accès (utilisateur courant,
+statut de "manager", groupes accessibles) sont calculées au plus une fois
+par requête, puis partagées par l'ensemble des contrôleurs et fonctions
+qui en ont besoin.
+
+Les identifiants des groupes accessibles sont en outre conservés d'une
+requête à l'autre dans un cache du processus, pendant une courte durée.
+Les entrées de ce cache sont associées à un numéro de version, que les
+écrans d'administration modifient (cf. L{bump_acl_version}) lorsque des
+groupes ou des permissions changent.
+"""
+
+import os
+import time
+import uuid
+import hashlib
+import threading
+import logging
+
+import transaction
+from tg import request, config
+from sqlalchemy.sql.expression import select, union
+
+from vigilo.models.tables import Host, LowLevelService
+from vigilo.models.tables.secondary_tables import SUPITEM_GROUP_TABLE
+
+from vigilo.turbogears.helpers import get_current_user
+from vigilo.turbogears.cache import TTLCache
+
+__all__ = ('AclContext', 'get_acl_context', 'bump_acl_version',
+           'bump_acl_version_on_commit', 'visible_hosts_filter',
+           'visible_services_filter', )
+
+LOGGER = logging.getLogger(__name__)
+
+# Clé sous laquelle le contexte est stocké dans l'environnement WSGI.
+ENVIRON_KEY = 'vigilo.turbogears.acl'
+
+# Cache des groupes accessibles aux utilisateurs, partagé
+# par les requêtes du processus (cf. _get_acl_cache).
+_ACL_CACHE = None
+_ACL_CACHE_LOCK = threading.Lock()
+
+# Version locale des droits d'accès, incrémentée par bump_acl_version().
+_ACL_VERSION = [0]
+
+# Dernière version lue dans le fichier partagé (acl_cache_stamp)
+# et date de cette lecture (cf. get_acl_version).
+_ACL_STAMP = [None, None]
+
+
+def _get_acl_cache():
+    """
+    Retourne le cache des groupes accessibles aux utilisateurs,
+    en le créant si nécessaire à partir de la configuration.
+
+    Options de configuration reconnues :
+     -  acl_cache_ttl : durée de validité (en secondes) des entrées
+        du cache (30 par défaut, 0 pour désactiver le cache).
+     -  acl_cache_size : nombre maximal d'utilisateurs dans le cache
+        (1000 par défaut).
+     -  acl_cache_stamp : emplacement d'un fichier partagé par l'ensemble
+        des processus de l'application, contenant la version courante
+        des droits d'accès. Sans ce fichier, une modification des droits
+        n'invalide que le cache du processus qui l'a effectuée ; les autres
+        processus attendent l'expiration de leurs entrées.
+     -  acl_cache_stamp_interval : délai (en secondes) entre deux lectures
+        du fichier acl_cache_stamp (1 par défaut).
+
+    @return: Cache ou C{None} si le cache est désactivé.
+    @rtype: L{TTLCache}
+    """
+    global _ACL_CACHE # pylint: disable-msg=W0603
+    with _ACL_CACHE_LOCK:
+        if _ACL_CACHE is None:
+            ttl = int(config.get('acl_cache_ttl', 30))
+            if ttl <= 0:
+                return None
+            _ACL_CACHE = TTLCache(ttl, int(config.get('acl_cache_size', 1000)))
+        return _ACL_CACHE
+
+def get_acl_version():
+    """
+    Retourne la version courante des droits d'accès.
+
+    Le fichier partagé (option acl_cache_stamp) est relu au plus une fois
+    toutes les acl_cache_stamp_interval secondes : une modification
+    des droits effectuée par un autre processus est donc prise en compte
+    au plus tard après ce délai. Celles du processus courant le sont
+    immédiatement.
+
+    @return: Version des droits d'accès.
+    @rtype: C{tuple}
+    """
+    path = config.get('acl_cache_stamp')
+    if not path:
+        return (_ACL_VERSION[0], None)
+    interval = float(config.get('acl_cache_stamp_interval', 1))
+    now = time.time()
+    with _ACL_CACHE_LOCK:
+        checked = _ACL_STAMP[1]
+        if checked is not None and 0 <= now - checked < interval:
+            return (_ACL_VERSION[0], _ACL_STAMP[0])
+    stamp = None
+    try:
+        with open(path, 'rb') as stamp_file:
+            stamp = stamp_file.read()
+    except IOError:
+        pass
+    with _ACL_CACHE_LOCK:
+        _ACL_STAMP[:] = [stamp, now]
+    return (_ACL_VERSION[0], stamp)
+
+def bump_acl_version():
+    """
+    Signale une modification des groupes ou des permissions.
+    Les droits d'accès mis en cache jusque-là sont ignorés
+    par les requêtes suivantes.
+    """
+    with _ACL_CACHE_LOCK:
+        _ACL_VERSION[0] += 1
+        # Le fichier partagé sera relu lors du prochain appel
+        # à get_acl_version.
+        _ACL_STAMP[1] = None
+        if _ACL_CACHE is not None:
+            _ACL_CACHE.clear()
+    path = config.get('acl_cache_stamp')
+    if not path:
+        return
+    # Écriture atomique de la nouvelle version.
+    tmp_path = '%s.%d' % (path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as stamp_file:
+            stamp_file.write(uuid.uuid4().hex)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        LOGGER.exception("Could not update the ACL stamp file %s", path)
+
+def bump_acl_version_on_commit():
+    """
+    Appelle L{bump_acl_version} une fois la transaction courante validée,
+    afin que les requêtes concurrentes ne mettent pas en cache des droits
+    d'accès antérieurs à la modification.
+    """
+    def hook(success):
+        if success:
+            bump_acl_version()
+    transaction.get().addAfterCommitHook(hook)
+
+
+class AclContext(object):
+    """
+    Informations de contrôle d'accès d'un utilisateur, calculées
+    à la demande puis mémorisées pour la durée de la requête.
+    """
+
+    def __init__(self, user, environ, manager_predicate, shared=None):
+        """
+        @param user: Utilisateur courant (ou C{None} s'il n'est
+            pas identifié).
+        @type user: L{vigilo.models.tables.User}
+        @param environ: Environnement WSGI de la requête.
+        @type environ: C{dict}
+        @param manager_predicate: Prédicat repoze.what permettant
+            de savoir si l'utilisateur est un "manager".
+        @param shared: Dictionnaire partagé entre les requêtes
+            de l'utilisateur, dans lequel les identifiants des groupes
+            accessibles sont conservés (cf. L{get_acl_context}).
+        @type shared: C{dict}
+        """
+        if shared is None:
+            shared = {}
+        self.user = user
+        self._shared = shared
+        self._environ = environ
+        self._manager_predicate = manager_predicate
+        self._is_manager = None
+        self._supitemgroups = None
+        self._mapgroups = {}
+        self._cache_key = None
+
+    @property
+    def is_manager(self):
+        """Indique si l'utilisateur a accès à l'ensemble des données."""
+        if self._is_manager is None:
+            self._is_manager = self.user is not None and \
+                bool(self._manager_predicate.is_met(self._environ))
+        return self._is_manager
+
+    def _get_supitemgroups(self):
+        if self._supitemgroups is None:
+            if self.user is None:
+                self._supitemgroups = []
+            else:
+                supitemgroups = self._shared.get('supitemgroups')
+                if supitemgroups is None:
+                    supitemgroups = self._shared['supitemgroups'] = \
+                        [tuple(ug) for ug in self.user.supitemgroups()]
+                self._supitemgroups = supitemgroups
+        return self._supitemgroups
+
+    @property
+    def supitem_group_ids(self):
+        """
+        Identifiants des groupes d'éléments supervisés auxquels
+        l'utilisateur a pleinement accès (directement ou par héritage).
+        """
+        return [ug[0] for ug in self._get_supitemgroups() if ug[1]]
+
+    @property
+    def visible_supitem_group_ids(self):
+        """
+        Identifiants de l'ensemble des groupes d'éléments supervisés
+        visibles par l'utilisateur, y compris les groupes parents
+        permettant seulement de naviguer dans l'arborescence.
+        """
+        return [ug[0] for ug in self._get_supitemgroups()]
+
+    @property
+    def cache_key(self):
+        """
+        Empreinte des droits de l'utilisateur sur les éléments supervisés,
+        identique pour tous les utilisateurs disposant des mêmes droits.
+        Elle permet de partager entre ces utilisateurs des résultats
+        mis en cache.
+        """
+        if self._cache_key is None:
+            if self.is_manager:
+                self._cache_key = 'manager'
+            else:
+                groups = ','.join([str(idgroup) for idgroup in
+                                   sorted(self.supitem_group_ids)])
+                self._cache_key = hashlib.sha1(groups).hexdigest()
+        return self._cache_key
+
+    def mapgroups(self, only_id=True, only_direct=False):
+        """
+        Groupes de cartes accessibles à l'utilisateur.
+        Les paramètres sont ceux de C{User.mapgroups}.
+
+        @return: Liste des groupes (ou de leurs identifiants).
+        @rtype: C{list}
+        """
+        key = (only_id, only_direct)
+        if key not in self._mapgroups:
+            if self.user is None:
+                self._mapgroups[key] = []
+            elif only_id:
+                # Seuls les identifiants peuvent être conservés d'une
+                # requête à l'autre (les instances sont propres à la
+                # session SQLAlchemy de la requête).
+                shared_key = ('mapgroups', only_direct)
+                mapgroups = self._shared.get(shared_key)
+                if mapgroups is None:
+                    mapgroups = self._shared[shared_key] = list(
+                        self.user.mapgroups(only_id=True,
+                                            only_direct=only_direct))
+                self._mapgroups[key] = mapgroups
+            else:
+                self._mapgroups[key] = list(self.user.mapgroups(
+                    only_id=False, only_direct=only_direct))
+        return self._mapgroups[key]
+
+
+def get_acl_context():
+    """
+    Retourne le contexte de contrôle d'accès de la requête en cours,
+    en le créant lors du premier appel.
+
+    @return: Contexte de contrôle d'accès.
+    @rtype: L{AclContext}
+    """
+    environ = request.environ
+    acl = environ.get(ENVIRON_KEY)
+    if acl is None:
+        user = get_current_user()
+        shared = None
+        acl_cache = _get_acl_cache()
+        if acl_cache is not None and user is not None:
+            key = (user.user_name, get_acl_version())
+            shared = acl_cache.get(key)
+            if shared is None:
+                shared = {}
+                acl_cache.set(key, shared)
+        acl = environ[ENVIRON_KEY] = AclContext(
+            user, environ, config.is_manager, shared)
+    return acl
+
+
+def _grouped_supitems(group_ids):
+    """
+    Sous-requête retournant les éléments supervisés
+    appartenant directement à l'un des groupes donnés.
+    """
+    return select(
+        [SUPITEM_GROUP_TABLE.c.idsupitem]
+    ).where(SUPITEM_GROUP_TABLE.c.idgroup.in_(group_ids))
+
+def visible_hosts_filter(group_ids, idhost=Host.idhost):
+    """
+    Construit le critère de visibilité des hôtes : un hôte est visible
+    s'il appartient à l'un des groupes donnés ou si l'un de ses services
+    y appartient.
+
+    Le critère s'exprime comme l'union de deux semi-jointures, évaluée
+    une seule fois. Contrairement à des jointures externes sur les groupes
+    des hôtes et des services, il ne multiplie pas les lignes de la requête
+    principale, qui n'a donc pas besoin de DISTINCT.
+
+    @param group_ids: Identifiants des groupes accessibles à l'utilisateur
+        (cf. L{AclContext.supitem_group_ids}).
+    @type group_ids: C{list}
+    @param idhost: Colonne contenant l'identifiant de l'hôte à filtrer.
+    @return: Critère SQLAlchemy, à passer à C{Query.filter}.
+    """
+    via_services = select(
+        [LowLevelService.idhost]
+    ).where(LowLevelService.idservice.in_(_grouped_supitems(group_ids)))
+    return idhost.in_(union(_grouped_supitems(group_ids), via_services))
+
+def visible_services_filter(group_ids, idservice=LowLevelService.idservice):
+    """
+    Construit le critère de visibilité des services de bas niveau :
+    un service est visible s'il appartient à l'un des groupes donnés
+    ou si son hôte y appartient (cf. L{visible_hosts_filter}).
+
+    @param group_ids: Identifiants des groupes accessibles à l'utilisateur.
+    @type group_ids: C{list}
+    @param idservice: Colonne contenant l'identifiant du service à filtrer.
+    @return: Critère SQLAlchemy, à passer à C{Query.filter}.
+    """
+    via_hosts = select(
+        [LowLevelService.idservice]
+    ).where(LowLevelService.idhost.in_(_grouped_supitems(group_ids)))
+    return idservice.in_(union(_grouped_supitems(group_ids), via_hosts))
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Caches en mémoire, partagés par les threads d'un même processus.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+__all__ = ('TTLCache', )
+
+
+class TTLCache(object):
+    """
+    Cache dont les entrées expirent au bout d'une durée donnée.
+    Lorsqu'une taille maximale est fixée, les entrées les moins
+    récemment utilisées sont évincées en premier (LRU).
+    """
+
+    def __init__(self, ttl, maxsize=None, timer=time.time,
+                 weigher=None, maxweight=None):
+        """
+        @param ttl: Durée de vie par défaut des entrées, en secondes.
+        @type ttl: C{int}
+        @param maxsize: Nombre maximal d'entrées dans le cache
+            (C{None} pour ne pas limiter la taille du cache).
+        @type maxsize: C{int}
+        @param timer: Fonction retournant l'heure courante.
+        @type timer: C{callable}
+        @param weigher: Fonction retournant le poids (par exemple,
+            la taille en octets) d'une valeur.
+        @type weigher: C{callable}
+        @param maxweight: Poids total maximal des entrées du cache
+            (C{None} pour ne pas limiter le poids du cache).
+            Une valeur plus lourde que ce maximum n'est pas stockée.
+        @type maxweight: C{int}
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.maxweight = maxweight
+        self._weigher = weigher
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._weight = 0
+
+    def _pop(self, key):
+        expires, value, weight = self._data.pop(key)
+        self._weight -= weight
+        return expires, value
+
+    def get(self, key, default=None):
+        """
+        Retourne la valeur associée à une clé.
+
+        @param key: Clé recherchée.
+        @param default: Valeur retournée si la clé est absente du cache
+            ou si l'entrée correspondante a expiré.
+        @return: Valeur associée à la clé.
+        """
+        now = self._timer()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= now:
+                self._pop(key)
+                return default
+            # On replace l'entrée en fin de liste (la plus récente).
+            del self._data[key]
+            self._data[key] = entry
+            return entry[1]
+
+    def lookup(self, key):
+        """
+        Retourne la valeur associée à une clé, y compris lorsque l'entrée
+        correspondante a expiré. Contrairement à L{get}, les entrées
+        expirées ne sont pas supprimées du cache (elles restent soumises
+        à l'éviction LRU), ce qui permet par exemple de les revalider.
+
+        @param key: Clé recherchée.
+        @return: Couple (valeur, fraîcheur), où la fraîcheur indique
+            si l'entrée n'a pas encore expiré, ou C{(None, False)} si
+            la clé est absente du cache.
+        @rtype: C{tuple}
+        """
+        now = self._timer()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return (None, False)
+            del self._data[key]
+            self._data[key] = entry
+            return (entry[1], entry[0] > now)
+
+    def set(self, key, value, ttl=None):
+        """
+        Associe une valeur à une clé.
+
+        @param key: Clé de l'entrée.
+        @param value: Valeur à stocker.
+        @param ttl: Durée de vie de l'entrée, en secondes. La durée
+            de vie par défaut du cache est utilisée si elle est omise.
+        @type ttl: C{int}
+        """
+        if ttl is None:
+            ttl = self.ttl
+        expires = self._timer() + ttl
+        weight = 0
+        if self._weigher is not None:
+            weight = self._weigher(value)
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            if self.maxweight is not None and weight > self.maxweight:
+                return
+            self._data[key] = (expires, value, weight)
+            self._weight += weight
+            # Éviction des entrées les moins récemment utilisées.
+            while (self.maxsize is not None and
+                        len(self._data) > self.maxsize) or \
+                    (self.maxweight is not None and
+                        self._weight > self.maxweight):
+                self._pop(next(iter(self._data)))
+
+    def invalidate(self, key):
+        """
+        Supprime une entrée du cache.
+
+        @param key: Clé de l'entrée à supprimer.
+        """
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def clear(self):
+        """Vide le cache."""
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def weight(self):
+        """Poids total des entrées du cache."""
+        return self._weight
@@ -6,17 +6,93 @@
 Ce module contient des fonctions utilisées par les contrôlleurs de l'API
 """
 
+import urllib
 import urlparse
+import threading
 
 import tg
+from tg import config
 from tg.exceptions import HTTPNotFound, HTTPBadRequest, HTTPForbidden
-from sqlalchemy.sql.expression import or_
+from paste.deploy.converters import asbool
+from sqlalchemy.sql.expression import and_
 
 from vigilo.models import tables
 from vigilo.models.session import DBSession
+from vigilo.models.functions import sql_escape_like
+from vigilo.models.tables.secondary_tables import GRAPH_PERFDATASOURCE_TABLE
 from vigilo.turbogears.helpers import get_current_user
+from vigilo.turbogears.streaming import iter_json_collection, \
+        iter_xml_collection
+from vigilo.turbogears.acl import get_acl_context, get_acl_version, \
+        visible_hosts_filter, visible_services_filter
+from vigilo.turbogears.cache import TTLCache
+from vigilo.turbogears.grouptree import GroupTree
 
 
+# Arborescences des groupes, par type (cf. get_group_tree).
+_GROUP_TREES = None
+_GROUP_TREES_LOCK = threading.Lock()
+
+
+def _load_group_tree(model_class):
+    """
+    Construit l'arborescence des groupes d'un type donné,
+    en une seule requête.
+
+    @param model_class: classe du modèle correspondant au type de groupe
+    @type  model_class: sous-classe de L{Group}
+    @rtype: L{GroupTree}
+    """
+    groups = DBSession.query(
+            model_class.idgroup,
+            model_class.name,
+            tables.GroupPath.path,
+            tables.GroupHierarchy.idparent,
+        ).outerjoin(
+            (tables.GroupPath,
+                tables.GroupPath.idgroup == model_class.idgroup),
+            (tables.GroupHierarchy, and_(
+                tables.GroupHierarchy.idchild == model_class.idgroup,
+                tables.GroupHierarchy.hops == 1,
+            )),
+        )
+    return GroupTree(groups.all())
+
+def get_group_tree(model_class, refresh=False):
+    """
+    Retourne l'arborescence des groupes d'un type donné. L'arborescence
+    est conservée en mémoire et associée à la version des droits d'accès
+    (cf. L{vigilo.turbogears.acl.bump_acl_version}), qui change lorsque
+    les groupes sont modifiés.
+
+    Options de configuration reconnues :
+     -  api_group_tree_ttl : durée de validité (en secondes)
+        des arborescences (60 par défaut, 0 pour désactiver le cache).
+
+    @param model_class: classe du modèle correspondant au type de groupe
+    @type  model_class: sous-classe de L{Group}
+    @param refresh: force la reconstruction de l'arborescence
+    @type  refresh: C{bool}
+    @rtype: L{GroupTree}
+    """
+    global _GROUP_TREES # pylint: disable-msg=W0603
+    with _GROUP_TREES_LOCK:
+        if _GROUP_TREES is None:
+            ttl = int(config.get("api_group_tree_ttl", 60))
+            if ttl > 0:
+                _GROUP_TREES = TTLCache(ttl)
+        trees = _GROUP_TREES
+    if trees is None:
+        return _load_group_tree(model_class)
+    key = (model_class.__name__, get_acl_version())
+    tree = None
+    if not refresh:
+        tree = trees.get(key)
+    if tree is None:
+        tree = _load_group_tree(model_class)
+        trees.set(key, tree)
+    return tree
+
 def get_parent_id(obj_type=None):
     """
     Retourne l'ID de l'objet parent dans l'URL, avec une vérification
@@ -36,46 +112,93 @@ def get_parent_id(obj_type=None):
         raise HTTPBadRequest(msg)
     return url_array[-3]
 
+def get_hosts_query(*entities):
+    """
+    Retourne la requête sélectionnant les hôtes auxquels
+    l'utilisateur a accès.
+
+    @param entities: entités ou colonnes sélectionnées par la requête
+        (par défaut, C{tables.Host})
+    @return: requête, ou C{None} si l'utilisateur n'a accès à aucun hôte
+    @rtype:  C{sqlalchemy.orm.query.Query}
+    """
+    acl = get_acl_context()
+    if not acl.user:
+        raise HTTPForbidden("You must be logged in")
+    hosts = DBSession.query(*(entities or (tables.Host, )))
+    # ACLs
+    if not acl.is_manager:
+        user_groups = acl.supitem_group_ids
+        if not user_groups:
+            return None
+        hosts = hosts.filter(visible_hosts_filter(user_groups))
+    return hosts
+
 def get_all_hosts():
     """
     Retourne tous les hôtes (C{tables.Host}) auxquels l'utilisateur à accès
     """
-    user = get_current_user()
-    if not user:
-        raise HTTPForbidden("You must be logged in")
-    hostgroup = tables.secondary_tables.SUPITEM_GROUP_TABLE.alias()
-    servicegroup = tables.secondary_tables.SUPITEM_GROUP_TABLE.alias()
-    hosts = DBSession.query(tables.Host).distinct().outerjoin(
-            (hostgroup, hostgroup.c.idsupitem == tables.Host.idhost),
-            (tables.LowLevelService,
-                tables.LowLevelService.idhost == tables.Host.idhost),
-            (servicegroup,
-                servicegroup.c.idsupitem == tables.LowLevelService.idservice),
+    hosts = get_hosts_query()
+    if hosts is None:
+        return []
+    return hosts.all()
+
+def get_graphs_query(idhost=None, *entities):
+    """
+    Retourne la requête sélectionnant les graphes (sans doublon) portant
+    sur les hôtes auxquels l'utilisateur a accès, ou sur un hôte donné.
+    Les graphes sont obtenus en une seule requête, sans charger les hôtes.
+
+    @param idhost: l'identifiant de l'hôte (ou son nom), ou C{None}
+        pour parcourir tous les hôtes accessibles
+    @type  idhost: C{int} ou C{str}
+    @param entities: colonnes sélectionnées par la requête
+        (par défaut, l'identifiant et le nom des graphes)
+    @return: requête, ou C{None} si l'utilisateur n'a accès à aucun hôte
+    @rtype:  C{sqlalchemy.orm.query.Query}
+    """
+    graphs = DBSession.query(
+            *(entities or (tables.Graph.idgraph, tables.Graph.name))
+        ).distinct(
+        ).join(
+            (GRAPH_PERFDATASOURCE_TABLE,
+                GRAPH_PERFDATASOURCE_TABLE.c.idgraph == tables.Graph.idgraph),
+            (tables.PerfDataSource, tables.PerfDataSource.idperfdatasource ==
+                GRAPH_PERFDATASOURCE_TABLE.c.idperfdatasource),
         )
+    if idhost is not None:
+        host = get_host(idhost)
+        return graphs.filter(tables.PerfDataSource.idhost == host.idhost)
+    acl = get_acl_context()
+    if not acl.user:
+        raise HTTPForbidden("You must be logged in")
     # ACLs
-    if not tg.config.is_manager.is_met(tg.request.environ):
-        user_groups = [ug[0] for ug in user.supitemgroups() if ug[1]]
+    if not acl.is_manager:
+        user_groups = acl.supitem_group_ids
         if not user_groups:
-            return []
-        hosts = hosts.filter(or_(
-            hostgroup.c.idgroup.in_(user_groups),
-            servicegroup.c.idgroup.in_(user_groups),
-        ))
-    return hosts.all()
+            return None
+        graphs = graphs.filter(visible_hosts_filter(
+            user_groups, tables.PerfDataSource.idhost))
+    return graphs
 
-def get_host(idhost):
+def get_host(idhost, options=()):
     """
     Retourne un hôte (C{tables.Host}) à partir de son ID ou de son nom
 
     @param idhost: l'identifiant de l'hôte
     @type  idhost: C{int} ou C{str}
+    @param options: options de chargement SQLAlchemy (ex : C{joinedload})
+        appliquées à la requête, pour charger en une seule fois
+        les attributs utilisés par l'appelant
+    @type  options: C{tuple}
     """
+    hosts = DBSession.query(tables.Host).options(*options)
     try:
         idhost = int(idhost)
     except ValueError:
-        host = tables.Host.by_host_name(idhost)
+        host = hosts.filter(tables.Host.name == idhost).first()
     else:
-        host = DBSession.query(tables.Host).get(idhost)
+        host = hosts.get(idhost)
     if host is None:
         raise HTTPNotFound("Can't find the host: %s" % idhost)
     # ACLs
@@ -95,22 +218,41 @@ def get_all_services(model_class):
         demandé
     @type  model_class: sous-classe de C{tables.Service}
     """
-    user = get_current_user()
-    if not user:
+    services = get_services_query(model_class)
+    if services is None:
+        return []
+    return services.all()
+
+def get_services_query(model_class, *entities):
+    """
+    Retourne la requête sélectionnant les services auxquels l'utilisateur
+    à accès, suivant le type demandé en argument.
+
+    @param model_class: la classe du modèle correspondante au type de service
+        demandé
+    @type  model_class: sous-classe de C{tables.Service}
+    @param entities: entités ou colonnes sélectionnées par la requête
+        (par défaut, L{model_class})
+    @return: requête, ou C{None} si l'utilisateur n'a accès à aucun service
+    @rtype:  C{sqlalchemy.orm.query.Query}
+    """
+    acl = get_acl_context()
+    if not acl.user:
         raise HTTPForbidden("You must be logged in")
-    services = DBSession.query(model_class)
+    services = DBSession.query(*(entities or (model_class, )))
     # ACLs
     # Rappel :  il n'y a pas de permission spécifique
     #           donnant accès aux services de haut niveau.
-    if model_class is tables.LowLevelService and \
-        not tg.config.is_manager.is_met(tg.request.environ):
-        services = services.join(
-                (tables.UserSupItem,
-                    tables.UserSupItem.idsupitem == model_class.idsupitem)
-            )
-    return services.all()
+    if model_class is tables.LowLevelService and not acl.is_manager:
+        user_groups = acl.supitem_group_ids
+        if not user_groups:
+            return None
+        # Semi-jointure : chaque service n'est retourné qu'une fois,
+        # ce qui permet de paginer sur son identifiant.
+        services = services.filter(visible_services_filter(user_groups))
+    return services
 
-def get_service(idservice, service_type, idhost=None):
+def get_service(idservice, service_type, idhost=None, options=()):
     """
     Retourne un service à partir de son ID ou de son nom. Si le service est un
     service de bas niveau (C{tables.LowLevelService}), il faut aussi fournir un
@@ -122,7 +264,15 @@ def get_service(idservice, service_type, idhost=None):
     @type  service_type: C{str}: C{lls} ou C{hls}
     @param idhost: l'identifiant de l'hôte associé au service, ou son nom
     @type  idhost: C{int} ou C{str}
+    @param options: options de chargement SQLAlchemy appliquées
+        à la requête (cf. L{get_host})
+    @type  options: C{tuple}
     """
+    if service_type == "lls":
+        model_class = tables.LowLevelService
+    else:
+        model_class = tables.HighLevelService
+    services = DBSession.query(model_class).options(*options)
     try:
         idservice = int(idservice)
     except ValueError:
@@ -132,12 +282,12 @@ def get_service(idservice, service_type, idhost=None):
                 raise HTTPNotFound("Can't find the host, you must use "
                                    "the numeric service ID")
             host = get_host(idhost)
-            service = tables.LowLevelService.by_host_service_name(
-                                        host.name, idservice)
-        elif service_type == "hls":
-            service = tables.HighLevelService.by_service_name(idservice)
+            services = services.filter(
+                tables.LowLevelService.idhost == host.idhost)
+        service = services.filter(
+            model_class.servicename == idservice).first()
     else:
-        service = DBSession.query(tables.Service).get(idservice)
+        service = services.get(idservice)
     if service is None:
         raise HTTPNotFound("Can't find the service: %s" % idservice)
     # ACLs
@@ -148,6 +298,321 @@ def get_service(idservice, service_type, idhost=None):
         raise HTTPForbidden("Access to this service is forbidden")
     return service
 
+def get_fields(fields, available):
+    """
+    Analyse le paramètre C{fields} des collections de l'API,
+    qui restreint les attributs retournés pour chaque élément.
+    Les modèles XML des applications ne tiennent pas compte de ce
+    paramètre : il n'est donc accepté qu'au format JSON ou lorsque
+    la collection est transmise progressivement (cf. L{get_stream_format}).
+
+    @param fields: noms des attributs demandés, séparés par des virgules
+    @type  fields: C{str}
+    @param available: noms des attributs disponibles
+    @type  available: C{tuple}
+    @return: noms des attributs à retourner (par défaut, tous)
+    @rtype:  C{set}
+    """
+    if not fields:
+        return set(available)
+    if tg.request.response_type != "application/json" and \
+        get_stream_format() is None:
+        raise HTTPBadRequest("Projection is only available in JSON")
+    fields = set([f.strip() for f in fields.split(",") if f.strip()])
+    unknown = fields - set(available)
+    if unknown:
+        raise HTTPBadRequest("Unknown fields: %s" % ", ".join(sorted(unknown)))
+    return fields
+
+def project(item, fields):
+    """
+    Restreint un élément d'une collection aux attributs demandés.
+
+    @param item: description de l'élément
+    @type  item: C{dict}
+    @param fields: noms des attributs demandés (cf. L{get_fields})
+    @type  fields: C{set}
+    @rtype: C{dict}
+    """
+    return dict([(k, v) for (k, v) in item.iteritems() if k in fields])
+
+def _get_int_param(name, value):
+    if value is None or value == "":
+        return None
+    try:
+        value = int(value)
+    except (ValueError, TypeError):
+        raise HTTPBadRequest("An integer was expected for '%s'" % name)
+    if value < 0:
+        raise HTTPBadRequest("A positive integer was expected for '%s'"
+                             % name)
+    return value
+
+class Page(object):
+    """
+    Page d'une collection de l'API (cf. L{paginate}). Les lignes sont
+    obtenues en parcourant la page ; l'URL de la page suivante n'est
+    connue qu'à l'issue de ce parcours.
+
+    En mode progressif, la requête est exécutée sur une connexion
+    dédiée, à l'aide d'un curseur côté serveur lorsque la base
+    de données le permet : le parcours peut alors avoir lieu après
+    la fin de la transaction de la requête HTTP, pendant l'envoi
+    de la réponse.
+    """
+
+    def __init__(self, query, id_column, limit, stream=False):
+        """
+        @param query: requête sélectionnant les lignes de la page
+            (sans limite), ou C{None} pour une page vide
+        @type  query: C{sqlalchemy.orm.query.Query}
+        @param id_column: colonne contenant l'identifiant des éléments
+        @param limit: nombre maximal de lignes de la page
+        @type  limit: C{int}
+        @param stream: parcours progressif des lignes
+        @type  stream: C{bool}
+        """
+        self.next_url = None
+        self._query = query
+        self._id_key = id_column.key
+        self._limit = limit
+        self._bind = None
+        if stream:
+            self._bind = DBSession.get_bind()
+        # Paramètres de l'URL de la page suivante, recopiés
+        # tant que la requête HTTP est accessible.
+        self._base_url = tg.request.path_url
+        self._params = [(k, unicode(v).encode("utf-8"))
+                        for (k, v) in tg.request.GET.items()
+                        if k not in ("offset", "after", "limit")]
+
+    def _iter_cursor(self, query):
+        connection = self._bind.connect()
+        try:
+            result = connection.execution_options(
+                stream_results=True).execute(query.statement)
+            for row in result:
+                yield row
+        finally:
+            connection.close()
+
+    def __iter__(self):
+        if self._query is None:
+            return
+        query = self._query
+        if self._limit is not None:
+            # On récupère une ligne supplémentaire
+            # pour savoir si une autre page suit.
+            query = query.limit(self._limit + 1)
+        if self._bind is not None:
+            rows = self._iter_cursor(query)
+        else:
+            rows = iter(query.all())
+        count = 0
+        last = None
+        try:
+            for row in rows:
+                if count == self._limit:
+                    if count:
+                        params = self._params + [
+                            ("limit", self._limit),
+                            ("after", getattr(last, self._id_key)),
+                        ]
+                        self.next_url = "%s?%s" % (
+                            self._base_url, urllib.urlencode(params))
+                    break
+                count += 1
+                last = row
+                yield row
+        finally:
+            close = getattr(rows, "close", None)
+            if close is not None:
+                close()
+
+def paginate(query, id_column, name_column, name=None,
+             limit=None, offset=None, after=None, stream=False):
+    """
+    Applique à la requête d'une collection de l'API les paramètres communs
+    à toutes les collections, traités par la base de données :
+     -  C{name} : motif (jokers '*' et '?') que doit respecter le nom
+        des éléments ;
+     -  C{limit} : nombre maximal d'éléments retournés, strictement
+        positif (par défaut, l'option de configuration api_limit ; 0 ou
+        absente pour ne pas limiter) ;
+     -  C{offset} : nombre d'éléments à ignorer ;
+     -  C{after} : identifiant du dernier élément de la page précédente
+        (pagination par clé, plus efficace que C{offset}).
+
+    Les éléments sont triés par identifiant.
+
+    @param query: requête sélectionnant les éléments, ou C{None}
+        si l'utilisateur n'a accès à aucun élément
+    @type  query: C{sqlalchemy.orm.query.Query}
+    @param id_column: colonne contenant l'identifiant des éléments
+    @param name_column: colonne contenant le nom des éléments
+    @param stream: parcours progressif des lignes (cf. L{get_stream_format})
+    @type  stream: C{bool}
+    @return: page de résultats
+    @rtype:  L{Page}
+    """
+    limit = _get_int_param("limit", limit)
+    if limit == 0:
+        raise HTTPBadRequest("A strictly positive integer was expected "
+                             "for 'limit'")
+    offset = _get_int_param("offset", offset)
+    after = _get_int_param("after", after)
+    if limit is None:
+        limit = int(tg.config.get("api_limit", 0)) or None
+
+    if query is not None:
+        if name:
+            query = query.filter(name_column.ilike(sql_escape_like(name)))
+        if after is not None:
+            query = query.filter(id_column > after)
+        query = query.order_by(None).order_by(id_column)
+        if offset:
+            query = query.offset(offset)
+    return Page(query, id_column, limit, stream)
+
+def get_stream_format():
+    """
+    Indique si la collection demandée doit être transmise progressivement,
+    au fur et à mesure de la lecture des résultats en base de données,
+    plutôt qu'à l'aide des moteurs de rendu habituels.
+
+    Options de configuration reconnues :
+     -  api_stream : transmission progressive des collections au format
+        JSON (désactivée par défaut). Le document produit est identique
+        à celui du moteur de rendu JSON.
+     -  api_stream_xml : transmission progressive des collections
+        au format XML (désactivée par défaut). Le document produit
+        suit le format de L{vigilo.turbogears.streaming.iter_xml_collection}
+        et non celui des modèles XML des applications.
+
+    @return: C{"json"}, C{"xml"} ou C{None}
+    @rtype:  C{str}
+    """
+    if tg.request.response_type == "application/json":
+        if asbool(tg.config.get("api_stream", False)):
+            return "json"
+    elif asbool(tg.config.get("api_stream_xml", False)):
+        return "xml"
+    return None
+
+def stream_collection(stream_format, key, tag, items, page):
+    """
+    Transmet progressivement une collection (cf. L{get_stream_format}).
+
+    @param stream_format: format du document (C{"json"} ou C{"xml"})
+    @type  stream_format: C{str}
+    @param key: nom de la collection (ex : C{"hosts"})
+    @type  key: C{str}
+    @param tag: nom de la balise XML de chaque élément (ex : C{"host"})
+    @type  tag: C{str}
+    @param items: éléments de la collection
+    @type  items: C{iterable}
+    @param page: page dont sont issus les éléments
+    @type  page: L{Page}
+    @return: réponse HTTP
+    """
+    trailer = lambda: {"next": page.next_url}
+    response = tg.response
+    if stream_format == "json":
+        response.content_type = "application/json"
+        response.app_iter = iter_json_collection(key, items, trailer)
+    else:
+        response.content_type = "application/xml"
+        response.app_iter = iter_xml_collection(key, tag, items, trailer)
+    response.charset = "utf-8"
+    if "Content-Length" in response.headers:
+        del response.headers["Content-Length"]
+    return response
+
+def get_ids(ids):
+    """
+    Analyse le paramètre C{ids} des requêtes groupées, qui permettent
+    d'obtenir en une seule requête HTTP la description de plusieurs
+    éléments. Le nombre d'identifiants est limité par l'option
+    de configuration api_limit. Ces requêtes ne sont disponibles
+    qu'au format JSON.
+
+    @param ids: identifiants des éléments, séparés par des virgules
+    @type  ids: C{str}
+    @return: identifiants, sans doublon, dans l'ordre de la demande
+    @rtype:  C{list}
+    """
+    if tg.request.response_type != "application/json":
+        raise HTTPBadRequest("Batch requests are only available in JSON")
+    result = []
+    seen = set()
+    for value in ids.split(","):
+        value = _get_int_param("ids", value.strip())
+        if value is None or value in seen:
+            continue
+        seen.add(value)
+        result.append(value)
+    if not result:
+        raise HTTPBadRequest("At least one identifier was expected "
+                             "for 'ids'")
+    limit = int(tg.config.get("api_limit", 0))
+    if limit and len(result) > limit:
+        raise HTTPBadRequest("At most %d identifiers may be given "
+                             "for 'ids'" % limit)
+    return result
+
+def batch_result(ids, found, allowed, serialize, label):
+    """
+    Construit la réponse d'une requête groupée (cf. L{get_ids}).
+    Les erreurs propres à un élément (élément introuvable ou accès
+    interdit) sont décrites à la place de l'élément, sans interrompre
+    la requête.
+
+    @param ids: identifiants demandés
+    @type  ids: C{list}
+    @param found: éléments trouvés, indexés par leur identifiant
+    @type  found: C{dict}
+    @param allowed: identifiants des éléments accessibles à l'utilisateur
+    @type  allowed: C{set}
+    @param serialize: fonction retournant la description d'un élément
+    @type  serialize: C{callable}
+    @param label: type des éléments, utilisé dans les messages d'erreur
+    @type  label: C{str}
+    @return: descriptions des éléments, indexées par leur identifiant
+    @rtype:  C{dict}
+    """
+    result = {}
+    for idobj in ids:
+        if idobj not in found:
+            result[idobj] = {"error": {
+                "status": 404,
+                "message": "Can't find %s %s" % (label, idobj),
+                }}
+        elif idobj not in allowed:
+            result[idobj] = {"error": {
+                "status": 403,
+                "message": "Access denied to %s %s" % (label, idobj),
+                }}
+        else:
+            result[idobj] = serialize(found[idobj])
+    return result
+
+def get_group_paths(idgroups):
+    """
+    Retourne les chemins d'un ensemble de groupes, en une seule requête
+    (au lieu d'une requête par groupe avec C{Group.path}).
+
+    @param idgroups: identifiants des groupes
+    @type  idgroups: C{list} de C{int}
+    @return: dictionnaire associant son chemin à chaque identifiant
+    @rtype:  C{dict}
+    """
+    if not idgroups:
+        return {}
+    return dict(DBSession.query(
+            tables.GroupPath.idgroup,
+            tables.GroupPath.path,
+        ).filter(tables.GroupPath.idgroup.in_(idgroups)).all())
+
 def get_pds(idpds, idhost=None):
     """
     Retourne un indicateur de performance (C{tables.PerfDataSource}) à partir
@@ -183,10 +648,10 @@ def check_map_access(m):
     @param m: carte à tester
     @type  m: C{tables.Map}
     """
-    user = get_current_user()
-    if not user:
+    acl = get_acl_context()
+    if not acl.user:
         raise HTTPForbidden("You must be logged in")
-    allowed_mapgroups = user.mapgroups(only_id=True, only_direct=True)
+    allowed_mapgroups = acl.mapgroups(only_id=True, only_direct=True)
     for mapgroup in m.groups:
         if mapgroup.idgroup in allowed_mapgroups:
             return True
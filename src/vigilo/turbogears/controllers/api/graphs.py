@@ -13,12 +13,15 @@ from tg.controllers import RestController
 from tg.decorators import with_trailing_slash
 from tg.exceptions import HTTPNotFound, HTTPForbidden
 
-from vigilo.models.tables import Graph
+from sqlalchemy.orm import subqueryload
+
+from vigilo.models.tables import Graph, Host
 from vigilo.models.session import DBSession
 
 from vigilo.turbogears.helpers import get_current_user
-from vigilo.turbogears.controllers.api import get_all_hosts, get_host, \
-                                              get_parent_id
+from vigilo.turbogears.controllers.api import get_graphs_query, \
+        get_parent_id, get_fields, paginate, project, get_stream_format, \
+        stream_collection, get_hosts_query, get_ids, batch_result
 
 
 class GraphsV1(RestController):
@@ -38,38 +41,80 @@ class GraphsV1(RestController):
     @with_trailing_slash
     @expose("api/graphs-all.xml", content_type="application/xml; charset=utf-8")
     @expose("json")
-    def get_all(self):
-        # pylint:disable-msg=C0111,R0201
+    def get_all(self, name=None, limit=None, offset=None, after=None,
+                fields=None, ids=None):
+        """
+        Liste des graphes portant sur les hôtes auxquels l'utilisateur
+        a accès. Les paramètres sont décrits dans L{paginate}
+        et L{get_fields}. Avec le paramètre C{ids}, retourne plutôt
+        la description complète des graphes demandés (cf. L{get_ids}).
+        """
+        # pylint:disable-msg=R0201
+        if ids is not None:
+            return self._get_batch(ids)
+        fields = get_fields(fields, ("id", "href", "name"))
+        columns = [Graph.idgraph]
+        if "name" in fields:
+            columns.append(Graph.name)
         idhost = get_parent_id("hosts")
-        if idhost is not None:
-            hosts = [get_host(idhost), ]
-        else:
-            hosts = get_all_hosts()
-        result = []
-        for host in hosts:
-            for graph in host.graphs:
-                result.append({
+        stream_format = get_stream_format()
+        page = paginate(get_graphs_query(idhost, *columns),
+                        Graph.idgraph, Graph.name,
+                        name, limit, offset, after, stream_format is not None)
+        baseurl = tg.url("/api/v%s/graphs/" % self.apiver)
+        def items():
+            for graph in page:
+                item = {
                         "id": graph.idgraph,
-                        "href": tg.url("/api/v%s/graphs/%s" % (self.apiver, graph.idgraph)),
-                        "name": graph.name,
-                        })
-        return dict(graphs=result)
+                        "href": "%s%s" % (baseurl, graph.idgraph),
+                        }
+                if "name" in fields:
+                    item["name"] = graph.name
+                yield project(item, fields)
+        if stream_format:
+            return stream_collection(stream_format, "graphs", "graph",
+                                     items(), page)
+        result = list(items())
+        return dict(graphs=result, next=page.next_url)
 
 
-    @expose("api/graphs-one.xml", content_type="application/xml; charset=utf-8")
-    @expose("json")
-    def get_one(self, idgraph):
-        # pylint:disable-msg=C0111,R0201
-        graph = DBSession.query(Graph).get(idgraph)
-        if not graph:
-            raise HTTPNotFound("Can't find graph %s" % idgraph)
-        # ACLs
-        user = get_current_user()
-        #user = tables.User.by_user_name(u"editor") # debug
-        for pds in graph.perfdatasources:
-            if not pds.host.is_allowed_for(user):
-                raise HTTPForbidden("Access denied to graphs on host %s"
-                                    % pds.host.name)
+    def _get_batch(self, ids):
+        """
+        Description des graphes demandés, obtenue par un nombre fixe
+        de requêtes SQL quel que soit le nombre de graphes. Comme pour
+        L{get_one}, un graphe n'est accessible que si l'utilisateur
+        a accès à tous les hôtes sur lesquels il porte.
+
+        @param ids: identifiants des graphes (cf. L{get_ids})
+        @type  ids: C{str}
+        """
+        ids = get_ids(ids)
+        graphs = DBSession.query(Graph).options(
+                subqueryload("groups"),
+                subqueryload("perfdatasources"),
+            ).filter(Graph.idgraph.in_(ids)).all()
+        idhosts = set([pds.idhost for graph in graphs
+                       for pds in graph.perfdatasources])
+        visible = set()
+        hosts = get_hosts_query(Host.idhost)
+        if idhosts and hosts is not None:
+            visible = set([row.idhost for row in hosts.filter(
+                Host.idhost.in_(idhosts))])
+        allowed = set([graph.idgraph for graph in graphs
+                       if visible.issuperset([pds.idhost for pds
+                                              in graph.perfdatasources])])
+        found = dict([(graph.idgraph, graph) for graph in graphs])
+        return dict(graphs=batch_result(
+            ids, found, allowed, self._serialize, "graph"))
+
+
+    def _serialize(self, graph):
+        """
+        @param graph: graphe à décrire
+        @type  graph: L{Graph}
+        @return: description complète du graphe
+        @rtype:  C{dict}
+        """
         result = {"id": graph.idgraph,
                   "href": tg.url("/api/v%s/graphs/%s" % (self.apiver, graph.idgraph)),
                   "name": graph.name,
@@ -93,5 +138,21 @@ class GraphsV1(RestController):
                                % (self.apiver, pds.idhost, pds.idperfdatasource)),
                 })
         result["perfdatasources"] = datasources
-        return dict(graph=result)
+        return result
+
 
+    @expose("api/graphs-one.xml", content_type="application/xml; charset=utf-8")
+    @expose("json")
+    def get_one(self, idgraph):
+        # pylint:disable-msg=C0111,R0201
+        graph = DBSession.query(Graph).get(idgraph)
+        if not graph:
+            raise HTTPNotFound("Can't find graph %s" % idgraph)
+        # ACLs
+        user = get_current_user()
+        #user = tables.User.by_user_name(u"editor") # debug
+        for pds in graph.perfdatasources:
+            if not pds.host.is_allowed_for(user):
+                raise HTTPForbidden("Access denied to graphs on host %s"
+                                    % pds.host.name)
+        return dict(graph=self._serialize(graph))
@@ -18,12 +18,13 @@ from vigilo.models.tables import MapGroup, GraphGroup, SupItemGroup
 from vigilo.models.tables.group import Group
 from vigilo.models.session import DBSession
 
-from vigilo.turbogears.helpers import get_current_user
+from vigilo.turbogears.acl import get_acl_context
+from vigilo.turbogears.controllers.api import get_group_tree
+from vigilo.turbogears.controllers.api.subtree import SupItemGroupTreeV1
 
 
 LOGGER = logging.getLogger(__name__)
 
-
 class GroupsV1(RestController):
     """
     Contrôleur permettant de récupérer des sous-classes de L{Group},
@@ -61,21 +62,25 @@ class GroupsV1(RestController):
             self.model_class = SupItemGroup
         else:
             LOGGER.warning("Unknown group type: %s", self.type)
+        if self.type == "supitem":
+            self.tree = SupItemGroupTreeV1()
 
     def _get_allowed_groups(self):
         """
-        @return: liste des ID des groupes autorisés pour l'utilisateur courant
-        @rtype:  liste de C{int}
+        @return: ensemble des ID des groupes autorisés pour l'utilisateur
+            courant, ou C{None} si tous les groupes sont autorisés
+        @rtype:  C{frozenset}
         """
-        user = get_current_user()
-        #user = tables.User.by_user_name(u"editor") # debug
-        if not user:
+        acl = get_acl_context()
+        if not acl.user:
             raise HTTPForbidden("You must be logged in")
         allowed_groups = None
         if self.type == "map":
-            allowed_groups = user.mapgroups(only_id=True)
+            allowed_groups = acl.mapgroups(only_id=True)
         elif self.type == "supitem":
-            allowed_groups = [ g[0] for g in user.supitemgroups() ]
+            allowed_groups = acl.visible_supitem_group_ids
+        if allowed_groups is not None:
+            allowed_groups = frozenset(allowed_groups)
         return allowed_groups
 
     @with_trailing_slash
@@ -85,18 +90,17 @@ class GroupsV1(RestController):
         """
         On retourne la hiérarchie étage par étage
         """
-        top_groups = self.model_class.get_top_groups()
+        tree = get_group_tree(self.model_class)
         allowed_groups = self._get_allowed_groups()
         groups = []
-        for group in top_groups:
-            if allowed_groups is not None and \
-                    group.idgroup not in allowed_groups:
+        for idgroup in tree.top_groups():
+            if allowed_groups is not None and idgroup not in allowed_groups:
                 continue
             groups.append({
-                "id": group.idgroup,
-                "name": group.path,
+                "id": idgroup,
+                "name": tree.path(idgroup),
                 "href": tg.url("/api/v%s/%sgroups/%s"
-                               % (self.apiver, self.type, group.idgroup)),
+                               % (self.apiver, self.type, idgroup)),
                 })
         return dict(groups=groups, type=self.type)
 
@@ -118,24 +122,26 @@ class GroupsV1(RestController):
         if not group:
             raise HTTPNotFound("Can't find group %s" % idgroup)
         allowed_groups = self._get_allowed_groups()
-        if allowed_groups is not None and int(idgroup) not in allowed_groups:
+        if allowed_groups is not None and idgroup not in allowed_groups:
             raise HTTPForbidden("Access denied to group %s" % idgroup)
+        tree = get_group_tree(self.model_class)
+        if idgroup not in tree:
+            # Groupe créé depuis la construction de l'arborescence.
+            tree = get_group_tree(self.model_class, refresh=True)
         baseurl = tg.url("/api/v%s" % self.apiver)
         result = {"id": group.idgroup,
-                  "name": group.path,
+                  "name": tree.path(idgroup),
                   "href": baseurl + "/%sgroups/%s" %
                                     (self.type, group.idgroup),
                   }
         children = []
-        for subgroup in group.get_children():
-            if allowed_groups is not None and \
-                    subgroup.idgroup not in allowed_groups:
+        for idchild in tree.children(idgroup):
+            if allowed_groups is not None and idchild not in allowed_groups:
                 continue
             children.append({
-                "id": subgroup.idgroup,
-                "name": subgroup.path,
-                "href": baseurl + "/%sgroups/%s" %
-                                  (self.type, subgroup.idgroup),
+                "id": idchild,
+                "name": tree.path(idchild),
+                "href": baseurl + "/%sgroups/%s" % (self.type, idchild),
                 })
         result["children"] = children
         if self.type == "map":
@@ -12,9 +12,13 @@ from tg import expose
 from tg.controllers import RestController
 from tg.decorators import with_trailing_slash
 
-#from vigilo.models import tables
-#from vigilo.models.session import DBSession
-from vigilo.turbogears.controllers.api import get_all_hosts, get_host
+from sqlalchemy.orm import joinedload_all, subqueryload
+
+from vigilo.models import tables
+from vigilo.models.session import DBSession
+from vigilo.turbogears.controllers.api import get_hosts_query, get_host, \
+        get_group_paths, get_fields, paginate, project, get_stream_format, \
+        stream_collection, get_ids, batch_result
 from vigilo.turbogears.controllers.api.services import ServicesV1
 from vigilo.turbogears.controllers.api.graphs import GraphsV1
 from vigilo.turbogears.controllers.api.perfdatasources import PerfDataSourcesV1
@@ -37,28 +41,87 @@ class HostsV1(RestController):
     graphs = GraphsV1()
     perfdatasources = PerfDataSourcesV1()
 
+    # Attributs utilisés par get_one, chargés avec l'hôte
+    # pour éviter une requête SQL par attribut.
+    one_options = (
+        joinedload_all("state.name"),
+        subqueryload("tags"),
+        subqueryload("groups"),
+    )
+
 
     @with_trailing_slash
     @expose("api/hosts-all.xml", content_type="application/xml; charset=utf-8")
     @expose("json")
-    def get_all(self):
-        # pylint:disable-msg=C0111,R0201
-        hosts = get_all_hosts()
-        result = []
-        for host in hosts:
-            result.append({
-                    "id": host.idhost,
-                    "href": tg.url("/api/v%s/hosts/%s" % (self.apiver, host.idhost)),
-                    "name": host.name,
-                    })
-        return dict(hosts=result)
+    def get_all(self, name=None, limit=None, offset=None, after=None,
+                fields=None, ids=None):
+        """
+        Liste des hôtes auxquels l'utilisateur a accès.
+        Les paramètres sont décrits dans L{paginate} et L{get_fields}.
+        Avec le paramètre C{ids}, retourne plutôt la description complète
+        des hôtes demandés (cf. L{get_ids}).
+        """
+        # pylint:disable-msg=R0201
+        if ids is not None:
+            return self._get_batch(ids)
+        fields = get_fields(fields, ("id", "href", "name"))
+        columns = [tables.Host.idhost]
+        if "name" in fields:
+            columns.append(tables.Host.name)
+        stream_format = get_stream_format()
+        page = paginate(get_hosts_query(*columns),
+                        tables.Host.idhost, tables.Host.name,
+                        name, limit, offset, after, stream_format is not None)
+        baseurl = tg.url("/api/v%s/hosts/" % self.apiver)
+        def items():
+            for host in page:
+                item = {"id": host.idhost,
+                        "href": "%s%s" % (baseurl, host.idhost),
+                        }
+                if "name" in fields:
+                    item["name"] = host.name
+                yield project(item, fields)
+        if stream_format:
+            return stream_collection(stream_format, "hosts", "host",
+                                     items(), page)
+        result = list(items())
+        return dict(hosts=result, next=page.next_url)
 
 
-    @expose("api/hosts-one.xml", content_type="application/xml; charset=utf-8")
-    @expose("json")
-    def get_one(self, idhost):
-        # pylint:disable-msg=C0111,R0201
-        host = get_host(idhost)
+    def _get_batch(self, ids):
+        """
+        Description des hôtes demandés, obtenue par un nombre fixe
+        de requêtes SQL quel que soit le nombre d'hôtes.
+
+        @param ids: identifiants des hôtes (cf. L{get_ids})
+        @type  ids: C{str}
+        """
+        ids = get_ids(ids)
+        hosts = DBSession.query(tables.Host).options(*self.one_options
+            ).filter(tables.Host.idhost.in_(ids)).all()
+        allowed = set()
+        visible = get_hosts_query(tables.Host.idhost)
+        if visible is not None:
+            allowed = set([row.idhost for row in visible.filter(
+                tables.Host.idhost.in_(ids))])
+        paths = get_group_paths([group.idgroup for host in hosts
+                                 if host.idhost in allowed
+                                 for group in host.groups])
+        found = dict([(host.idhost, host) for host in hosts])
+        return dict(hosts=batch_result(
+            ids, found, allowed,
+            lambda host: self._serialize(host, paths), "host"))
+
+
+    def _serialize(self, host, paths):
+        """
+        @param host: hôte à décrire
+        @type  host: C{tables.Host}
+        @param paths: chemins des groupes de l'hôte (cf. L{get_group_paths})
+        @type  paths: C{dict}
+        @return: description complète de l'hôte
+        @rtype:  C{dict}
+        """
         baseurl = tg.url("/api/v%s/hosts/%s" % (self.apiver, host.idhost))
         result = {"id": host.idhost,
                   "name": host.name,
@@ -80,10 +143,18 @@ class HostsV1(RestController):
         for group in host.groups:
             groups.append({
                 "id": group.idgroup,
-                "name": group.path,
+                "name": paths.get(group.idgroup),
                 "href": tg.url("/api/v%s/supitemgroups/%s"
                                % (self.apiver, group.idgroup)),
                 })
         result["groups"] = groups
-        return dict(host=result)
+        return result
 
+
+    @expose("api/hosts-one.xml", content_type="application/xml; charset=utf-8")
+    @expose("json")
+    def get_one(self, idhost):
+        # pylint:disable-msg=C0111,R0201
+        host = get_host(idhost, self.one_options)
+        paths = get_group_paths([g.idgroup for g in host.groups])
+        return dict(host=self._serialize(host, paths))
@@ -19,6 +19,65 @@ from vigilo.models.session import DBSession
 from vigilo.turbogears.controllers.api import get_parent_id, check_map_access
 
 
+def serialize_maplink(link, idmap, baseurl):
+    """
+    Description d'un lien de carte, telle que retournée par l'API.
+
+    @param link: lien de la carte
+    @type  link: C{tables.MapLink}
+    @param idmap: identifiant de la carte contenant le lien
+    @type  idmap: C{int}
+    @param baseurl: URL de base de l'API
+    @type  baseurl: C{str}
+    @rtype: C{dict}
+    """
+    result = {"id": link.idmaplink,
+              "from": {
+                  "id": link.idfrom_node,
+                  "href": baseurl + "/mapnodes/%s" % link.idfrom_node,
+                  },
+              "to": {
+                  "id": link.idto_node,
+                  "href": baseurl + "/mapnodes/%s" % link.idto_node,
+                  },
+              "href": baseurl + "/maps/%s/links/%s" %
+                                (idmap, link.idmaplink),
+              }
+    # Spécifique MapServiceLink
+    if isinstance(link, tables.MapServiceLink):
+        if link.idgraph:
+            result["graph"] = {
+                    "id": link.idgraph,
+                    "href": baseurl + "/graphs/%s" % link.idgraph
+                    }
+        datasources = {}
+        if link.idds_out:
+            datasources["out"] = {
+                    "id": link.idds_out,
+                    "href": baseurl + "/perfdatasources/%s"
+                                      % link.idds_out,
+                    }
+        if link.idds_in:
+            datasources["in"] = {
+                    "id": link.idds_in,
+                    "href": baseurl + "/perfdatasources/%s"
+                                      % link.idds_in,
+                    }
+        result["perfdatasources"] = datasources
+        result["supitem"] = {"id": link.idref}
+        if isinstance(link, tables.MapLlsLink):
+            result["supitem"]["type"] = "lls"
+            result["supitem"]["href"] = baseurl + "/lls/%s" % link.idref
+        elif isinstance(link, tables.MapHlsLink):
+            result["supitem"]["type"] = "hls"
+            result["supitem"]["href"] = baseurl + "/hls/%s" % link.idref
+    # Spécifique MapSegment
+    elif isinstance(link, tables.MapSegment):
+        result["color"] = link.color
+        result["thickness"] = link.thickness
+    return result
+
+
 class MapLinksV1(RestController):
     """
     Controlleur d'accès aux liens d'une carte. Ne peut être monté qu'après une
@@ -65,48 +124,5 @@ class MapLinksV1(RestController):
         link = DBSession.query(tables.MapLink).get(idmaplink)
         check_map_access(link.map)
         baseurl = tg.url("/api/v%s" % self.apiver)
-        result = {"id": link.idmaplink,
-                  "from": {
-                      "id": link.idfrom_node,
-                      "href": baseurl + "/mapnodes/%s" % link.idfrom_node,
-                      },
-                  "to": {
-                      "id": link.idto_node,
-                      "href": baseurl + "/mapnodes/%s" % link.idto_node,
-                      },
-                  "href": baseurl + "/maps/%s/links/%s" %
-                                    (link.map.idmap, link.idmaplink),
-                  }
-        # Spécifique MapServiceLink
-        if isinstance(link, tables.MapServiceLink):
-            if link.idgraph:
-                result["graph"] = {
-                        "id": link.idgraph,
-                        "href": baseurl + "/graphs/%s" % link.idgraph
-                        }
-            datasources = {}
-            if link.idds_out:
-                datasources["out"] = {
-                        "id": link.idds_out,
-                        "href": baseurl + "/perfdatasources/%s"
-                                          % link.idds_out,
-                        }
-            if link.idds_in:
-                datasources["in"] = {
-                        "id": link.idds_in,
-                        "href": baseurl + "/perfdatasources/%s"
-                                          % link.idds_in,
-                        }
-            result["perfdatasources"] = datasources
-            result["supitem"] = {"id": link.idref}
-            if isinstance(link, tables.MapLlsLink):
-                result["supitem"]["type"] = "lls"
-                result["supitem"]["href"] = baseurl + "/lls/%s" % link.idref
-            elif isinstance(link, tables.MapHlsLink):
-                result["supitem"]["type"] = "hls"
-                result["supitem"]["href"] = baseurl + "/hls/%s" % link.idref
-        # Spécifique MapSegment
-        elif isinstance(link, tables.MapSegment):
-            result["color"] = link.color,
-            result["thickness"] = link.thickness
+        result = serialize_maplink(link, link.map.idmap, baseurl)
         return dict(link=result)
@@ -11,11 +11,62 @@ from tg import expose
 from tg.decorators import with_trailing_slash
 from tg.controllers import RestController
 from tg.exceptions import HTTPNotFound
+from sqlalchemy.orm import subqueryload
 
 from vigilo.models import tables
 from vigilo.models.session import DBSession
 
-from vigilo.turbogears.controllers.api import get_parent_id, check_map_access
+from vigilo.turbogears.controllers.api import get_parent_id, \
+        check_map_access, get_ids, batch_result
+
+
+def serialize_mapnode(node, idmap, baseurl):
+    """
+    Description d'un noeud de carte, telle que retournée par l'API.
+
+    @param node: noeud de la carte
+    @type  node: C{tables.MapNode}
+    @param idmap: identifiant de la carte contenant le noeud
+    @type  idmap: C{int}
+    @param baseurl: URL de base de l'API
+    @type  baseurl: C{str}
+    @rtype: C{dict}
+    """
+    result = {
+            "id": node.idmapnode,
+            "label": node.label,
+            "x": node.x_pos,
+            "y": node.y_pos,
+            "widget": node.widget,
+            "type": node.type_node,
+            "icon": node.icon,
+            "href": baseurl + "/maps/%s/nodes/%s"
+                              % (idmap, node.idmapnode),
+            }
+    submaps = []
+    for submap in node.submaps:
+        submaps.append({
+            "id": submap.idmap,
+            "href": baseurl + "/maps/%s" % submap.idmap,
+            "title": submap.title,
+            })
+    result["submaps"] = submaps
+    if isinstance(node, tables.MapNodeHost):
+        result["supitem"] = {
+                "id": node.idhost,
+                "href": baseurl + "/hosts/%s" % node.idhost,
+                }
+    elif isinstance(node, tables.MapNodeLls):
+        result["supitem"] = {
+                "id": node.idservice,
+                "href": baseurl + "/lls/%s" % node.idservice,
+                }
+    elif isinstance(node, tables.MapNodeHls):
+        result["supitem"] = {
+                "id": node.idservice,
+                "href": baseurl + "/hls/%s" % node.idservice,
+                }
+    return result
 
 
 class MapNodesV1(RestController):
@@ -37,8 +88,13 @@ class MapNodesV1(RestController):
     @expose("api/mapnodes-all.xml",
             content_type="application/xml; charset=utf-8")
     @expose("json")
-    def get_all(self):
-        # pylint:disable-msg=C0111,R0201
+    def get_all(self, ids=None):
+        """
+        Liste des noeuds de la carte. Avec le paramètre C{ids}, retourne
+        plutôt la description complète des noeuds demandés (cf. L{get_ids}),
+        obtenue par un nombre fixe de requêtes SQL.
+        """
+        # pylint:disable-msg=R0201
         idmap = get_parent_id("maps")
         if idmap is not None:
             m = DBSession.query(tables.Map).get(idmap)
@@ -47,6 +103,20 @@ class MapNodesV1(RestController):
         if m is None:
             raise HTTPNotFound("The map %s does not exist" % idmap)
         check_map_access(m)
+        if ids is not None:
+            # L'accès à la carte vaut pour tous ses noeuds : ceux
+            # d'autres cartes sont considérés comme introuvables.
+            ids = get_ids(ids)
+            nodes = DBSession.query(tables.MapNode).with_polymorphic("*"
+                ).options(subqueryload("submaps")
+                ).filter(tables.MapNode.idmap == m.idmap
+                ).filter(tables.MapNode.idmapnode.in_(ids))
+            found = dict([(node.idmapnode, node) for node in nodes])
+            baseurl = tg.url("/api/v%s" % self.apiver)
+            return dict(mapnodes=batch_result(
+                ids, found, set(found),
+                lambda node: serialize_mapnode(node, m.idmap, baseurl),
+                "node"))
         result = []
         for node in m.nodes:
             result.append({
@@ -65,39 +135,6 @@ class MapNodesV1(RestController):
         node = DBSession.query(tables.MapNode).get(idmapnode)
         check_map_access(node.map)
         baseurl = tg.url("/api/v%s" % self.apiver)
-        result = {
-                "id": node.idmapnode,
-                "label": node.label,
-                "x": node.x_pos,
-                "y": node.y_pos,
-                "widget": node.widget,
-                "type": node.type_node,
-                "icon": node.icon,
-                "href": baseurl + "/maps/%s/nodes/%s"
-                                  % (node.map.idmap, node.idmapnode),
-                }
-        submaps = []
-        for submap in node.submaps:
-            submaps.append({
-                "id": submap.idmap,
-                "href": baseurl + "/maps/%s" % submap.idmap,
-                "title": submap.title,
-                })
-        result["submaps"] = submaps
-        if isinstance(node, tables.MapNodeHost):
-            result["supitem"] = {
-                    "id": node.idhost,
-                    "href": baseurl + "/hosts/%s" % node.idhost,
-                    }
-        elif isinstance(node, tables.MapNodeLls):
-            result["supitem"] = {
-                    "id": node.idservice,
-                    "href": baseurl + "/lls/%s" % node.idservice,
-                    }
-        elif isinstance(node, tables.MapNodeHls):
-            result["supitem"] = {
-                    "id": node.idservice,
-                    "href": baseurl + "/hls/%s" % node.idservice,
-                    }
+        result = serialize_mapnode(node, node.map.idmap, baseurl)
         return dict(mapnode=result)
 
@@ -12,14 +12,18 @@ from tg import expose
 from tg.decorators import with_trailing_slash
 from tg.controllers import RestController
 from tg.exceptions import HTTPNotFound, HTTPForbidden
+from sqlalchemy.orm import subqueryload
 
-from vigilo.models.tables import Map, MapLink
+from vigilo.models.tables import Map, MapLink, MapGroup, MapNode
 from vigilo.models.session import DBSession
 
-from vigilo.turbogears.helpers import get_current_user
-from vigilo.turbogears.controllers.api import check_map_access
-from vigilo.turbogears.controllers.api.mapnodes import MapNodesV1
-from vigilo.turbogears.controllers.api.maplinks import MapLinksV1
+from vigilo.turbogears.acl import get_acl_context
+from vigilo.turbogears.controllers.api import check_map_access, \
+        get_fields, paginate, project, get_stream_format, stream_collection
+from vigilo.turbogears.controllers.api.mapnodes import MapNodesV1, \
+        serialize_mapnode
+from vigilo.turbogears.controllers.api.maplinks import MapLinksV1, \
+        serialize_maplink
 
 
 class MapsV1(RestController):
@@ -42,35 +46,70 @@ class MapsV1(RestController):
     @with_trailing_slash
     @expose("api/maps-all.xml", content_type="application/xml; charset=utf-8")
     @expose("json")
-    def get_all(self):
-        # pylint:disable-msg=C0111,R0201
-        user = get_current_user()
-        #user = tables.User.by_user_name(u"editor") # debug
-        if not user:
+    def get_all(self, name=None, limit=None, offset=None, after=None,
+                fields=None):
+        """
+        Liste des cartes auxquelles l'utilisateur a accès.
+        Les paramètres sont décrits dans L{paginate} et L{get_fields} ;
+        le paramètre C{name} porte sur le titre des cartes.
+        """
+        # pylint:disable-msg=R0201
+        acl = get_acl_context()
+        if not acl.user:
             raise HTTPForbidden("You must be logged in")
-        mapgroups = user.mapgroups(only_id=False, only_direct=True)
-        result = []
-        for mapgroup in mapgroups:
-            for m in mapgroup.maps:
-                if m.idmap in [mr["id"] for mr in result]:
-                    continue # Déjà ajouté
-                result.append({
+        fields = get_fields(fields, ("id", "href", "title"))
+        columns = [Map.idmap]
+        if "title" in fields:
+            columns.append(Map.title)
+        mapgroups = acl.mapgroups(only_id=True, only_direct=True)
+        maps = None
+        if mapgroups:
+            # Une carte peut appartenir à plusieurs groupes : la
+            # semi-jointure (EXISTS) la retourne une seule fois, sans
+            # DISTINCT ni chargement des cartes de chaque groupe.
+            maps = DBSession.query(*columns).filter(
+                    Map.groups.any(MapGroup.idgroup.in_(mapgroups)))
+        stream_format = get_stream_format()
+        page = paginate(maps, Map.idmap, Map.title,
+                        name, limit, offset, after, stream_format is not None)
+        baseurl = tg.url("/api/v%s/maps/" % self.apiver)
+        def items():
+            for m in page:
+                item = {
                     "id": m.idmap,
-                    "href": tg.url("/api/v%s/maps/%s" % (self.apiver, m.idmap)),
-                    "title": m.title,
-                    })
-        return dict(maps=result)
+                    "href": "%s%s" % (baseurl, m.idmap),
+                    }
+                if "title" in fields:
+                    item["title"] = m.title
+                yield project(item, fields)
+        if stream_format:
+            return stream_collection(stream_format, "maps", "map",
+                                     items(), page)
+        result = list(items())
+        return dict(maps=result, next=page.next_url)
 
 
     @expose("api/maps-one.xml", content_type="application/xml; charset=utf-8")
     @expose("json")
-    def get_one(self, idmap):
-        # pylint:disable-msg=C0111,R0201
-        m = DBSession.query(Map).get(idmap)
+    def get_one(self, idmap, include=None):
+        """
+        Description d'une carte.
+
+        @param include: parties de la carte à décrire entièrement plutôt
+            que par de simples liens, séparées par des virgules
+            (C{nodes} et/ou C{links}). La carte complète est construite
+            à partir d'un nombre fixe de requêtes, quelle que soit sa taille.
+        @type  include: C{str}
+        """
+        # pylint:disable-msg=R0201
+        include = include and get_fields(include, ("nodes", "links")) or ()
+        # Les groupes servent au contrôle d'accès et à la description.
+        m = DBSession.query(Map).options(subqueryload("groups")).get(idmap)
         if m is None:
             raise HTTPNotFound("Can't find map %s" % idmap)
         check_map_access(m)
-        baseurl = tg.url("/api/v%s/maps/%s" % (self.apiver, m.idmap))
+        apiurl = tg.url("/api/v%s" % self.apiver)
+        baseurl = "%s/maps/%s" % (apiurl, m.idmap)
         result = {"id": m.idmap,
                   "title": m.title,
                   "mtime": m.mtime.isoformat(),
@@ -90,27 +129,39 @@ class MapsV1(RestController):
             groups.append({
                 "id": group.idgroup,
                 "name": group.name,
-                "href": tg.url("/api/v%s/mapgroups/%s" % (self.apiver, group.idgroup)),
+                "href": "%s/mapgroups/%s" % (apiurl, group.idgroup),
                 })
         result["groups"] = groups
         # nodes
         result["nodes_href"] = baseurl+"/nodes/"
-        nodes = []
-        for node in m.nodes:
-            nodes.append({
+        if "nodes" in include:
+            # Tous les types de noeuds sont chargés par une même requête,
+            # les sous-cartes par une seconde.
+            nodes = DBSession.query(MapNode).with_polymorphic("*").options(
+                    subqueryload("submaps"),
+                ).filter(MapNode.idmap == m.idmap
+                ).order_by(MapNode.idmapnode)
+            result["nodes"] = [serialize_mapnode(node, m.idmap, apiurl)
+                               for node in nodes]
+        else:
+            nodes = DBSession.query(MapNode.idmapnode).filter(
+                    MapNode.idmap == m.idmap).order_by(MapNode.idmapnode)
+            result["nodes"] = [{
                 "id": node.idmapnode,
                 "href": "%s/nodes/%s" % (baseurl, node.idmapnode)
-                })
-        result["nodes"] = nodes
+                } for node in nodes]
         # links
         result["links_href"] = baseurl+"/links/"
-        links = []
-        for link in DBSession.query(MapLink).filter_by(
-                                    idmap=idmap).all():
-            links.append({
+        if "links" in include:
+            links = DBSession.query(MapLink).with_polymorphic("*").filter(
+                    MapLink.idmap == m.idmap).order_by(MapLink.idmaplink)
+            result["links"] = [serialize_maplink(link, m.idmap, apiurl)
+                               for link in links]
+        else:
+            links = DBSession.query(MapLink.idmaplink).filter(
+                    MapLink.idmap == m.idmap).order_by(MapLink.idmaplink)
+            result["links"] = [{
                 "id": link.idmaplink,
                 "href": "%s/links/%s" % (baseurl, link.idmaplink)
-                })
-        result["links"] = links
+                } for link in links]
         return dict(map=result)
-
@@ -13,12 +13,21 @@ import tg
 from tg import expose
 from tg.decorators import with_trailing_slash
 from tg.controllers import RestController
-from tg.exceptions import HTTPNotFound
+from tg.exceptions import HTTPNotFound, HTTPForbidden
+
+from sqlalchemy.orm import joinedload, joinedload_all, subqueryload
+from sqlalchemy.sql.expression import select
 
 from vigilo.models.tables import Service, LowLevelService, HighLevelService
 
-from vigilo.turbogears.controllers.api import get_host, get_all_services, \
-        get_service, get_parent_id
+from vigilo.models.session import DBSession
+from vigilo.models.tables.secondary_tables import SUPITEM_GROUP_TABLE
+
+from vigilo.turbogears.acl import get_acl_context, visible_services_filter
+
+from vigilo.turbogears.controllers.api import get_host, get_services_query, \
+        get_service, get_parent_id, get_fields, paginate, project, \
+        get_stream_format, stream_collection, get_ids, batch_result
 
 
 LOGGER = logging.getLogger(__name__)
@@ -64,40 +73,130 @@ class ServicesV1(RestController):
         else:
             LOGGER.warning("Unknown service type: %s", self.type)
 
+        # Attributs utilisés par get_one, chargés avec le service
+        # pour éviter une requête SQL par attribut.
+        self.one_options = (
+            joinedload_all("state.name"),
+            subqueryload("tags"),
+            subqueryload("groups"),
+        )
+        if self.type == "lls":
+            self.one_options += (joinedload("host"), )
+
 
     @with_trailing_slash
     @expose("api/services-all.xml",
             content_type="application/xml; charset=utf-8")
     @expose("json")
-    def get_all(self):
-        # pylint:disable-msg=C0111,R0201
+    def get_all(self, name=None, limit=None, offset=None, after=None,
+                fields=None, ids=None):
+        """
+        Liste des services auxquels l'utilisateur a accès.
+        Les paramètres sont décrits dans L{paginate} et L{get_fields}.
+        Avec le paramètre C{ids}, retourne plutôt la description complète
+        des services demandés (cf. L{get_ids}).
+        """
+        # pylint:disable-msg=R0201
+        if ids is not None:
+            return self._get_batch(ids)
+        fields = get_fields(fields, ("id", "type", "href", "name"))
+        columns = [self.model_class.idservice]
+        if "name" in fields:
+            columns.append(self.model_class.servicename)
         idhost = get_parent_id("hosts")
         if idhost is not None:
             host = get_host(idhost)
-            services = host.services
+            services = DBSession.query(*columns).filter(
+                LowLevelService.idhost == host.idhost)
         else:
-            services = get_all_services(self.model_class)
-        result = []
-        for service in services:
-            result.append({
-                "id": service.idservice,
-                "type": self.type,
-                "href": tg.url("/api/v%s/%s/%s"
-                            % (self.apiver, self.type, service.idservice)),
-                "name": service.servicename,
-                })
-        return dict(services=result)
+            services = get_services_query(self.model_class, *columns)
+        stream_format = get_stream_format()
+        page = paginate(services, self.model_class.idservice,
+                        self.model_class.servicename,
+                        name, limit, offset, after, stream_format is not None)
+        baseurl = tg.url("/api/v%s/%s/" % (self.apiver, self.type))
+        def items():
+            for service in page:
+                item = {
+                    "id": service.idservice,
+                    "type": self.type,
+                    "href": "%s%s" % (baseurl, service.idservice),
+                    }
+                if "name" in fields:
+                    item["name"] = service.servicename
+                yield project(item, fields)
+        if stream_format:
+            return stream_collection(stream_format, "services", "service",
+                                     items(), page)
+        result = list(items())
+        return dict(services=result, next=page.next_url)
 
 
-    @expose("api/services-one.xml",
-            content_type="application/xml; charset=utf-8")
-    @expose("json")
-    def get_one(self, idservice):
-        # pylint:disable-msg=C0111,R0201
+    def _get_batch(self, ids):
+        """
+        Description des services demandés, obtenue par un nombre fixe
+        de requêtes SQL quel que soit le nombre de services.
+
+        @param ids: identifiants des services (cf. L{get_ids})
+        @type  ids: C{str}
+        """
+        ids = get_ids(ids)
+        idservice = self.model_class.idservice
+        services = DBSession.query(self.model_class).options(
+                *self.one_options).filter(idservice.in_(ids))
         idhost = get_parent_id("hosts")
-        service = get_service(idservice, self.type, idhost)
-        if not service:
-            raise HTTPNotFound("Can't find service %s" % idservice)
+        if idhost is not None:
+            # Seuls les services de l'hôte sont recherchés.
+            host = get_host(idhost)
+            services = services.filter(
+                LowLevelService.idhost == host.idhost)
+        found = dict([(service.idservice, service) for service in services])
+        return dict(services=batch_result(
+            ids, found, self._get_allowed(found.keys()),
+            self._serialize, "service"))
+
+
+    def _get_allowed(self, ids):
+        """
+        Détermine en une requête les services auxquels l'utilisateur
+        a accès, selon les mêmes règles que C{Service.is_allowed_for} :
+        un service de bas niveau est accessible si lui-même ou son hôte
+        appartient à l'un des groupes de l'utilisateur, un service de haut
+        niveau s'il appartient lui-même à l'un de ces groupes.
+
+        @param ids: identifiants des services
+        @type  ids: C{list}
+        @return: identifiants des services accessibles
+        @rtype:  C{set}
+        """
+        acl = get_acl_context()
+        if not acl.user:
+            raise HTTPForbidden("You must be logged in")
+        if not ids:
+            return set()
+        if acl.is_manager:
+            return set(ids)
+        user_groups = acl.supitem_group_ids
+        if not user_groups:
+            return set()
+        idservice = self.model_class.idservice
+        if self.model_class is LowLevelService:
+            criterion = visible_services_filter(user_groups)
+        else:
+            criterion = idservice.in_(select(
+                [SUPITEM_GROUP_TABLE.c.idsupitem]
+            ).where(SUPITEM_GROUP_TABLE.c.idgroup.in_(user_groups)))
+        return set([row.idservice for row in DBSession.query(idservice
+            ).filter(idservice.in_(ids)).filter(criterion)])
+
+
+    def _serialize(self, service):
+        """
+        @param service: service à décrire
+        @type  service: L{model_class}
+        @return: description complète du service
+        @rtype:  C{dict}
+        """
         result = {"id": service.idservice,
                   "type": self.type,
                   "name": service.servicename,
@@ -128,4 +227,16 @@ class ServicesV1(RestController):
                     }
         else:
             result["host"] = None
-        return dict(service=result)
+        return result
+
+
+    @expose("api/services-one.xml",
+            content_type="application/xml; charset=utf-8")
+    @expose("json")
+    def get_one(self, idservice):
+        # pylint:disable-msg=C0111,R0201
+        idhost = get_parent_id("hosts")
+        service = get_service(idservice, self.type, idhost, self.one_options)
+        if not service:
+            raise HTTPNotFound("Can't find service %s" % idservice)
+        return dict(service=self._serialize(service))
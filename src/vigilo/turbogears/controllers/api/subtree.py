@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+API d'export d'une branche de la hiérarchie des groupes d'éléments supervisés
+"""
+
+import tg
+from tg import expose
+from tg.decorators import with_trailing_slash
+from tg.controllers import RestController
+from tg.exceptions import HTTPNotFound, HTTPForbidden, HTTPBadRequest
+
+from vigilo.models import tables
+from vigilo.models.session import DBSession
+from vigilo.models.tables.secondary_tables import SUPITEM_GROUP_TABLE
+
+from vigilo.turbogears.acl import get_acl_context
+from vigilo.turbogears.controllers.api import get_parent_id, get_group_tree
+
+
+class SupItemGroupTreeV1(RestController):
+    """
+    Export en une seule réponse d'un groupe d'éléments supervisés,
+    de ses sous-groupes (directs ou non) et des hôtes et services
+    qu'ils contiennent. Ne peut être monté qu'après un groupe
+    d'éléments supervisés dans l'arborescence.
+
+    La hiérarchie provient de l'arborescence des groupes conservée
+    en mémoire ; les membres de l'ensemble des groupes sont obtenus
+    par une requête par type d'élément.
+    """
+
+    # Messages PyLint qu'on supprime
+    # - R0201: method could be a function: c'est le fonctionnement du
+    #   RestController
+
+    apiver = 1
+
+
+    def _get_members(self, idgroups):
+        """
+        @param idgroups: identifiants des groupes
+        @type  idgroups: C{set}
+        @return: dictionnaire associant à chaque groupe un dictionnaire
+            contenant la liste de ses hôtes (C{hosts}), de ses services
+            de bas niveau (C{lls}) et de haut niveau (C{hls})
+        @rtype:  C{dict}
+        """
+        baseurl = tg.url("/api/v%s" % self.apiver)
+        members = dict([(idgroup, {"hosts": [], "lls": [], "hls": []})
+                        for idgroup in idgroups])
+        if not idgroups:
+            return members
+        idgroup = SUPITEM_GROUP_TABLE.c.idgroup
+        idsupitem = SUPITEM_GROUP_TABLE.c.idsupitem
+
+        hosts = DBSession.query(
+                idgroup, tables.Host.idhost, tables.Host.name,
+            ).join(
+                (tables.Host, tables.Host.idhost == idsupitem),
+            ).filter(idgroup.in_(idgroups)
+            ).order_by(tables.Host.name)
+        for row in hosts:
+            members[row.idgroup]["hosts"].append({
+                "id": row.idhost,
+                "href": baseurl + "/hosts/%s" % row.idhost,
+                "name": row.name,
+                })
+
+        lls = DBSession.query(
+                idgroup,
+                tables.LowLevelService.idservice,
+                tables.LowLevelService.servicename,
+                tables.Host.name,
+            ).join(
+                (tables.LowLevelService,
+                    tables.LowLevelService.idservice == idsupitem),
+                (tables.Host,
+                    tables.Host.idhost == tables.LowLevelService.idhost),
+            ).filter(idgroup.in_(idgroups)
+            ).order_by(tables.Host.name, tables.LowLevelService.servicename)
+        for row in lls:
+            members[row.idgroup]["lls"].append({
+                "id": row.idservice,
+                "href": baseurl + "/lls/%s" % row.idservice,
+                "name": row.servicename,
+                "host": row.name,
+                })
+
+        hls = DBSession.query(
+                idgroup,
+                tables.HighLevelService.idservice,
+                tables.HighLevelService.servicename,
+            ).join(
+                (tables.HighLevelService,
+                    tables.HighLevelService.idservice == idsupitem),
+            ).filter(idgroup.in_(idgroups)
+            ).order_by(tables.HighLevelService.servicename)
+        for row in hls:
+            members[row.idgroup]["hls"].append({
+                "id": row.idservice,
+                "href": baseurl + "/hls/%s" % row.idservice,
+                "name": row.servicename,
+                })
+        return members
+
+
+    @with_trailing_slash
+    @expose("json")
+    def get_all(self):
+        """
+        Retourne la branche de la hiérarchie dont la racine est le groupe
+        désigné dans l'URL. Les sous-groupes auxquels l'utilisateur n'a pas
+        accès sont omis, ainsi que leurs descendants. Les groupes qu'il ne
+        peut que traverser sont retournés sans leurs éléments.
+        """
+        # pylint:disable-msg=R0201
+        try:
+            idgroup = int(get_parent_id("supitemgroups"))
+        except (ValueError, TypeError):
+            raise HTTPBadRequest("An integer was expected")
+        acl = get_acl_context()
+        if not acl.user:
+            raise HTTPForbidden("You must be logged in")
+
+        tree = get_group_tree(tables.SupItemGroup)
+        if idgroup not in tree:
+            # Groupe créé depuis la construction de l'arborescence.
+            tree = get_group_tree(tables.SupItemGroup, refresh=True)
+            if idgroup not in tree:
+                raise HTTPNotFound("Can't find group %s" % idgroup)
+
+        # Les groupes parcourus incluent ceux que l'utilisateur ne peut
+        # que traverser (ancêtres des groupes auxquels il a accès) ;
+        # leurs éléments ne sont retournés que pour les groupes auxquels
+        # il a pleinement accès.
+        allowed_groups = member_groups = None
+        if not acl.is_manager:
+            allowed_groups = frozenset(acl.visible_supitem_group_ids)
+            member_groups = frozenset(acl.supitem_group_ids)
+            if idgroup not in allowed_groups:
+                raise HTTPForbidden("Access denied to group %s" % idgroup)
+
+        # Groupes de la branche accessibles à l'utilisateur.
+        idgroups = set()
+        pending = [idgroup]
+        while pending:
+            current = pending.pop()
+            idgroups.add(current)
+            pending.extend([
+                idchild for idchild in tree.children(current)
+                if allowed_groups is None or idchild in allowed_groups
+            ])
+        if member_groups is not None:
+            members = self._get_members(idgroups & member_groups)
+        else:
+            members = self._get_members(idgroups)
+
+        baseurl = tg.url("/api/v%s/supitemgroups" % self.apiver)
+        def build(current):
+            node = {
+                "id": current,
+                "name": tree.path(current),
+                "href": "%s/%s" % (baseurl, current),
+                "children": [build(idchild)
+                             for idchild in tree.children(current)
+                             if idchild in idgroups],
+                }
+            node.update(members.get(current,
+                                    {"hosts": [], "lls": [], "hls": []}))
+            return node
+        return dict(group=build(idgroup))
@@ -6,8 +6,13 @@
 Module permettant de mettre en commun le contrôleur d'auto-complétion
 entre les différentes applications de Vigilo.
 """
-from tg import expose, request, validate, config
-from sqlalchemy.sql.expression import or_
+import threading
+
+import transaction
+from tg import expose, validate, config
+from paste.deploy.converters import asbool
+from sqlalchemy.sql.expression import case, literal_column, null, \
+                                        select, union_all
 
 from vigilo.models.tables import Host, SupItemGroup, PerfDataSource, Graph, \
                                     LowLevelService, HighLevelService
@@ -16,17 +21,218 @@ from vigilo.models.functions import sql_escape_like
 from vigilo.models.tables.secondary_tables import SUPITEM_GROUP_TABLE, \
                                             GRAPH_PERFDATASOURCE_TABLE
 
-from vigilo.turbogears.helpers import get_current_user
+from vigilo.turbogears.acl import get_acl_context, visible_hosts_filter, \
+                                  visible_services_filter
+from vigilo.turbogears.hostindex import HostIndex, RefreshingIndex
+from vigilo.turbogears.cache import TTLCache
 from vigilo.turbogears.controllers import BaseController
 from tw.forms import validators
 from formencode import schema
 
+# Index en mémoire des noms d'hôtes (cf. _get_host_index).
+_HOST_INDEX = None
+_HOST_INDEX_LOCK = threading.Lock()
+
+# Cache des réponses de l'auto-compléteur (cf. _get_response_cache).
+_RESPONSE_CACHE = None
+_RESPONSE_CACHE_LOCK = threading.Lock()
+
+
+def _load_host_index():
+    """
+    Construit l'index des noms d'hôtes à partir de la base de données.
+    Chaque hôte est associé à ses groupes et à ceux de ses services,
+    comme dans la requête SQL de L{AutoCompleteController.host}.
+
+    @return: Index des noms d'hôtes.
+    @rtype: L{HostIndex}
+    """
+    try:
+        hosts = {}
+        for idhost, name in DBSession.query(Host.idhost, Host.name):
+            hosts[idhost] = (name, set())
+        service_hosts = dict(DBSession.query(
+            LowLevelService.idservice, LowLevelService.idhost).all())
+        for idsupitem, idgroup in DBSession.query(
+                SUPITEM_GROUP_TABLE.c.idsupitem,
+                SUPITEM_GROUP_TABLE.c.idgroup):
+            idhost = service_hosts.get(idsupitem, idsupitem)
+            if idhost in hosts:
+                hosts[idhost][1].add(idgroup)
+        return HostIndex(hosts.values())
+    finally:
+        # L'index est construit dans un thread dédié,
+        # disposant de sa propre session.
+        transaction.abort()
+        DBSession.remove()
+
+def _get_host_index():
+    """
+    Retourne l'index en mémoire des noms d'hôtes, s'il est activé
+    et suffisamment récent. Dans le cas contraire, l'auto-compléteur
+    interroge directement la base de données.
+
+    Options de configuration reconnues :
+     -  autocomplete_host_index : active l'index (désactivé par défaut).
+     -  autocomplete_host_index_refresh : âge (en secondes) au-delà
+        duquel l'index est reconstruit en arrière-plan (60 par défaut).
+     -  autocomplete_host_index_max_age : âge (en secondes) au-delà
+        duquel l'index n'est plus utilisé (300 par défaut).
+
+    @return: Index des noms d'hôtes ou C{None}.
+    @rtype: L{HostIndex}
+    """
+    global _HOST_INDEX # pylint: disable-msg=W0603
+    if not asbool(config.get('autocomplete_host_index', False)):
+        return None
+    with _HOST_INDEX_LOCK:
+        if _HOST_INDEX is None:
+            _HOST_INDEX = RefreshingIndex(
+                _load_host_index,
+                int(config.get('autocomplete_host_index_refresh', 60)),
+                int(config.get('autocomplete_host_index_max_age', 300)),
+            )
+    return _HOST_INDEX.get()
+
+def _get_response_cache():
+    """
+    Retourne le cache des réponses de l'auto-compléteur, en le créant
+    si nécessaire à partir de la configuration. Les réponses sont
+    partagées entre les utilisateurs disposant des mêmes droits
+    (cf. L{vigilo.turbogears.acl.AclContext.cache_key}).
+
+    Options de configuration reconnues :
+     -  autocomplete_cache_ttl : durée de validité (en secondes)
+        des réponses (0 par défaut, ce qui désactive le cache).
+     -  autocomplete_cache_size : nombre maximal de réponses
+        conservées (1000 par défaut).
+
+    @return: Cache ou C{None} si le cache est désactivé.
+    @rtype: L{TTLCache}
+    """
+    global _RESPONSE_CACHE # pylint: disable-msg=W0603
+    with _RESPONSE_CACHE_LOCK:
+        if _RESPONSE_CACHE is None:
+            ttl = int(config.get('autocomplete_cache_ttl', 0))
+            if ttl <= 0:
+                return None
+            _RESPONSE_CACHE = TTLCache(
+                ttl, int(config.get('autocomplete_cache_size', 1000)))
+        return _RESPONSE_CACHE
+
+def _cache_get(key):
+    """
+    Retourne la réponse mise en cache pour la requête donnée,
+    compte tenu des droits de l'utilisateur courant.
+
+    @param key: Méthode appelée et paramètres (normalisés) de l'appel.
+    @type key: C{tuple}
+    @return: Réponse ou C{None}.
+    @rtype: C{dict}
+    """
+    response_cache = _get_response_cache()
+    if response_cache is None:
+        return None
+    response = response_cache.get(key + (get_acl_context().cache_key, ))
+    if response is not None:
+        response = dict(response)
+    return response
+
+def _cache_set(key, response):
+    """
+    Met en cache une réponse (cf. L{_cache_get}).
+
+    @param key: Méthode appelée et paramètres (normalisés) de l'appel.
+    @type key: C{tuple}
+    @param response: Réponse à mettre en cache.
+    @type response: C{dict}
+    @return: La réponse.
+    @rtype: C{dict}
+    """
+    response_cache = _get_response_cache()
+    if response_cache is not None:
+        response_cache.set(key + (get_acl_context().cache_key, ),
+                           dict(response))
+    return response
+
+def _get_limit(limit):
+    """
+    Plafonne le nombre de résultats demandé par le client
+    (option de configuration autocomplete_limit, cf. L{_paginate}).
+
+    @param limit: Nombre maximal de résultats demandé par le client.
+    @type limit: C{int}
+    @return: Nombre maximal de résultats à retourner,
+        ou C{None} s'il n'y a pas de limite.
+    @rtype: C{int}
+    """
+    cap = int(config.get('autocomplete_limit', 1000))
+    if cap > 0 and (limit is None or limit > cap):
+        return cap
+    return limit
+
+def _search_rank(column, pattern):
+    """
+    Construit l'expression SQL de classement des résultats
+    de L{AutoCompleteController.search} : 0 si le nom correspond
+    exactement au motif (sans ses jokers initiaux et finaux),
+    1 s'il commence par ce motif, 2 sinon.
+
+    @param column: Colonne contenant le nom de l'élément.
+    @type column: C{sqlalchemy.schema.Column}
+    @param pattern: Motif recherché, avec ses jokers.
+    @type pattern: C{unicode}
+    @return: Expression SQL de classement, nommée "rank".
+    """
+    core = sql_escape_like(pattern.strip(u'*'))
+    return case([
+        (column.ilike(core), 0),
+        (column.ilike(core + '%'), 1),
+    ], else_=2).label('rank')
+
+def _paginate(results, limit, offset):
+    """
+    Extrait une page de résultats.
+
+    Le nombre de résultats retournés est plafonné par l'option
+    de configuration autocomplete_limit (1000 par défaut, 0 pour
+    ne pas plafonner), y compris lorsque le client ne précise
+    pas de limite.
+
+    @param results: Requête SQLAlchemy ou liste des résultats.
+        Dans le cas d'une requête, la pagination est effectuée
+        par la base de données (LIMIT/OFFSET).
+    @type results: C{sqlalchemy.orm.query.Query} ou C{list}
+    @param limit: Nombre maximal de résultats demandé par le client.
+    @type limit: C{int}
+    @param offset: Nombre de résultats à ignorer.
+    @type offset: C{int}
+    @return: Couple formé de la liste des résultats de la page
+        et d'un booléen indiquant si d'autres résultats suivent.
+    @rtype: C{tuple}
+    """
+    limit = _get_limit(limit)
+    offset = offset or 0
+    if limit is None:
+        return (list(results[offset:]), False)
+    # On récupère un résultat supplémentaire pour savoir
+    # si d'autres résultats suivent.
+    page = list(results[offset:offset + limit + 1])
+    return (page[:limit], len(page) > limit)
+
+
 # pylint: disable-msg=R0201,W0232
 # - R0201: méthodes pouvant être écrites comme fonctions (imposé par TG2)
 # - W0232: absence de __init__ dans la classe (imposé par TG2)
 
 class AutoCompleteController(BaseController):
-    """Contrôleur d'auto-complétion."""
+    """
+    Contrôleur d'auto-complétion.
+
+    Toutes les méthodes acceptent les paramètres "limit" et "offset"
+    permettant de paginer les résultats (cf. L{_paginate}). La clé "more"
+    de la réponse indique si d'autres résultats sont disponibles.
+    """
 
     def __init__(self, allow_only=None):
         super(AutoCompleteController, self).__init__()
@@ -39,11 +245,14 @@ class AutoCompleteController(BaseController):
         """
         host = validators.UnicodeString()
         partial = validators.StringBool(if_missing=False)
+        limit = validators.Int(if_missing=None, min=0)
+        offset = validators.Int(if_missing=0, min=0)
         noCache = validators.UnicodeString(if_missing=None)
 
     @validate(validators=HostSchema())
     @expose('json')
-    def host(self, host, partial=False, noCache=None):
+    def host(self, host, partial=False,
+             limit=None, offset=0, noCache=None):
         """
         Auto-compléteur pour les noms d'hôtes.
 
@@ -59,38 +268,42 @@ class AutoCompleteController(BaseController):
             et auxquels l'utilisateur a accès.
         @rtype: C{dict}
         """
-        host = sql_escape_like(host)
-        user = get_current_user()
-        if not user:
-            return dict(results=[])
+        acl = get_acl_context()
+        if not acl.user:
+            return dict(results=[], more=False)
+
+        key = ('host', host.lower(), partial, limit, offset)
+        cached = _cache_get(key)
+        if cached is not None:
+            return cached
+
+        index = _get_host_index()
+        if index is not None:
+            allowed_groups = None
+            if not acl.is_manager:
+                allowed_groups = set(acl.supitem_group_ids)
+            hostnames, more = _paginate(
+                index.search(host, partial, allowed_groups), limit, offset)
+            return _cache_set(key, dict(results=hostnames, more=more))
 
+        host = sql_escape_like(host)
         if partial:
             host += '%'
 
-        hostgroup = SUPITEM_GROUP_TABLE.alias()
-        servicegroup = SUPITEM_GROUP_TABLE.alias()
         hostnames = DBSession.query(
                 Host.name
-            ).distinct(
-            ).outerjoin(
-                (hostgroup, hostgroup.c.idsupitem == Host.idhost),
-                (LowLevelService, LowLevelService.idhost == Host.idhost),
-                (servicegroup, servicegroup.c.idsupitem == \
-                    LowLevelService.idservice),
             ).filter(Host.name.ilike(host)
             ).order_by(Host.name)
 
-        if not config.is_manager.is_met(request.environ):
-            user_groups = [ug[0] for ug in user.supitemgroups() if ug[1]]
+        if not acl.is_manager:
+            user_groups = acl.supitem_group_ids
             if not user_groups:
-                return dict(results=[])
-            hostnames = hostnames.filter(or_(
-                hostgroup.c.idgroup.in_(user_groups),
-                servicegroup.c.idgroup.in_(user_groups),
-            ))
+                return dict(results=[], more=False)
+            hostnames = hostnames.filter(visible_hosts_filter(user_groups))
 
-        hostnames = hostnames.all()
-        return dict(results=[h.name for h in hostnames])
+        hostnames, more = _paginate(hostnames, limit, offset)
+        return _cache_set(key, dict(
+            results=[h.name for h in hostnames], more=more))
 
     class ServiceSchema(schema.Schema):
         """
@@ -99,11 +312,14 @@ class AutoCompleteController(BaseController):
         service = validators.UnicodeString()
         host = validators.UnicodeString(if_missing=None)
         partial = validators.StringBool(if_missing=False)
+        limit = validators.Int(if_missing=None, min=0)
+        offset = validators.Int(if_missing=0, min=0)
         noCache = validators.UnicodeString(if_missing=None)
 
     @validate(validators=ServiceSchema())
     @expose('json')
-    def service(self, service, host=None, partial=False, noCache=None):
+    def service(self, service, host=None, partial=False,
+                limit=None, offset=0, noCache=None):
         """
         Auto-compléteur pour les noms des services d'un hôte.
 
@@ -124,40 +340,40 @@ class AutoCompleteController(BaseController):
         @rtype: C{dict}
         """
         service = sql_escape_like(service)
-        user = get_current_user()
-        if not user:
-            return dict(results=[])
+        acl = get_acl_context()
+        if not acl.user:
+            return dict(results=[], more=False)
+
+        key = ('service', service.lower(), host, partial, limit, offset)
+        cached = _cache_get(key)
+        if cached is not None:
+            return cached
 
         if partial:
             service += '%'
 
-        hostgroup = SUPITEM_GROUP_TABLE.alias()
-        servicegroup = SUPITEM_GROUP_TABLE.alias()
+        # Le DISTINCT reste nécessaire : plusieurs hôtes
+        # peuvent avoir des services portant le même nom.
         services = DBSession.query(
                 LowLevelService.servicename
             ).distinct(
-            ).outerjoin(
+            ).join(
                 (Host, Host.idhost == LowLevelService.idhost),
-                (hostgroup, hostgroup.c.idsupitem == Host.idhost),
-                (servicegroup, servicegroup.c.idsupitem == \
-                    LowLevelService.idservice),
             ).filter(LowLevelService.servicename.ilike(service)
             ).order_by(LowLevelService.servicename)
 
-        if not config.is_manager.is_met(request.environ):
-            user_groups = [ug[0] for ug in user.supitemgroups() if ug[1]]
+        if not acl.is_manager:
+            user_groups = acl.supitem_group_ids
             if not user_groups:
-                return dict(results=[])
-            services = services.filter(or_(
-                hostgroup.c.idgroup.in_(user_groups),
-                servicegroup.c.idgroup.in_(user_groups),
-            ))
+                return dict(results=[], more=False)
+            services = services.filter(visible_services_filter(user_groups))
 
         if host:
             services = services.filter(Host.name == host)
 
-        services = services.all()
-        return dict(results=[s.servicename for s in services])
+        services, more = _paginate(services, limit, offset)
+        return _cache_set(key, dict(
+            results=[s.servicename for s in services], more=more))
 
     class HlsSchema(schema.Schema):
         """
@@ -165,11 +381,14 @@ class AutoCompleteController(BaseController):
         """
         service = validators.UnicodeString()
         partial = validators.StringBool(if_missing=False)
+        limit = validators.Int(if_missing=None, min=0)
+        offset = validators.Int(if_missing=0, min=0)
         noCache = validators.UnicodeString(if_missing=None)
 
     @validate(validators=HlsSchema())
     @expose('json')
-    def hls(self, service, partial=False, noCache=None):
+    def hls(self, service, partial=False,
+            limit=None, offset=0, noCache=None):
         """
         Auto-compléteur pour les noms des services de haut niveau.
 
@@ -186,9 +405,14 @@ class AutoCompleteController(BaseController):
         @rtype: C{dict}
         """
         service = sql_escape_like(service)
-        user = get_current_user()
-        if not user:
-            return dict(results=[])
+        acl = get_acl_context()
+        if not acl.user:
+            return dict(results=[], more=False)
+
+        key = ('hls', service.lower(), partial, limit, offset)
+        cached = _cache_get(key)
+        if cached is not None:
+            return cached
 
         if partial:
             service += '%'
@@ -199,25 +423,29 @@ class AutoCompleteController(BaseController):
             ).filter(HighLevelService.servicename.ilike(service)
             ).order_by(HighLevelService.servicename)
 
-#        if not config.is_manager.is_met(request.environ):
-#            user_groups = [ug[0] for ug in user.supitemgroups() if ug[1]]
+#        if not acl.is_manager:
+#            user_groups = acl.supitem_group_ids
 #            services = services.join(
 #                    (SUPITEM_GROUP_TABLE, SUPITEM_GROUP_TABLE.c.idsupitem == \
 #                                            HighLevelService.idservice),
 #                ).filter(SUPITEM_GROUP_TABLE.c.idgroup.in_(user_groups))
 
-        services = services.all()
-        return dict(results=[s.servicename for s in services])
+        services, more = _paginate(services, limit, offset)
+        return _cache_set(key, dict(
+            results=[s.servicename for s in services], more=more))
 
     class SupItemGroupSchema(schema.Schema):
         """Schéma de validation de la méthode default."""
         supitemgroup = validators.UnicodeString()
         partial = validators.StringBool(if_missing=False)
+        limit = validators.Int(if_missing=None, min=0)
+        offset = validators.Int(if_missing=0, min=0)
         noCache = validators.UnicodeString(if_missing=None)
 
     @validate(validators=SupItemGroupSchema())
     @expose('json')
-    def supitemgroup(self, supitemgroup, partial=False, noCache=None):
+    def supitemgroup(self, supitemgroup, partial=False,
+                     limit=None, offset=0, noCache=None):
         """
         Auto-compléteur pour les noms des groupes d'éléments supervisés.
 
@@ -230,9 +458,15 @@ class AutoCompleteController(BaseController):
         @rtype: C{dict}
         """
         supitemgroup = sql_escape_like(supitemgroup)
-        user = get_current_user()
-        if not user:
-            return dict(results=[])
+        acl = get_acl_context()
+        if not acl.user:
+            return dict(results=[], more=False)
+
+        key = ('supitemgroup', supitemgroup.lower(), partial,
+               limit, offset)
+        cached = _cache_get(key)
+        if cached is not None:
+            return cached
 
         if partial:
             supitemgroup += '%'
@@ -240,29 +474,34 @@ class AutoCompleteController(BaseController):
         supitemgroups = DBSession.query(
                 SupItemGroup.name
             ).distinct(
-            ).filter(SupItemGroup.name.ilike(supitemgroup))
+            ).filter(SupItemGroup.name.ilike(supitemgroup)
+            ).order_by(SupItemGroup.name)
 
-        if not config.is_manager.is_met(request.environ):
-            user_groups = [ug[0] for ug in user.supitemgroups() if ug[1]]
+        if not acl.is_manager:
+            user_groups = acl.supitem_group_ids
             if not user_groups:
-                return dict(results=[])
+                return dict(results=[], more=False)
             supitemgroups = supitemgroups.filter(
                 SupItemGroup.idgroup.in_(user_groups),
             )
 
-        supitemgroups = supitemgroups.all()
-        return dict(results=[s.name for s in supitemgroups])
+        supitemgroups, more = _paginate(supitemgroups, limit, offset)
+        return _cache_set(key, dict(
+            results=[s.name for s in supitemgroups], more=more))
 
     class PerfDataSourceSchema(schema.Schema):
         """Schéma de validation de la méthode default."""
         ds = validators.UnicodeString()
         host = validators.UnicodeString()
         partial = validators.StringBool(if_missing=False)
+        limit = validators.Int(if_missing=None, min=0)
+        offset = validators.Int(if_missing=0, min=0)
         noCache = validators.UnicodeString(if_missing=None)
 
     @validate(validators=PerfDataSourceSchema())
     @expose('json')
-    def perfdatasource(self, ds, host, partial=False, noCache=None):
+    def perfdatasource(self, ds, host, partial=False,
+                       limit=None, offset=0, noCache=None):
         """
         Auto-compléteur pour les noms des indicateurs de performance.
 
@@ -276,9 +515,14 @@ class AutoCompleteController(BaseController):
         @rtype: C{dict}
         """
         ds = sql_escape_like(ds)
-        user = get_current_user()
-        if not user:
-            return dict(results=[])
+        acl = get_acl_context()
+        if not acl.user:
+            return dict(results=[], more=False)
+
+        key = ('perfdatasource', ds.lower(), host, partial, limit, offset)
+        cached = _cache_get(key)
+        if cached is not None:
+            return cached
 
         if partial:
             ds += '%'
@@ -292,28 +536,32 @@ class AutoCompleteController(BaseController):
             ).filter(Host.name == host
             ).order_by(PerfDataSource.name)
 
-        if not config.is_manager.is_met(request.environ):
-            user_groups = [ug[0] for ug in user.supitemgroups() if ug[1]]
+        if not acl.is_manager:
+            user_groups = acl.supitem_group_ids
             if not user_groups:
-                return dict(results=[])
+                return dict(results=[], more=False)
             perfdatasources = perfdatasources.join(
                     (SUPITEM_GROUP_TABLE, SUPITEM_GROUP_TABLE.c.idsupitem == \
                         Host.idhost),
                 ).filter(SUPITEM_GROUP_TABLE.c.idgroup.in_(user_groups))
 
-        perfdatasources = perfdatasources.all()
-        return dict(results=[ds.name for ds in perfdatasources])
+        perfdatasources, more = _paginate(perfdatasources, limit, offset)
+        return _cache_set(key, dict(
+            results=[ds.name for ds in perfdatasources], more=more))
 
     class GraphSchema(schema.Schema):
         """Schéma de validation de la méthode default."""
         graphname = validators.UnicodeString()
         host = validators.UnicodeString()
         partial = validators.StringBool(if_missing=False)
+        limit = validators.Int(if_missing=None, min=0)
+        offset = validators.Int(if_missing=0, min=0)
         noCache = validators.UnicodeString(if_missing=None)
 
     @validate(validators=GraphSchema())
     @expose('json')
-    def graph(self, graphname, host, partial=False, noCache=None):
+    def graph(self, graphname, host, partial=False,
+              limit=None, offset=0, noCache=None):
         """
         Auto-compléteur pour les noms des graphes.
 
@@ -327,9 +575,14 @@ class AutoCompleteController(BaseController):
         @rtype: C{dict}
         """
         graphname = sql_escape_like(graphname)
-        user = get_current_user()
-        if not user:
-            return dict(results=[])
+        acl = get_acl_context()
+        if not acl.user:
+            return dict(results=[], more=False)
+
+        key = ('graph', graphname.lower(), host, partial, limit, offset)
+        cached = _cache_get(key)
+        if cached is not None:
+            return cached
 
         if partial:
             graphname += '%'
@@ -347,14 +600,188 @@ class AutoCompleteController(BaseController):
             ).filter(Host.name == host
             ).order_by(Graph.name)
 
-        if not config.is_manager.is_met(request.environ):
-            user_groups = [ug[0] for ug in user.supitemgroups() if ug[1]]
+        if not acl.is_manager:
+            user_groups = acl.supitem_group_ids
             if not user_groups:
-                return dict(results=[])
+                return dict(results=[], more=False)
             graphs = graphs.join(
                     (SUPITEM_GROUP_TABLE, SUPITEM_GROUP_TABLE.c.idsupitem == \
                         Host.idhost),
                 ).filter(SUPITEM_GROUP_TABLE.c.idgroup.in_(user_groups))
 
-        graphs = graphs.all()
-        return dict(results=[g.name for g in graphs])
+        graphs, more = _paginate(graphs, limit, offset)
+        return _cache_set(key, dict(
+            results=[g.name for g in graphs], more=more))
+
+    # Types d'éléments recherchés par la méthode search.
+    SEARCH_TYPES = ('host', 'service', 'graph', 'perfdatasource',
+                    'supitemgroup')
+
+    class SearchSchema(schema.Schema):
+        """Schéma de validation de la méthode search."""
+        pattern = validators.UnicodeString()
+        types = validators.UnicodeString(if_missing=None)
+        partial = validators.StringBool(if_missing=False)
+        limit = validators.Int(if_missing=None, min=0)
+        offset = validators.Int(if_missing=0, min=0)
+        noCache = validators.UnicodeString(if_missing=None)
+
+    @validate(validators=SearchSchema())
+    @expose('json')
+    def search(self, pattern, types=None, partial=False,
+               limit=None, offset=0, noCache=None):
+        """
+        Auto-compléteur global, recherchant simultanément les hôtes,
+        les services, les graphes, les indicateurs de performance
+        et les groupes d'éléments supervisés, en une seule requête SQL.
+
+        @param pattern: Motif qui doit apparaître dans le nom des éléments.
+        @type pattern: C{unicode}
+        @param types: Liste des types d'éléments recherchés, séparés
+            par des virgules (par défaut, tous les types de L{SEARCH_TYPES}).
+        @type types: C{unicode}
+        @note: Les caractères '?' et '*' peuvent être utilisés dans
+            le paramètre L{pattern} pour remplacer un caractère quelconque
+            ou une chaîne de caractères, respectivement.
+        @return: Un dictionnaire dont la clé 'results' contient la liste
+            des éléments correspondant au motif et auxquels l'utilisateur
+            a accès. Chaque élément est décrit par un dictionnaire
+            contenant son type ('type'), son nom ('name') et le nom
+            de l'hôte auquel il est rattaché ('host', C{None} pour
+            les hôtes et les groupes). Les éléments correspondant
+            exactement au motif apparaissent en premier, suivis
+            de ceux commençant par le motif, puis des autres.
+        @rtype: C{dict}
+        """
+        acl = get_acl_context()
+        if not acl.user:
+            return dict(results=[], more=False)
+
+        if types:
+            types = [t for t in self.SEARCH_TYPES
+                     if t in [t2.strip() for t2 in types.split(',')]]
+        else:
+            types = list(self.SEARCH_TYPES)
+
+        key = ('search', pattern.lower(), tuple(types), partial,
+               limit, offset)
+        cached = _cache_get(key)
+        if cached is not None:
+            return cached
+
+        user_groups = None
+        if not acl.is_manager:
+            user_groups = acl.supitem_group_ids
+            if not user_groups:
+                return dict(results=[], more=False)
+
+        like = sql_escape_like(pattern)
+        if partial:
+            like += '%'
+
+        # Hôtes appartenant directement à l'un des groupes de l'utilisateur
+        # (même critère que pour les méthodes graph et perfdatasource).
+        grouped_hosts = None
+        if user_groups is not None:
+            grouped_hosts = select(
+                [SUPITEM_GROUP_TABLE.c.idsupitem],
+                SUPITEM_GROUP_TABLE.c.idgroup.in_(user_groups))
+
+        queries = []
+        if 'host' in types:
+            rank = _search_rank(Host.name, pattern)
+            query = DBSession.query(
+                    literal_column("'host'").label('type'),
+                    Host.name.label('name'),
+                    null().label('host'),
+                    rank,
+                ).filter(Host.name.ilike(like))
+            if user_groups is not None:
+                query = query.filter(visible_hosts_filter(user_groups))
+            queries.append((query, rank, Host.name))
+
+        if 'service' in types:
+            rank = _search_rank(LowLevelService.servicename, pattern)
+            query = DBSession.query(
+                    literal_column("'service'").label('type'),
+                    LowLevelService.servicename.label('name'),
+                    Host.name.label('host'),
+                    rank,
+                ).join(
+                    (Host, Host.idhost == LowLevelService.idhost),
+                ).filter(LowLevelService.servicename.ilike(like))
+            if user_groups is not None:
+                query = query.filter(visible_services_filter(user_groups))
+            queries.append((query, rank, LowLevelService.servicename))
+
+        if 'graph' in types:
+            rank = _search_rank(Graph.name, pattern)
+            query = DBSession.query(
+                    literal_column("'graph'").label('type'),
+                    Graph.name.label('name'),
+                    Host.name.label('host'),
+                    rank,
+                ).distinct(
+                ).join(
+                    (GRAPH_PERFDATASOURCE_TABLE,
+                        GRAPH_PERFDATASOURCE_TABLE.c.idgraph == Graph.idgraph),
+                    (PerfDataSource, PerfDataSource.idperfdatasource ==
+                        GRAPH_PERFDATASOURCE_TABLE.c.idperfdatasource),
+                    (Host, Host.idhost == PerfDataSource.idhost),
+                ).filter(Graph.name.ilike(like))
+            if user_groups is not None:
+                query = query.filter(Host.idhost.in_(grouped_hosts))
+            queries.append((query, rank, Graph.name))
+
+        if 'perfdatasource' in types:
+            rank = _search_rank(PerfDataSource.name, pattern)
+            query = DBSession.query(
+                    literal_column("'perfdatasource'").label('type'),
+                    PerfDataSource.name.label('name'),
+                    Host.name.label('host'),
+                    rank,
+                ).join(
+                    (Host, Host.idhost == PerfDataSource.idhost),
+                ).filter(PerfDataSource.name.ilike(like))
+            if user_groups is not None:
+                query = query.filter(Host.idhost.in_(grouped_hosts))
+            queries.append((query, rank, PerfDataSource.name))
+
+        if 'supitemgroup' in types:
+            rank = _search_rank(SupItemGroup.name, pattern)
+            query = DBSession.query(
+                    literal_column("'supitemgroup'").label('type'),
+                    SupItemGroup.name.label('name'),
+                    null().label('host'),
+                    rank,
+                ).distinct(
+                ).filter(SupItemGroup.name.ilike(like))
+            if user_groups is not None:
+                query = query.filter(SupItemGroup.idgroup.in_(user_groups))
+            queries.append((query, rank, SupItemGroup.name))
+
+        if not queries:
+            return dict(results=[], more=False)
+
+        # Chaque type est limité séparément aux meilleurs résultats
+        # de la page demandée, puis les résultats sont regroupés
+        # (UNION ALL) et classés par la base de données.
+        # Le tri s'effectue sur le libellé "rank" : avec DISTINCT,
+        # PostgreSQL exige que l'expression figure dans le SELECT.
+        limit = _get_limit(limit)
+        offset = offset or 0
+        members = []
+        for query, rank, name in queries:
+            if limit is not None:
+                query = query.order_by(rank, name).limit(
+                    offset + limit + 1)
+            members.append(select([query.subquery()]))
+        union = union_all(*members).alias()
+        results = DBSession.query(union).order_by(
+            union.c.rank, union.c.name, union.c.type, union.c.host)
+
+        results, more = _paginate(results, limit, offset)
+        return _cache_set(key, dict(results=[
+            dict(type=r.type, name=r.name, host=r.host)
+            for r in results
+        ], more=more))
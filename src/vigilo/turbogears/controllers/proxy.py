@@ -9,6 +9,7 @@ affiché dans Vigilo.
 """
 
 import re
+import threading
 import urllib, urllib2, urlparse, logging
 import tg
 from tg import request, expose, config, response, decorators
@@ -22,7 +23,15 @@ from vigilo.models.tables import VigiloServer, Host, Ventilation, Application
 from vigilo.models.tables import SupItemGroup, LowLevelService
 from vigilo.models.tables.secondary_tables import SUPITEM_GROUP_TABLE
 
-from vigilo.turbogears.helpers import get_current_user
+from vigilo.turbogears.acl import get_acl_context, visible_hosts_filter
+from vigilo.turbogears.cache import TTLCache
+from vigilo.turbogears.httpcache import CachedResponse, CachingReader, \
+                                        get_freshness, etag_matches
+from vigilo.turbogears.streaming import iter_file, iter_rewrite, \
+                                        DEFAULT_CHUNK_SIZE
+from vigilo.turbogears.httppool import ConnectionPool, PooledHTTPHandler, \
+                                        PooledHTTPSHandler
+from vigilo.turbogears.fanout import WorkerPool, DeadlineExceeded
 from vigilo.turbogears.controllers import BaseController
 
 try:
@@ -36,35 +45,418 @@ except:
 
 LOGGER = logging.getLogger(__name__)
 
-__all__ = ('make_proxy_controller', 'get_through_proxy', )
+__all__ = ('make_proxy_controller', 'get_through_proxy',
+           'invalidate_server_cache', 'resolve_proxy', 'fetch_through_proxy',
+           'ProxyRequest', 'get_many_through_proxy', 'DeadlineExceeded', )
+
+# Réservoir de connexions persistantes vers les serveurs distants,
+# partagé par tous les threads du processus (cf. _get_connection_pool).
+_CONNECTION_POOL = None
+_CONNECTION_POOL_LOCK = threading.Lock()
+
+# Groupe de threads chargé des requêtes parallèles vers les serveurs
+# distants, partagé par tous les threads du processus
+# (cf. _get_fanout_pool).
+_FANOUT_POOL = None
+_FANOUT_POOL_LOCK = threading.Lock()
+
+# Cache des associations (type d'application, hôte) -> serveur Vigilo
+# responsable de l'hôte (cf. _get_server_cache).
+_SERVER_CACHE = None
+_SERVER_CACHE_LOCK = threading.Lock()
+
+# Cache partagé des réponses obtenues au travers du proxy
+# (cf. _get_response_cache).
+_RESPONSE_CACHE = None
+_RESPONSE_CACHE_LOCK = threading.Lock()
+
+# En-têtes de la requête influant sur le contenu de la réponse
+# et qui font donc partie de la clé du cache des réponses.
+_RESPONSE_CACHE_VARY = ('Accept', 'Accept-Encoding', 'Accept-Language')
+
+# En-têtes "hop-by-hop" (RFC 7230, section 6.1), propres à la connexion
+# avec le serveur distant et qui ne doivent pas être transmis au client.
+_HOP_BY_HOP_HEADERS = frozenset([
+    'connection',
+    'keep-alive',
+    'proxy-authenticate',
+    'proxy-authorization',
+    'te',
+    'trailer',
+    'transfer-encoding',
+    'upgrade',
+])
+
+# Les gestionnaires d'authentification de urllib2 ont un état interne
+# (compteur de tentatives, nonce, ...) : les "openers" sont donc conservés
+# par thread, tandis que les connexions sont partagées via le réservoir.
+_OPENERS = threading.local()
+
+
+def _get_connection_pool():
+    """
+    Retourne le réservoir de connexions persistantes du processus,
+    en le créant si nécessaire à partir de la configuration.
+
+    Options de configuration reconnues :
+     -  app_pool_size : nombre maximal de connexions simultanées
+        vers chaque serveur distant, qui borne aussi le nombre de
+        connexions inutilisées conservées (10 par défaut, 0 pour
+        désactiver les connexions persistantes et cette limite).
+     -  app_pool_idle_timeout : durée en secondes au-delà de laquelle
+        une connexion inutilisée est fermée (30 par défaut).
+     -  app_pool_wait_timeout : durée maximale en secondes d'attente
+        d'une connexion lorsque la limite est atteinte, au-delà de
+        laquelle la requête échoue (30 par défaut).
+
+    @return: Réservoir de connexions ou C{None} si les connexions
+        persistantes sont désactivées.
+    @rtype: L{ConnectionPool}
+    """
+    global _CONNECTION_POOL # pylint: disable-msg=W0603
+    with _CONNECTION_POOL_LOCK:
+        if _CONNECTION_POOL is None:
+            maxsize = int(config.get('app_pool_size', 10))
+            if maxsize <= 0:
+                return None
+            _CONNECTION_POOL = ConnectionPool(
+                maxsize,
+                int(config.get('app_pool_idle_timeout', 30)),
+                wait_timeout=float(config.get('app_pool_wait_timeout', 30)),
+            )
+        return _CONNECTION_POOL
+
+def _get_fanout_pool():
+    """
+    Retourne le groupe de threads du processus chargé des requêtes
+    parallèles (cf. L{get_many_through_proxy}), en le créant si nécessaire
+    à partir de la configuration.
+
+    Options de configuration reconnues :
+     -  app_fanout_workers : nombre maximal de requêtes simultanées
+        (8 par défaut).
+     -  app_fanout_per_backend : nombre maximal de requêtes simultanées
+        vers un même serveur distant (2 par défaut).
+
+    @return: Groupe de threads partagé.
+    @rtype: L{WorkerPool}
+    """
+    global _FANOUT_POOL # pylint: disable-msg=W0603
+    with _FANOUT_POOL_LOCK:
+        if _FANOUT_POOL is None:
+            _FANOUT_POOL = WorkerPool(
+                int(config.get('app_fanout_workers', 8)),
+                int(config.get('app_fanout_per_backend', 2)),
+            )
+        return _FANOUT_POOL
+
+def _get_server_cache():
+    """
+    Retourne le cache des serveurs Vigilo responsables des hôtes,
+    en le créant si nécessaire à partir de la configuration.
 
-def get_through_proxy(server_type, host, url, data=None, headers=None, charset=None):
+    Ce cache évite d'interroger la base de données à chaque requête
+    proxifiée pour déterminer le serveur qui héberge l'application
+    distante. La ventilation ne change qu'au redéploiement de la
+    configuration ; voir aussi L{invalidate_server_cache}.
+
+    Option de configuration reconnue :
+     -  app_server_cache_ttl : durée de validité (en secondes) des entrées
+        du cache (300 par défaut, 0 pour désactiver le cache).
+
+    @return: Cache ou C{None} si le cache est désactivé.
+    @rtype: L{TTLCache}
     """
-    Récupère le contenu d'un document à travers le mécanisme de proxy.
+    global _SERVER_CACHE # pylint: disable-msg=W0603
+    with _SERVER_CACHE_LOCK:
+        if _SERVER_CACHE is None:
+            ttl = int(config.get('app_server_cache_ttl', 300))
+            if ttl <= 0:
+                return None
+            _SERVER_CACHE = TTLCache(ttl)
+        return _SERVER_CACHE
+
+def invalidate_server_cache(server_type=None, host=None):
+    """
+    Invalide le cache des serveurs Vigilo responsables des hôtes.
+    Cette fonction doit être appelée lorsque la ventilation change
+    (par exemple, après un déploiement de la configuration).
 
-    @param server_type: Type d'application à "proxifier",
-        par exemple : "nagios" ou "vigirrd".
+    @param server_type: Type d'application concerné. Si ce paramètre
+        ou C{host} est omis, l'ensemble du cache est invalidé.
     @type server_type: C{basestring}
-    @param host: Nom de l'hôte (supervisé) concerné par la demande.
+    @param host: Nom de l'hôte concerné.
     @type host: C{unicode}
-    @param url: URL à demander sur le serveur distant, avec éventuellement
-        des paramètres intégrés (query string). Doit être encodé en UTF-8.
-    @type url: C{str}
-    @param data: Dictionnaire contenant une série de paramètres à transmettre
-        dans la requête. Si des paramètres sont donnés, la requête engendrée
-        deviendra automatiquement du type POST au lieu de GET.
-    @type data: C{dict}
-    @param headers: Dictionnaire d'en-têtes HTTP à passer en plus dans la
-        requête. Vous pouvez par exemple utiliser l'en-tête 'X-Forwarded-For'
-        pour indiquer l'adresse IP de l'utilisateur à l'origine de la requête
-        proxifiée (à des fins de traçabilité/imputation).
+    """
+    server_cache = _get_server_cache()
+    if server_cache is None:
+        return
+    if server_type is None or host is None:
+        server_cache.clear()
+    else:
+        server_cache.invalidate((u'' + server_type.lower(), host))
+
+def _get_response_cache(server_type):
+    """
+    Retourne le cache partagé des réponses obtenues au travers du proxy,
+    ainsi que la durée de vie des entrées pour le type d'application donné.
+
+    Le cache est désactivé par défaut. Options de configuration reconnues :
+     -  app_cache_size : taille maximale du cache, en octets
+        (0 par défaut, ce qui désactive le cache). Les réponses les moins
+        récemment utilisées sont évincées en premier.
+     -  app_cache_max_item_size : taille maximale d'une réponse pouvant
+        être mise en cache, en octets (1 Mio par défaut).
+     -  app_cache_ttl.<server_type> : durée de vie maximale (en secondes)
+        des réponses de l'application <server_type> dans le cache
+        (0 par défaut). Les directives "Cache-Control" du serveur distant
+        sont respectées.
+     -  app_cache_revalidate.<server_type> : conserve les réponses
+        disposant de validateurs ("ETag" ou "Last-Modified") au-delà de
+        leur durée de vie, afin de les revalider par une requête
+        conditionnelle plutôt que de les télécharger à nouveau
+        (activé par défaut).
+
+    @param server_type: Type d'application à "proxifier".
+    @type server_type: C{unicode}
+    @return: Cache et durée de vie des entrées, ou C{(None, 0)} si
+        le cache est désactivé pour ce type d'application.
+    @rtype: C{tuple}
+    """
+    global _RESPONSE_CACHE # pylint: disable-msg=W0603
+    ttl = int(config.get('app_cache_ttl.%s' % server_type, 0))
+    try:
+        revalidate = asbool(config.get('app_cache_revalidate.%s' %
+                                       server_type, True))
+    except ValueError:
+        LOGGER.error('Invalid value for app_cache_revalidate.%s, '
+                     'not revalidating.', server_type)
+        revalidate = False
+    if ttl <= 0 and not revalidate:
+        return (None, 0)
+    with _RESPONSE_CACHE_LOCK:
+        if _RESPONSE_CACHE is None:
+            size = int(config.get('app_cache_size', 0))
+            if size <= 0:
+                return (None, 0)
+            _RESPONSE_CACHE = TTLCache(
+                max(ttl, 0),
+                weigher=lambda entry: entry.size,
+                maxweight=size,
+            )
+        return (_RESPONSE_CACHE, max(ttl, 0))
+
+def _cache_response(response_cache, key, ttl, res):
+    """
+    Prépare la mise en cache d'une réponse obtenue au travers du proxy.
+    La réponse est enregistrée dans le cache une fois entièrement lue
+    par l'appelant, si les en-têtes du serveur distant l'autorisent.
+    Une réponse déjà expirée n'est conservée que si elle dispose
+    de validateurs permettant de la revalider ultérieurement.
+
+    @param response_cache: Cache des réponses.
+    @type response_cache: L{TTLCache}
+    @param key: Clé de la réponse dans le cache.
+    @type key: C{tuple}
+    @param ttl: Durée de vie maximale de la réponse dans le cache.
+    @type ttl: C{int}
+    @param res: Réponse obtenue par urllib2.
+    @type res: C{file-like}
+    @return: Réponse à transmettre à l'appelant.
+    @rtype: C{file-like}
+    """
+    if res.getcode() != 200:
+        return res
+    info = res.info()
+    ttl = get_freshness(info, ttl)
+    if ttl is None:
+        return res
+    if not ttl and not (info.get('ETag') or info.get('Last-Modified')):
+        return res
+
+    max_size = int(config.get('app_cache_max_item_size', 1024 * 1024))
+    try:
+        length = int(info.get('Content-Length', 0))
+    except ValueError:
+        return res
+    if length > max_size:
+        return res
+
+    url = res.geturl()
+    def store(body):
+        response_cache.set(
+            key, CachedResponse(url, res.code, res.msg, info, body), ttl)
+    return CachingReader(res, max_size, store)
+
+def _serve_cached(cached, headers):
+    """
+    Retourne une réponse depuis le cache, en tenant compte
+    des en-têtes conditionnels de la requête du client.
+
+    @param cached: Entrée du cache.
+    @type cached: L{CachedResponse}
+    @param headers: En-têtes de la requête du client.
     @type headers: C{dict}
-    @param charset: Encodage éventuel de la requête. Si C{None}, l'encodage
-        est déterminé automatiquement à partir de la requête en cours de
-        traitement par TurboGears/WebOb.
-    @return: Renvoie le résultat de la requête proxifiée, tel que retourné
-        par urllib2.
+    @return: Réponse reconstruite depuis le cache.
     @rtype: C{file-like}
+    @raise HTTPNotModified: Le client dispose déjà de cette version
+        du document.
+    """
+    if etag_matches(headers.get('If-None-Match'), cached.etag):
+        raise http_exc.HTTPNotModified()
+    if not headers.get('If-None-Match') and cached.last_modified and \
+        headers.get('If-Modified-Since') == cached.last_modified:
+        raise http_exc.HTTPNotModified()
+    return cached.to_response()
+
+def _build_opener(server_type, manager_url):
+    """
+    Construit un "opener" urllib2 configuré pour accéder à l'application
+    distante donnée (authentification auprès d'un éventuel proxy
+    intermédiaire et du site final, connexions persistantes).
+
+    @param server_type: Type d'application à "proxifier".
+    @type server_type: C{unicode}
+    @param manager_url: URL de base de l'application distante.
+    @type manager_url: C{str}
+    @return: Opener urllib2.
+    @rtype: C{urllib2.OpenerDirector}
+    """
+    handlers = []
+
+    # Si le support pour Kerberos est installé, on l'active.
+    if HTTPKerberosAuthHandler:
+        handlers.append(HTTPKerberosAuthHandler())
+
+    # Configuration de l'authentification
+    # vers un éventuel proxy intermédiaire.
+    proxy_auth_method = config.get('app_proxy_auth_method', None)
+    proxy_auth_username = config.get('app_proxy_auth_username', None)
+    proxy_auth_password = config.get('app_proxy_auth_password', None)
+    if proxy_auth_method and proxy_auth_username and \
+        proxy_auth_password is not None:
+        proxy_auth_method = proxy_auth_method.lower()
+        proxy_pass_manager = urllib2.HTTPPasswordMgrWithDefaultRealm()
+        proxy_pass_manager.add_password(
+            None, manager_url,
+            proxy_auth_username,
+            proxy_auth_password)
+        if proxy_auth_method == 'basic':
+            handlers.append(urllib2.ProxyBasicAuthHandler(proxy_pass_manager))
+            LOGGER.debug('Basic authentication to the proxy.')
+        elif proxy_auth_method == 'digest':
+            handlers.append(urllib2.ProxyDigestAuthHandler(proxy_pass_manager))
+            LOGGER.debug('Digest authentication to the proxy.')
+
+    # Configuration de l'authentification
+    # vers le site final (Nagios, VigiRRD, ...).
+    final_auth_method = config.get('app_auth_method.%s' % server_type, None)
+    final_auth_username = config.get('app_auth_username.%s' % server_type, None)
+    final_auth_password = config.get('app_auth_password.%s' % server_type, None)
+    if final_auth_method and final_auth_username and \
+        final_auth_password is not None:
+        final_auth_method = final_auth_method.lower()
+        final_pass_manager = urllib2.HTTPPasswordMgrWithDefaultRealm()
+        final_pass_manager.add_password(
+            None, manager_url,
+            final_auth_username,
+            final_auth_password)
+        if final_auth_method == 'basic':
+            handlers.append(urllib2.HTTPBasicAuthHandler(final_pass_manager))
+            LOGGER.debug('Basic authentication to the website.')
+        elif final_auth_method == 'digest':
+            handlers.append(urllib2.HTTPDigestAuthHandler(final_pass_manager))
+            LOGGER.debug('Digest authentication to the website.')
+
+    # Connexions persistantes : les connexions sont séparées
+    # selon la configuration d'authentification utilisée.
+    pool = _get_connection_pool()
+    if pool is not None:
+        pool_key = (
+            (proxy_auth_method, proxy_auth_username),
+            (final_auth_method, final_auth_username),
+        )
+        handlers.append(PooledHTTPHandler(pool, pool_key))
+        handlers.append(PooledHTTPSHandler(pool, pool_key))
+
+    return urllib2.build_opener(*handlers)
+
+def _get_opener(server_type, manager_url):
+    """
+    Retourne l'"opener" urllib2 à utiliser pour accéder à l'application
+    distante donnée. Les openers sont construits une seule fois par thread
+    pour chaque application distante.
+
+    @param server_type: Type d'application à "proxifier".
+    @type server_type: C{unicode}
+    @param manager_url: URL de base de l'application distante.
+    @type manager_url: C{str}
+    @return: Opener urllib2.
+    @rtype: C{urllib2.OpenerDirector}
+    """
+    openers = getattr(_OPENERS, 'openers', None)
+    if openers is None:
+        openers = _OPENERS.openers = {}
+    key = (server_type, manager_url)
+    opener = openers.get(key)
+    if opener is None:
+        opener = openers[key] = _build_opener(server_type, manager_url)
+    return opener
+
+class ProxyRequest(object):
+    """
+    Requête à destination d'une application distante, dont le serveur
+    a été déterminé et les droits d'accès vérifiés (cf. L{resolve_proxy}).
+    Son exécution (cf. L{fetch_through_proxy}) ne dépend plus du contexte
+    de la requête TurboGears en cours et peut donc avoir lieu dans
+    un autre thread.
+    """
+
+    def __init__(self, server_type, server, manager_url, full_url,
+                 data, headers, redirect=False):
+        """
+        @param server_type: Type d'application à "proxifier".
+        @type server_type: C{unicode}
+        @param server: Nom du serveur Vigilo hébergeant l'application.
+        @type server: C{unicode}
+        @param manager_url: URL de base de l'application distante.
+        @type manager_url: C{str}
+        @param full_url: URL complète du document demandé.
+        @type full_url: C{str}
+        @param data: Paramètres de la requête POST (déjà encodés)
+            ou C{None} pour une requête GET.
+        @type data: C{str}
+        @param headers: En-têtes HTTP à transmettre.
+        @type headers: C{dict}
+        @param redirect: Indique si le client doit être redirigé
+            vers l'application distante plutôt que de passer par le proxy.
+        @type redirect: C{bool}
+        """
+        self.server_type = server_type
+        self.server = server
+        self.manager_url = manager_url
+        self.full_url = full_url
+        self.data = data
+        self.headers = headers
+        self.redirect = redirect
+
+def resolve_proxy(server_type, host, url, data=None, headers=None,
+                  charset=None):
+    """
+    Détermine le serveur distant auquel transmettre une requête
+    et vérifie les droits d'accès de l'utilisateur courant.
+    Les paramètres sont ceux de L{get_through_proxy}.
+
+    Cette fonction accède à la base de données et à la requête
+    TurboGears en cours : elle doit être appelée depuis le thread
+    qui traite cette requête.
+
+    @return: Requête prête à être exécutée.
+    @rtype: L{ProxyRequest}
+    @raise HTTPNotFound: L'hôte n'existe pas ou aucun serveur
+        n'héberge l'application pour cet hôte.
+    @raise HTTPForbidden: L'utilisateur n'a pas accès à l'hôte
+        ou au service demandé.
     """
     server_type = u'' + server_type.lower()
 
@@ -85,20 +477,30 @@ def get_through_proxy(server_type, host, url, data=None, headers=None, charset=N
     if headers is None:
         headers = {}
 
-    user = get_current_user()
+    acl = get_acl_context()
+    user = acl.user
+
+    server_cache = _get_server_cache()
+    cache_key = (server_type, host)
+    resolved = None
+    if server_cache is not None:
+        resolved = server_cache.get(cache_key)
 
     # S'il s'agit du proxy Nagios et que l'hôte donné
     # correspond à l'hôte virtuel des Services de Haut Niveau,
     # alors on utilise l'application "nagios-hls" à la place.
     if server_type == u'nagios' and host == 'High-Level-Services':
-        vigilo_server = DBSession.query(
-                VigiloServer.name
-            ).distinct().join(
-                (Ventilation, Ventilation.idvigiloserver ==
-                    VigiloServer.idvigiloserver),
-                (Application, Application.idapp == Ventilation.idapp),
-            ).filter(Application.name == u'nagios-hls'
-            ).scalar()
+        if resolved is not None:
+            vigilo_server = resolved[1]
+        else:
+            vigilo_server = DBSession.query(
+                    VigiloServer.name
+                ).distinct().join(
+                    (Ventilation, Ventilation.idvigiloserver ==
+                        VigiloServer.idvigiloserver),
+                    (Application, Application.idapp == Ventilation.idapp),
+                ).filter(Application.name == u'nagios-hls'
+                ).scalar()
         if vigilo_server is None:
             message = _('No server configured to monitor high-level services '
                         'for application "%(app)s"') % {
@@ -106,21 +508,36 @@ def get_through_proxy(server_type, host, url, data=None, headers=None, charset=N
                         }
             LOGGER.warning(message)
             raise http_exc.HTTPNotFound(message)
+        if resolved is None and server_cache is not None:
+            server_cache.set(cache_key, (None, vigilo_server))
 
     else:
-        # On vérifie qu'il existe effectivement un hôte portant ce nom
-        # et configuré pour être supervisé par Vigilo.
-        host_obj = DBSession.query(
-                    Host
-                ).filter(Host.name == host
-                ).scalar()
-        if host_obj is None:
-            message = _('No such monitored host: %s') % host
-            LOGGER.warning(message)
-            raise http_exc.HTTPNotFound(message)
+        host_obj = None
+        if resolved is not None:
+            idhost, vigilo_server = resolved
+        else:
+            # On vérifie qu'il existe effectivement un hôte portant ce nom
+            # et configuré pour être supervisé par Vigilo.
+            host_obj = DBSession.query(
+                        Host
+                    ).filter(Host.name == host
+                    ).scalar()
+            if host_obj is None:
+                message = _('No such monitored host: %s') % host
+                LOGGER.warning(message)
+                raise http_exc.HTTPNotFound(message)
+            idhost = host_obj.idhost
 
         # On regarde si l'utilisateur a accès à l'hôte demandé.
-        if not config.is_manager.is_met(request.environ):
+        if not acl.is_manager:
+            if host_obj is None:
+                host_obj = DBSession.query(Host).get(idhost)
+                if host_obj is None:
+                    # L'hôte a été supprimé depuis sa mise en cache.
+                    server_cache.invalidate(cache_key)
+                    message = _('No such monitored host: %s') % host
+                    LOGGER.warning(message)
+                    raise http_exc.HTTPNotFound(message)
             if service_name:
                 service = DBSession.query(
                         LowLevelService
@@ -144,27 +561,30 @@ def get_through_proxy(server_type, host, url, data=None, headers=None, charset=N
                 LOGGER.warning(message)
                 raise http_exc.HTTPForbidden(message)
 
-        # On vérifie que l'hôte est effectivement pris en charge.
-        # ie: qu'un serveur du parc héberge l'application server_type
-        # responsable de cet hôte.
-        vigilo_server = DBSession.query(
-                            VigiloServer.name
-                        ).join(
-                            (Ventilation, Ventilation.idvigiloserver ==
-                                VigiloServer.idvigiloserver),
-                            (Application, Application.idapp ==
-                                Ventilation.idapp),
-                        ).filter(Ventilation.idhost == host_obj.idhost
-                        ).filter(Application.name == server_type
-                        ).scalar()
-        if vigilo_server is None:
-            message = _('No server configured to monitor "%(host)s" '
-                        'for application "%(app)s"') % {
-                            'app': server_type,
-                            'host': host,
-                        }
-            LOGGER.warning(message)
-            raise http_exc.HTTPNotFound(message)
+        if resolved is None:
+            # On vérifie que l'hôte est effectivement pris en charge.
+            # ie: qu'un serveur du parc héberge l'application server_type
+            # responsable de cet hôte.
+            vigilo_server = DBSession.query(
+                                VigiloServer.name
+                            ).join(
+                                (Ventilation, Ventilation.idvigiloserver ==
+                                    VigiloServer.idvigiloserver),
+                                (Application, Application.idapp ==
+                                    Ventilation.idapp),
+                            ).filter(Ventilation.idhost == idhost
+                            ).filter(Application.name == server_type
+                            ).scalar()
+            if vigilo_server is None:
+                message = _('No server configured to monitor "%(host)s" '
+                            'for application "%(app)s"') % {
+                                'app': server_type,
+                                'host': host,
+                            }
+                LOGGER.warning(message)
+                raise http_exc.HTTPNotFound(message)
+            if server_cache is not None:
+                server_cache.set(cache_key, (idhost, vigilo_server))
 
     # Récupére les informations sur l'emplacement de l'application
     # distante. Par défaut, on suppose que la connexion se fait en
@@ -196,60 +616,75 @@ def get_through_proxy(server_type, host, url, data=None, headers=None, charset=N
         LOGGER.error(_('Invalid value for app_redirect.%s, not redirecting.'), server_type)
         should_redirect = False
 
-    if should_redirect:
-        raise tg.redirect(full_url)
-
-    LOGGER.info(_("Fetching '%s' through the proxy"), full_url)
-    req = urllib2.Request(full_url, data, headers=headers)
-    opener = urllib2.build_opener()
+    return ProxyRequest(server_type, vigilo_server, manager_url,
+                        full_url, data, headers, should_redirect)
 
-    # Si le support pour Kerberos est installé, on l'active.
-    if HTTPKerberosAuthHandler:
-        opener.add_handler(HTTPKerberosAuthHandler())
+def fetch_through_proxy(proxy_req):
+    """
+    Exécute une requête préparée par L{resolve_proxy}, en servant
+    éventuellement la réponse depuis le cache partagé.
 
-    # Configuration de l'authentification
-    # vers un éventuel proxy intermédiaire.
-    proxy_auth_method = config.get('app_proxy_auth_method', None)
-    proxy_auth_username = config.get('app_proxy_auth_username', None)
-    proxy_auth_password = config.get('app_proxy_auth_password', None)
-    if proxy_auth_method and proxy_auth_username and \
-        proxy_auth_password is not None:
-        proxy_auth_method = proxy_auth_method.lower()
-        proxy_pass_manager = urllib2.HTTPPasswordMgrWithDefaultRealm()
-        proxy_pass_manager.add_password(
-            None, manager_url,
-            proxy_auth_username,
-            proxy_auth_password)
-        if proxy_auth_method == 'basic':
-            opener.add_handler(urllib2.ProxyBasicAuthHandler(proxy_pass_manager))
-            LOGGER.debug(_('Basic authentication to the proxy.'))
-        elif proxy_auth_method == 'digest':
-            opener.add_handler(urllib2.ProxyDigestAuthHandler(proxy_pass_manager))
-            LOGGER.debug(_('Digest authentication to the proxy.'))
+    Cette fonction n'accède ni à la base de données, ni à la requête
+    TurboGears en cours : elle peut être appelée depuis n'importe quel
+    thread.
 
-    # Configuration de l'authentification
-    # vers le site final (Nagios, VigiRRD, ...).
-    final_auth_method = config.get('app_auth_method.%s' % server_type, None)
-    final_auth_username = config.get('app_auth_username.%s' % server_type, None)
-    final_auth_password = config.get('app_auth_password.%s' % server_type, None)
-    if final_auth_method and final_auth_username and \
-        final_auth_password is not None:
-        final_auth_method = final_auth_method.lower()
-        final_pass_manager = urllib2.HTTPPasswordMgrWithDefaultRealm()
-        final_pass_manager.add_password(
-            None, manager_url,
-            final_auth_username,
-            final_auth_password)
-        if final_auth_method == 'basic':
-            opener.add_handler(urllib2.HTTPBasicAuthHandler(final_pass_manager))
-            LOGGER.debug(_('Basic authentication to the website.'))
-        elif final_auth_method == 'digest':
-            opener.add_handler(urllib2.HTTPDigestAuthHandler(final_pass_manager))
-            LOGGER.debug(_('Digest authentication to the website.'))
+    @param proxy_req: Requête à exécuter.
+    @type proxy_req: L{ProxyRequest}
+    @return: Renvoie le résultat de la requête proxifiée, tel que retourné
+        par urllib2.
+    @rtype: C{file-like}
+    """
+    server_type = proxy_req.server_type
+    full_url = proxy_req.full_url
+    data = proxy_req.data
+    headers = client_headers = proxy_req.headers
+
+    # Les réponses peuvent être servies depuis le cache partagé,
+    # les droits d'accès de l'utilisateur ayant déjà été vérifiés.
+    response_cache, cache_ttl = _get_response_cache(server_type)
+    response_key = None
+    cached = None
+    if response_cache is not None and data is None:
+        response_key = (full_url, ) + tuple(
+            [headers.get(header) for header in _RESPONSE_CACHE_VARY])
+        cached, fresh = response_cache.lookup(response_key)
+        directives = headers.get('Cache-Control', '').lower()
+        if cached is not None and fresh and 'no-cache' not in directives:
+            LOGGER.debug("Serving '%s' from the cache", full_url)
+            return _serve_cached(cached, headers)
+
+        if cached is not None and cached.has_validators:
+            # L'entrée a expiré : on la revalide auprès du serveur
+            # distant. Les en-têtes conditionnels du client sont
+            # traités localement, à partir de l'entrée en cache.
+            headers = dict([
+                (k, v) for (k, v) in headers.iteritems()
+                if k.lower() not in ('if-none-match', 'if-modified-since')
+            ])
+            headers.update(cached.get_conditional_headers())
+        else:
+            cached = None
+
+    LOGGER.info("Fetching '%s' through the proxy", full_url)
+    req = urllib2.Request(full_url, data, headers=headers)
+    opener = _get_opener(server_type, proxy_req.manager_url)
 
     try:
         res = opener.open(req)
     except urllib2.HTTPError as e:
+        if e.code == 304 and cached is not None:
+            # L'entrée en cache est toujours valide. Sa durée de vie
+            # est prolongée si le serveur distant l'autorise ; elle est
+            # supprimée s'il en interdit désormais la mise en cache.
+            e.close()
+            ttl = get_freshness(e.info(), cache_ttl)
+            if ttl is None:
+                response_cache.invalidate(response_key)
+            elif ttl > 0:
+                response_cache.set(response_key, cached, ttl)
+            LOGGER.debug("Revalidated '%s' from the cache", full_url)
+            return _serve_cached(cached, client_headers)
+
         # Permet d'associer les erreurs levées par urllib2
         # à des erreurs reconnues par TurboGears2.
         # On obtient ainsi une page d'erreur plus sympathique.
@@ -264,36 +699,134 @@ def get_through_proxy(server_type, host, url, data=None, headers=None, charset=N
         error = errors.get(str(e.code))
         if error is None:
             raise e
+        # Libère la connexion persistante utilisée par la réponse.
+        e.close()
         raise error(unicode(e.msg))
+
+    if response_key is not None:
+        res = _cache_response(response_cache, response_key, cache_ttl, res)
     return res
 
+def get_through_proxy(server_type, host, url, data=None, headers=None, charset=None):
+    """
+    Récupère le contenu d'un document à travers le mécanisme de proxy.
+
+    @param server_type: Type d'application à "proxifier",
+        par exemple : "nagios" ou "vigirrd".
+    @type server_type: C{basestring}
+    @param host: Nom de l'hôte (supervisé) concerné par la demande.
+    @type host: C{unicode}
+    @param url: URL à demander sur le serveur distant, avec éventuellement
+        des paramètres intégrés (query string). Doit être encodé en UTF-8.
+    @type url: C{str}
+    @param data: Dictionnaire contenant une série de paramètres à transmettre
+        dans la requête. Si des paramètres sont donnés, la requête engendrée
+        deviendra automatiquement du type POST au lieu de GET.
+    @type data: C{dict}
+    @param headers: Dictionnaire d'en-têtes HTTP à passer en plus dans la
+        requête. Vous pouvez par exemple utiliser l'en-tête 'X-Forwarded-For'
+        pour indiquer l'adresse IP de l'utilisateur à l'origine de la requête
+        proxifiée (à des fins de traçabilité/imputation).
+    @type headers: C{dict}
+    @param charset: Encodage éventuel de la requête. Si C{None}, l'encodage
+        est déterminé automatiquement à partir de la requête en cours de
+        traitement par TurboGears/WebOb.
+    @return: Renvoie le résultat de la requête proxifiée, tel que retourné
+        par urllib2.
+    @rtype: C{file-like}
+    """
+    proxy_req = resolve_proxy(server_type, host, url, data, headers, charset)
+    if proxy_req.redirect:
+        raise tg.redirect(proxy_req.full_url)
+    return fetch_through_proxy(proxy_req)
+
+def get_many_through_proxy(requests, process=None, timeout=None):
+    """
+    Récupère plusieurs documents à travers le mécanisme de proxy,
+    en interrogeant les serveurs distants en parallèle.
+
+    Les serveurs sont déterminés et les droits d'accès vérifiés dans
+    le thread courant (cf. L{resolve_proxy}), puis les requêtes sont
+    exécutées par le groupe de threads borné partagé par le processus
+    (cf. L{_get_fanout_pool}). Options de configuration reconnues :
+     -  app_fanout_timeout : durée maximale (en secondes) accordée
+        à l'ensemble des requêtes (30 par défaut).
+
+    @param requests: Liste de requêtes, sous la forme de tuples
+        (server_type, host, url) ou (server_type, host, url, data, headers),
+        dont les éléments ont la même signification que les paramètres
+        de L{get_through_proxy}.
+    @type requests: C{list}
+    @param process: Fonction appliquée à chaque réponse dans le thread
+        qui l'a obtenue (par exemple, pour en décoder le contenu).
+        La réponse est fermée après l'appel. Si cette fonction est omise,
+        les réponses sont retournées telles quelles et doivent être
+        fermées par l'appelant.
+    @type process: C{callable}
+    @param timeout: Échéance globale, en secondes. Surcharge l'option
+        app_fanout_timeout.
+    @type timeout: C{float}
+    @return: Liste de couples (résultat, exception), dans l'ordre des
+        requêtes. L'exception vaut C{None} si la requête a abouti ; une
+        requête non terminée à l'échéance échoue avec L{DeadlineExceeded}.
+        Les documents des serveurs pour lesquels la redirection du client
+        est activée (app_redirect.<server_type>) ne sont pas récupérés :
+        l'exception est alors un C{HTTPFound} vers le document.
+    @rtype: C{list}
+    """
+    if timeout is None:
+        timeout = float(config.get('app_fanout_timeout', 30))
+
+    def task(proxy_req):
+        res = fetch_through_proxy(proxy_req)
+        if process is None:
+            return res
+        try:
+            return process(res)
+        finally:
+            res.close()
+
+    results = []
+    tasks = []
+    positions = []
+    for request_args in requests:
+        try:
+            proxy_req = resolve_proxy(*request_args)
+        except http_exc.HTTPException as e:
+            results.append((None, e))
+            continue
+        if proxy_req.redirect:
+            # Comme pour get_through_proxy, le document doit être
+            # demandé par le client lui-même au serveur distant.
+            results.append((None, http_exc.HTTPFound(
+                location=proxy_req.full_url)))
+            continue
+        positions.append(len(results))
+        results.append(None)
+        tasks.append((
+            (proxy_req.server_type, proxy_req.server),
+            lambda proxy_req=proxy_req: task(proxy_req),
+        ))
+
+    fetched = _get_fanout_pool().run(tasks, timeout)
+    for position, result in zip(positions, fetched):
+        results[position] = result
+    return results
+
 def available_hosts():
     """
     Retourne la liste des noms des hôtes supervisés auxquels l'utilisateur
     a accès.
     """
-    user = get_current_user()
-    if user is None:
+    acl = get_acl_context()
+    if acl.user is None:
         raise http_exc.HTTPForbidden()
 
-    hostgroup = SUPITEM_GROUP_TABLE.alias()
-    servicegroup = SUPITEM_GROUP_TABLE.alias()
-    hostnames = DBSession.query(
-            Host.name
-        ).distinct(
-        ).outerjoin(
-            (hostgroup, hostgroup.c.idsupitem == Host.idhost),
-            (LowLevelService, LowLevelService.idhost == Host.idhost),
-            (servicegroup, servicegroup.c.idsupitem == \
-                LowLevelService.idservice),
-        )
+    hostnames = DBSession.query(Host.name)
 
-    if not config.is_manager.is_met(request.environ):
-        user_groups = [ug[0] for ug in user.supitemgroups() if ug[1]]
-        hostnames = hostnames.filter(or_(
-            hostgroup.c.idgroup.in_(user_groups),
-            servicegroup.c.idgroup.in_(user_groups),
-        ))
+    if not acl.is_manager:
+        user_groups = acl.supitem_group_ids
+        hostnames = hostnames.filter(visible_hosts_filter(user_groups))
 
     patt = re.compile('([0-9]+)')
     def natural_sort(v):
@@ -425,22 +958,62 @@ class ProxyController(BaseController):
         # dans notre propre réponse. Cette étape est particulièrement
         # utile lorsque le type MIME du résultat n'est pas "text/html".
         info = res.info()
+        # Les en-têtes propres à la connexion avec le serveur distant
+        # (dont ceux énumérés par l'en-tête "Connection") ne sont pas
+        # transmis. En particulier, la réponse obtenue via le proxy est
+        # complète, donc il ne faut pas indiquer au client qu'elle est
+        # morcelée (Transfer-Encoding).
+        hop_by_hop = set(_HOP_BY_HOP_HEADERS)
+        for token in info.get('Connection', '').split(','):
+            hop_by_hop.add(token.strip().lower())
         for k, v in info.items():
-            # La réponse obtenue via le proxy est complète,
-            # donc il ne faut pas envoyer un en-tête au client
-            # indiquant qu'elle est morcelée.
-            if k.lower() == 'transfer-encoding':
+            if k.lower() in hop_by_hop:
                 continue
             response.headers[k] = v
 
-        doc = res.read()
+        chunk_size = int(config.get('app_stream_chunk_size',
+                                    DEFAULT_CHUNK_SIZE))
+        content_encoding = info.get('Content-Encoding', '').strip().lower()
+
         # Pour les documents HTML, on effectue une réécriture
         # des URLs de la page pour que tout passe par le proxy.
-        if info['Content-Type'].startswith('text/html'):
+        # La réécriture se fait au fil de l'eau, y compris lorsque
+        # le document est compressé (gzip) par le serveur distant.
+        if info.get('Content-Type', '').startswith('text/html') and \
+            content_encoding in ('', 'identity', 'gzip', 'x-gzip'):
             orig_url = config['app_path.%s' % self.server_type]
             # Le str() est obligatoire, sinon exception
             # "AttributeError: You cannot access Response.unicode_body
             #  unless charset is set"
             dest_url = str('%s%s/' % (tg.url(self.mount_point), host))
-            doc = doc.replace(orig_url, dest_url)
-        return doc
+            chunks = iter_rewrite(res, orig_url, dest_url, chunk_size,
+                                  content_encoding in ('gzip', 'x-gzip'))
+            # La taille du document change avec la réécriture.
+            if 'Content-Length' in response.headers:
+                del response.headers['Content-Length']
+        else:
+            chunks = iter_file(res, chunk_size)
+
+        # Les documents sont transmis au fur et à mesure de leur
+        # réception, sans être conservés en mémoire dans leur intégralité.
+        if self._should_stream():
+            return chunks
+        return ''.join(chunks)
+
+    def _should_stream(self):
+        """
+        Indique si les documents obtenus via ce proxy doivent être
+        transmis au client de manière progressive (streaming).
+        Ce comportement est contrôlé par l'option "app_stream.<server_type>"
+        (activée par défaut).
+
+        @return: C{True} si le document doit être transmis progressivement.
+        @rtype: C{bool}
+        """
+        try:
+            return asbool(config.get('app_stream.%s' % self.server_type,
+                                     True))
+        except ValueError:
+            LOGGER.error(_('Invalid value for app_stream.%s, '
+                           'not streaming.'), self.server_type)
+            return False
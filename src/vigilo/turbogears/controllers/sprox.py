@@ -2,7 +2,7 @@
 # Copyright (C) 2017-2020 CS GROUP - France
 # License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
 
-from tg import expose, tmpl_context
+from tg import expose, tmpl_context, request
 from tg.i18n import lazy_ugettext as l_, ugettext as _
 from markupsafe import Markup
 from tw.forms import SubmitButton
@@ -11,6 +11,7 @@ from tgext.crud import EasyCrudRestController
 from vigilo.turbogears.sprox.provider import ProviderSelector
 from vigilo.turbogears.sprox.tablefiller import TableFiller
 from vigilo.turbogears.controllers import BaseController
+from vigilo.turbogears.acl import bump_acl_version_on_commit
 
 
 __all__ = ['BaseSproxController']
@@ -79,6 +80,13 @@ class BaseSproxController(EasyCrudRestController, BaseController):
         tmpl_context.model_label = getattr(self, 'model_label', self.model.__name__)
         BaseController._before(self, *args, **kw)
         EasyCrudRestController._before(self, *args, **kw)
+        # Toute modification effectuée depuis les écrans d'administration
+        # (groupes, permissions, ...) invalide le cache des droits d'accès.
+        # Le hook est enregistré dès maintenant : les actions de modification
+        # se terminent par une redirection (exception), si bien que _after
+        # n'est jamais appelée pour elles.
+        if request.method != 'GET' and not getattr(self, 'readonly', False):
+            bump_acl_version_on_commit()
 
     def __init__(self, session, menu_items=None):
         # Personnalise les liens associés aux actions (ajout de traductions).
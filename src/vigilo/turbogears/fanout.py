@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Exécution concurrente d'un ensemble de tâches (par exemple, des requêtes
+vers plusieurs serveurs distants), avec une limite sur le nombre de tâches
+simultanées pour une même clé et une échéance globale.
+"""
+
+import time
+import threading
+
+__all__ = ('WorkerPool', 'run_concurrently', 'DeadlineExceeded', )
+
+
+class DeadlineExceeded(Exception):
+    """La tâche n'a pas pu être terminée avant l'échéance."""
+    pass
+
+
+class _Batch(object):
+    """Ensemble de tâches soumises par un même appel à L{WorkerPool.run}."""
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.results = [(None, None)] * len(tasks)
+        self.done = [False] * len(tasks)
+        self.remaining = len(tasks)
+        self.stopped = False
+
+
+class WorkerPool(object):
+    """
+    Groupe de threads borné, destiné à être partagé par tout le processus.
+
+    Les threads sont créés à la demande, jusqu'à la limite fixée, puis
+    réutilisés d'un appel à l'autre. La limite de tâches simultanées
+    pour une même clé s'applique à l'ensemble des appels en cours.
+    """
+
+    def __init__(self, max_workers=8, per_key=None):
+        """
+        @param max_workers: Nombre maximal de threads.
+        @type max_workers: C{int}
+        @param per_key: Nombre maximal de tâches simultanées pour une même
+            clé (C{None} pour ne pas limiter).
+        @type per_key: C{int}
+        """
+        self.max_workers = max_workers
+        self.per_key = per_key
+        self._cond = threading.Condition()
+        self._pending = []
+        self._running = {}
+        self._workers = 0
+        self._idle = 0
+        self._shutdown = False
+
+    def _next_job(self):
+        # Doit être appelée en détenant le verrou.
+        for pos, (batch, index) in enumerate(self._pending):
+            key = batch.tasks[index][0]
+            if self.per_key is None or \
+                self._running.get(key, 0) < self.per_key:
+                del self._pending[pos]
+                self._running[key] = self._running.get(key, 0) + 1
+                return batch, index
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    if self._shutdown:
+                        self._workers -= 1
+                        return
+                    self._idle += 1
+                    self._cond.wait()
+                    self._idle -= 1
+                    job = self._next_job()
+
+            batch, index = job
+            key, func = batch.tasks[index]
+            try:
+                result = (func(), None)
+            except Exception, e: # pylint: disable-msg=W0703
+                result = (None, e)
+
+            with self._cond:
+                self._running[key] -= 1
+                if not self._running[key]:
+                    del self._running[key]
+                batch.remaining -= 1
+                late = batch.stopped
+                if not late:
+                    batch.results[index] = result
+                    batch.done[index] = True
+                self._cond.notify_all()
+            if late and hasattr(result[0], 'close'):
+                result[0].close()
+
+    def run(self, tasks, timeout=None, timer=time.time):
+        """
+        Exécute un ensemble de tâches à l'aide des threads du groupe.
+
+        Les tâches sont démarrées dans l'ordre de la liste, en sautant
+        temporairement celles dont la clé a déjà atteint sa limite de tâches
+        simultanées. Une fois l'échéance atteinte, les tâches non terminées
+        sont abandonnées : leur erreur est une instance de L{DeadlineExceeded}
+        et les résultats obtenus ultérieurement sont ignorés (ils sont fermés
+        s'ils disposent d'une méthode C{close}).
+
+        @param tasks: Liste de couples (clé, fonction sans argument).
+            La clé identifie par exemple le serveur distant concerné.
+        @type tasks: C{list}
+        @param timeout: Durée maximale d'exécution de l'ensemble des tâches,
+            en secondes (C{None} pour attendre indéfiniment).
+        @type timeout: C{float}
+        @param timer: Fonction retournant l'heure courante.
+        @type timer: C{callable}
+        @return: Liste de couples (résultat, exception), dans l'ordre des
+            tâches. L'exception vaut C{None} si la tâche a réussi.
+        @rtype: C{list}
+        """
+        batch = _Batch(list(tasks))
+        count = len(batch.tasks)
+        if not count:
+            return batch.results
+
+        with self._cond:
+            self._pending.extend([(batch, index) for index in xrange(count)])
+            spawn = max(0, min(self.max_workers - self._workers,
+                               count - self._idle))
+            self._workers += spawn
+            self._cond.notify_all()
+        for _i in xrange(spawn):
+            thread = threading.Thread(target=self._worker)
+            thread.daemon = True
+            thread.start()
+
+        deadline = timeout is not None and timer() + timeout or None
+        with self._cond:
+            while batch.remaining:
+                if deadline is None:
+                    self._cond.wait()
+                    continue
+                left = deadline - timer()
+                if left <= 0:
+                    break
+                self._cond.wait(left)
+            # Les tâches non démarrées sont retirées de la file d'attente.
+            batch.stopped = True
+            self._pending = [job for job in self._pending
+                             if job[0] is not batch]
+
+        for index in xrange(count):
+            if not batch.done[index]:
+                batch.results[index] = (None, DeadlineExceeded())
+        return batch.results
+
+    def shutdown(self):
+        """
+        Termine les threads du groupe une fois les tâches
+        en cours achevées.
+        """
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+
+
+def run_concurrently(tasks, max_workers=8, per_key=None, timeout=None,
+                     timer=time.time):
+    """
+    Exécute un ensemble de tâches dans un groupe de threads borné, créé
+    pour l'occasion. Préférer L{WorkerPool.run} avec un groupe partagé
+    lorsque les appels sont fréquents.
+
+    @param tasks: Liste de couples (clé, fonction sans argument).
+    @type tasks: C{list}
+    @param max_workers: Nombre maximal de threads.
+    @type max_workers: C{int}
+    @param per_key: Nombre maximal de tâches simultanées pour une même
+        clé (C{None} pour ne pas limiter).
+    @type per_key: C{int}
+    @param timeout: Durée maximale d'exécution de l'ensemble des tâches,
+        en secondes (C{None} pour attendre indéfiniment).
+    @type timeout: C{float}
+    @param timer: Fonction retournant l'heure courante.
+    @type timer: C{callable}
+    @return: Liste de couples (résultat, exception), dans l'ordre des
+        tâches (cf. L{WorkerPool.run}).
+    @rtype: C{list}
+    """
+    pool = WorkerPool(max_workers, per_key)
+    try:
+        return pool.run(tasks, timeout, timer)
+    finally:
+        pool.shutdown()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Arborescence en mémoire des groupes d'un même type, utilisée par l'API
+pour parcourir la hiérarchie sans interroger la base de données
+à chaque niveau.
+"""
+
+__all__ = ('GroupTree', )
+
+
+class GroupTree(object):
+    """
+    Arborescence de groupes : parent, enfants et chemin de chaque groupe,
+    ainsi que la fermeture transitive de la hiérarchie (ancêtres et
+    descendants de chaque groupe).
+
+    Une instance n'est jamais modifiée après sa construction et peut donc
+    être partagée entre plusieurs threads.
+    """
+
+    def __init__(self, groups):
+        """
+        @param groups: Quadruplets (identifiant, nom, chemin, identifiant
+            du groupe parent ou C{None}) décrivant les groupes.
+        @type groups: C{iterable}
+        """
+        self._names = {}
+        self._paths = {}
+        self._parents = {}
+        children = {}
+        for idgroup, name, path, idparent in groups:
+            self._names[idgroup] = name
+            self._paths[idgroup] = path
+            self._parents[idgroup] = idparent
+            children.setdefault(idgroup, [])
+            if idparent is not None:
+                children.setdefault(idparent, []).append(idgroup)
+
+        sort_key = lambda idgroup: (self._names.get(idgroup), idgroup)
+        self._children = dict([
+            (idgroup, tuple(sorted(ids, key=sort_key)))
+            for (idgroup, ids) in children.iteritems()
+        ])
+        self._top = tuple(sorted(
+            [idgroup for (idgroup, idparent) in self._parents.iteritems()
+             if idparent not in self._parents],
+            key=sort_key))
+
+        # Fermeture transitive : ancêtres de chaque groupe
+        # (du parent direct à la racine).
+        self._ancestors = {}
+        for idgroup in self._parents:
+            ancestors = []
+            idparent = self._parents[idgroup]
+            while idparent in self._parents and idparent not in ancestors:
+                ancestors.append(idparent)
+                idparent = self._parents[idparent]
+            self._ancestors[idgroup] = tuple(ancestors)
+        self._descendants = {}
+        for idgroup, ancestors in self._ancestors.iteritems():
+            for idancestor in ancestors:
+                self._descendants.setdefault(idancestor, set()).add(idgroup)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, idgroup):
+        return idgroup in self._names
+
+    def name(self, idgroup):
+        """Nom du groupe."""
+        return self._names[idgroup]
+
+    def path(self, idgroup):
+        """Chemin du groupe depuis la racine."""
+        return self._paths[idgroup]
+
+    def parent(self, idgroup):
+        """Identifiant du groupe parent, ou C{None}."""
+        return self._parents[idgroup]
+
+    def top_groups(self):
+        """Identifiants des groupes de premier niveau, triés par nom."""
+        return self._top
+
+    def children(self, idgroup):
+        """Identifiants des sous-groupes directs, triés par nom."""
+        return self._children.get(idgroup, ())
+
+    def ancestors(self, idgroup):
+        """Identifiants des ancêtres, du parent direct à la racine."""
+        return self._ancestors.get(idgroup, ())
+
+    def descendants(self, idgroup):
+        """Identifiants de tous les sous-groupes (directs ou non)."""
+        return frozenset(self._descendants.get(idgroup, ()))
@@ -24,7 +24,8 @@ from vigilo.models.session import DBSession
 from vigilo.models import tables
 
 
-__all__ = ('get_current_user', 'get_readable_metro_value', )
+__all__ = ('get_current_user', 'get_readable_metro_value',
+           'get_readable_metro_values', )
 
 LOGGER = logging.getLogger(__name__)
 
@@ -68,6 +69,44 @@ def get_locales(modname):
         ]
         return locales
 
+def _convert_metro_value(pds_name, host, pds_max, usage):
+    """
+    Convertit une valeur brute de métrologie en valeur "lisible".
+
+    @param pds_name: Nom de l'indicateur de métrologie.
+    @type pds_name: C{unicode}
+    @param host: Nom de l'hôte portant l'indicateur.
+    @type host: C{unicode}
+    @param pds_max: Valeur maximale de l'indicateur (ou C{None}).
+    @type pds_max: C{float}
+    @param usage: Valeur brute retournée par VigiRRD.
+    @return: un couple valeur entière, valeur en pourcentage
+    @rtype:  C{tuple}
+    """
+    try:
+        usage = float(usage)
+        if pds_max is not None:
+            percent = int(usage / float(pds_max) * 100)
+        else:
+            percent = None
+        usage = convert_with_unit(usage)
+    except (ValueError, TypeError):
+        LOGGER.warning("Failed to convert DS %(ds)s on %(host)s: "
+                         "value was %(value)s (max: %(max)s)", {
+                            'ds': pds_name,
+                            'host': host,
+                            'value': usage,
+                            'max': pds_max,
+                         })
+        usage = percent = None
+    return (usage, percent)
+
+def _get_lastvalue_url(host, pds_name):
+    return "lastvalue?host=%s&ds=%s" % (
+        urllib2.quote(host, ''),
+        urllib2.quote(pds_name, ''),
+    )
+
 def get_readable_metro_value(pds):
     """
     Récupère et retourne une valeur "lisible" de métrologie, c'est à dire avec
@@ -82,10 +121,7 @@ def get_readable_metro_value(pds):
     from vigilo.turbogears.controllers.proxy import get_through_proxy
 
     host = pds.host.name
-    usage_url = "lastvalue?host=%s&ds=%s" % (
-        urllib2.quote(host, ''),
-        urllib2.quote(pds.name, ''),
-    )
+    usage_url = _get_lastvalue_url(host, pds.name)
     try:
         usage_req = get_through_proxy("vigirrd", host, usage_url)
     except urllib2.HTTPError:
@@ -94,23 +130,54 @@ def get_readable_metro_value(pds):
                         qualified=True))
         raise
     usage = json.load(usage_req)['lastvalue']
-    try:
-        usage = float(usage)
-        if pds.max is not None:
-            percent = int(usage / float(pds.max) * 100)
-        else:
-            percent = None
-        usage = convert_with_unit(usage)
-    except (ValueError, TypeError):
-        LOGGER.warning("Failed to convert DS %(ds)s on %(host)s: "
-                         "value was %(value)s (max: %(max)s)", {
-                            'ds': pds.name,
-                            'host': host,
-                            'value': usage,
-                            'max': pds.max,
-                         })
-        usage = percent = None
-    return (usage, percent)
+    return _convert_metro_value(pds.name, host, pds.max, usage)
+
+def get_readable_metro_values(pds_list):
+    """
+    Variante de L{get_readable_metro_value} pour un ensemble d'indicateurs.
+
+    Les serveurs VigiRRD concernés sont interrogés en parallèle
+    (cf. L{vigilo.turbogears.controllers.proxy.get_many_through_proxy}).
+    L'échec de la récupération d'un indicateur n'empêche pas celle
+    des autres.
+
+    @param pds_list: Liste d'indicateurs de métrologie.
+    @type pds_list: C{list} of
+        C{vigilo.models.tables.perfdatasource.PerfDataSource}
+    @return: Couple formé de la liste des valeurs (couples valeur entière,
+        valeur en pourcentage, dans l'ordre des indicateurs) et de la liste
+        des erreurs rencontrées pour chaque indicateur (C{None} en cas
+        de succès). La valeur d'un indicateur en échec vaut C{(None, None)}.
+    @rtype: C{tuple}
+    """
+    # doit être chargé après
+    from vigilo.turbogears.controllers.proxy import get_many_through_proxy
+
+    infos = []
+    requests = []
+    for pds in pds_list:
+        host = pds.host.name
+        usage_url = _get_lastvalue_url(host, pds.name)
+        infos.append((pds.name, host, pds.max, usage_url))
+        requests.append(("vigirrd", host, usage_url))
+
+    fetched = get_many_through_proxy(
+        requests, lambda res: json.load(res)['lastvalue'])
+
+    values = []
+    errors = []
+    for (pds_name, host, pds_max, usage_url), (usage, error) in \
+            zip(infos, fetched):
+        errors.append(error)
+        if error is not None:
+            LOGGER.warning("Failed to get URL: %s (%s)",
+                           url("/vigirrd/%s/%s" % (host, usage_url),
+                               qualified=True),
+                           error)
+            values.append((None, None))
+            continue
+        values.append(_convert_metro_value(pds_name, host, pds_max, usage))
+    return (values, errors)
 
 def describe_supitem(idsupitem):
     """
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Index en mémoire des noms d'hôtes, utilisé par l'auto-compléteur
+pour éviter d'interroger la base de données à chaque frappe.
+"""
+
+import re
+import time
+import bisect
+import logging
+import threading
+
+__all__ = ('HostIndex', 'RefreshingIndex', )
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _wildcard_to_regex(pattern):
+    """
+    Convertit un motif utilisant les jokers '*' et '?'
+    en expression rationnelle (insensible à la casse).
+    """
+    parts = []
+    for char in pattern:
+        if char == '*':
+            parts.append('.*')
+        elif char == '?':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return re.compile(''.join(parts) + r'\Z', re.IGNORECASE | re.DOTALL)
+
+
+class HostIndex(object):
+    """
+    Liste triée des noms d'hôtes, associés aux groupes d'éléments
+    supervisés auxquels appartiennent l'hôte ou l'un de ses services.
+    """
+
+    def __init__(self, hosts):
+        """
+        @param hosts: Couples (nom de l'hôte, identifiants des groupes
+            de l'hôte et de ses services).
+        @type hosts: C{iterable}
+        """
+        entries = sorted([
+            (name.lower(), name, frozenset(groups))
+            for (name, groups) in hosts
+        ])
+        self._keys = [entry[0] for entry in entries]
+        self._entries = entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def search(self, pattern, partial=False, allowed_groups=None):
+        """
+        Recherche les hôtes dont le nom correspond au motif donné,
+        sans tenir compte de la casse.
+
+        @param pattern: Motif recherché. Les caractères '?' et '*'
+            remplacent respectivement un caractère quelconque
+            ou une chaîne de caractères quelconque.
+        @type pattern: C{unicode}
+        @param partial: Indique si le motif est un préfixe.
+        @type partial: C{bool}
+        @param allowed_groups: Identifiants des groupes accessibles
+            à l'utilisateur, ou C{None} si l'utilisateur a accès
+            à tous les hôtes.
+        @type allowed_groups: C{set}
+        @return: Noms des hôtes correspondants, triés par nom.
+        @rtype: C{list}
+        """
+        if partial:
+            pattern += '*'
+        pattern = pattern.lower()
+
+        # Seule la portion qui précède le premier joker
+        # permet de restreindre la recherche par dichotomie.
+        wildcards = [pos for pos in (pattern.find('*'), pattern.find('?'))
+                     if pos >= 0]
+        if wildcards:
+            prefix = pattern[:min(wildcards)]
+            regex = _wildcard_to_regex(pattern)
+        else:
+            prefix = pattern
+            regex = None
+
+        start = bisect.bisect_left(self._keys, prefix)
+        results = []
+        for key, name, groups in self._entries[start:]:
+            if not key.startswith(prefix):
+                break
+            if regex is None:
+                if key != prefix:
+                    break
+            elif not regex.match(key):
+                continue
+            if allowed_groups is not None and groups.isdisjoint(allowed_groups):
+                continue
+            results.append(name)
+        results.sort()
+        return results
+
+
+class RefreshingIndex(object):
+    """
+    Conteneur d'un index reconstruit périodiquement en arrière-plan.
+    Tant que l'index n'est pas disponible ou qu'il est trop ancien,
+    L{get} retourne C{None} et l'appelant doit interroger directement
+    la base de données.
+    """
+
+    def __init__(self, loader, refresh_interval, max_age, timer=time.time):
+        """
+        @param loader: Fonction construisant un nouvel index.
+        @type loader: C{callable}
+        @param refresh_interval: Âge (en secondes) au-delà duquel l'index
+            est reconstruit en arrière-plan.
+        @type refresh_interval: C{int}
+        @param max_age: Âge (en secondes) au-delà duquel l'index
+            n'est plus utilisé.
+        @type max_age: C{int}
+        @param timer: Fonction retournant l'heure courante.
+        @type timer: C{callable}
+        """
+        self._loader = loader
+        self._refresh_interval = refresh_interval
+        self._max_age = max_age
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._refreshing = False
+        # Couple (index, date de construction), remplacé d'un seul bloc.
+        self._state = (None, None)
+
+    def get(self):
+        """
+        Retourne l'index, s'il est suffisamment récent.
+        Déclenche sa reconstruction en arrière-plan si nécessaire.
+
+        @return: Index ou C{None}.
+        """
+        now = self._timer()
+        index, built_at = self._state
+        if index is None or now - built_at >= self._refresh_interval:
+            self.refresh()
+        if index is None or now - built_at >= self._max_age:
+            return None
+        return index
+
+    def refresh(self, wait=False):
+        """
+        Reconstruit l'index dans un thread séparé, à moins
+        qu'une reconstruction ne soit déjà en cours.
+
+        @param wait: Attendre la fin de la reconstruction.
+        @type wait: C{bool}
+        """
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        thread = threading.Thread(target=self._refresh)
+        thread.daemon = True
+        thread.start()
+        if wait:
+            thread.join()
+
+    def _refresh(self):
+        try:
+            started = self._timer()
+            index = self._loader()
+            self._state = (index, started)
+            LOGGER.debug("Index refreshed (%d entries)", len(index))
+        except Exception: # pylint: disable-msg=W0703
+            LOGGER.exception("Could not refresh the index")
+        finally:
+            with self._lock:
+                self._refreshing = False
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Outils pour la mise en cache des réponses HTTP obtenues au travers
+du proxy (interprétation des en-têtes de cache, enregistrement
+du corps des réponses au fil de leur lecture).
+"""
+
+import urllib
+import httplib
+from cStringIO import StringIO
+
+__all__ = ('CachedResponse', 'CachingReader', 'get_freshness',
+           'etag_matches', )
+
+
+def parse_cache_control(value):
+    """
+    Analyse la valeur d'un en-tête "Cache-Control".
+
+    @param value: Valeur de l'en-tête.
+    @type value: C{str}
+    @return: Dictionnaire des directives, associées à leur valeur
+        éventuelle (C{None} pour les directives sans valeur).
+    @rtype: C{dict}
+    """
+    directives = {}
+    if not value:
+        return directives
+    for directive in value.split(','):
+        name, sep, arg = directive.strip().partition('=')
+        name = name.strip().lower()
+        if name:
+            directives[name] = sep and arg.strip().strip('"') or None
+    return directives
+
+def get_freshness(headers, default_ttl):
+    """
+    Détermine la durée pendant laquelle une réponse peut être servie
+    depuis le cache sans revalidation, en tenant compte des directives
+    du serveur distant.
+
+    @param headers: En-têtes de la réponse.
+    @type headers: C{mimetools.Message}
+    @param default_ttl: Durée de vie maximale d'une entrée, en secondes.
+    @type default_ttl: C{int}
+    @return: Durée de vie de la réponse dans le cache, ou C{None}
+        si la réponse ne doit pas être mise en cache. Une durée nulle
+        indique que la réponse doit être revalidée avant chaque usage.
+    @rtype: C{int}
+    """
+    if headers.get('Set-Cookie') is not None:
+        return None
+    if headers.get('Vary', '').strip() == '*':
+        return None
+    directives = parse_cache_control(headers.get('Cache-Control'))
+    if 'no-store' in directives or 'private' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0
+    ttl = default_ttl
+    max_age = directives.get('s-maxage', directives.get('max-age'))
+    if max_age is not None:
+        try:
+            ttl = min(ttl, int(max_age))
+        except ValueError:
+            return None
+    return max(ttl, 0)
+
+def etag_matches(if_none_match, etag):
+    """
+    Indique si la valeur d'un en-tête "If-None-Match" correspond
+    à l'étiquette d'entité (ETag) donnée (comparaison faible).
+
+    @param if_none_match: Valeur de l'en-tête "If-None-Match".
+    @type if_none_match: C{str}
+    @param etag: Étiquette d'entité.
+    @type etag: C{str}
+    @return: C{True} si l'étiquette correspond.
+    @rtype: C{bool}
+    """
+    if not if_none_match or not etag:
+        return False
+    def weak(tag):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        return tag
+    etag = weak(etag)
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*' or weak(tag) == etag:
+            return True
+    return False
+
+
+class CachedResponse(object):
+    """Réponse HTTP stockée dans le cache."""
+
+    def __init__(self, url, code, msg, headers, body):
+        """
+        @param url: URL de la ressource.
+        @type url: C{str}
+        @param code: Code de statut HTTP.
+        @type code: C{int}
+        @param msg: Message associé au code de statut.
+        @type msg: C{str}
+        @param headers: En-têtes de la réponse.
+        @type headers: C{mimetools.Message}
+        @param body: Corps de la réponse.
+        @type body: C{str}
+        """
+        self.url = url
+        self.code = code
+        self.msg = msg
+        self.raw_headers = ''.join(headers.headers)
+        self.etag = headers.get('ETag')
+        self.last_modified = headers.get('Last-Modified')
+        self.body = body
+
+    @property
+    def has_validators(self):
+        """Indique si la réponse peut être revalidée auprès du serveur."""
+        return bool(self.etag or self.last_modified)
+
+    def get_conditional_headers(self):
+        """
+        Retourne les en-têtes permettant de revalider la réponse
+        auprès du serveur distant (requête conditionnelle).
+
+        @return: En-têtes de la requête conditionnelle.
+        @rtype: C{dict}
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    @property
+    def size(self):
+        """Taille approximative de l'entrée, en octets."""
+        return len(self.body) + len(self.raw_headers) + len(self.url)
+
+    def to_response(self):
+        """
+        Reconstruit un objet équivalent à une réponse de urllib2.
+
+        @return: Réponse.
+        @rtype: C{urllib.addinfourl}
+        """
+        headers = httplib.HTTPMessage(StringIO(self.raw_headers))
+        res = urllib.addinfourl(StringIO(self.body), headers,
+                                self.url, self.code)
+        res.msg = self.msg
+        return res
+
+
+class CachingReader(object):
+    """
+    Enveloppe autour d'une réponse urllib2, qui conserve une copie
+    du corps de la réponse au fil de sa lecture. Une fois la réponse
+    entièrement lue, une fonction de rappel reçoit le corps complet.
+    Les autres attributs sont ceux de la réponse d'origine.
+    """
+
+    def __init__(self, response, max_size, callback):
+        """
+        @param response: Réponse d'origine.
+        @type response: C{file-like}
+        @param max_size: Taille maximale du corps à conserver. Au-delà,
+            la copie est abandonnée et la fonction de rappel n'est pas
+            appelée.
+        @type max_size: C{int}
+        @param callback: Fonction appelée avec le corps de la réponse.
+        @type callback: C{callable}
+        """
+        self._response = response
+        self._max_size = max_size
+        self._callback = callback
+        self._chunks = []
+        self._size = 0
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def _record(self, data):
+        if self._chunks is None or not data:
+            return
+        self._size += len(data)
+        if self._size > self._max_size:
+            self._chunks = None
+        else:
+            self._chunks.append(data)
+
+    def _finish(self):
+        chunks, self._chunks = self._chunks, None
+        if chunks is not None:
+            self._callback(''.join(chunks))
+
+    def read(self, amt=None):
+        if amt is None or amt < 0:
+            data = self._response.read()
+            self._record(data)
+            self._finish()
+            return data
+        data = self._response.read(amt)
+        if data:
+            self._record(data)
+        else:
+            self._finish()
+        return data
+
+    def readline(self, *args):
+        data = self._response.readline(*args)
+        if data:
+            self._record(data)
+        else:
+            self._finish()
+        return data
+
+    def readlines(self, sizehint=None):
+        return list(iter(self.readline, ''))
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+    def close(self):
+        # Une réponse fermée avant la fin de sa lecture
+        # n'est pas mise en cache.
+        self._chunks = None
+        self._response.close()
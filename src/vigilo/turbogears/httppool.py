@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Réservoir (pool) de connexions HTTP/HTTPS persistantes (keep-alive),
+utilisable au travers de urllib2.
+
+Les connexions sont regroupées par serveur distant et par configuration
+d'authentification, puis réutilisées d'une requête à l'autre tant qu'elles
+restent saines. Une connexion n'est rendue au réservoir qu'une fois
+la réponse associée entièrement lue. Le nombre de connexions utilisées
+simultanément vers un même serveur distant est limité.
+"""
+
+import time
+import select
+import socket
+import httplib
+import urllib
+import urllib2
+import threading
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = ('ConnectionPool', 'PooledHTTPHandler', 'PooledHTTPSHandler', )
+
+
+def is_connection_alive(conn):
+    """
+    Vérifie qu'une connexion inactive peut encore être réutilisée.
+
+    Une connexion au repos ne devrait jamais être disponible en lecture :
+    si c'est le cas, le serveur distant l'a fermée (EOF) ou a envoyé
+    des données inattendues et elle doit être abandonnée.
+
+    @param conn: Connexion à tester.
+    @type conn: C{httplib.HTTPConnection}
+    @return: C{True} si la connexion peut être réutilisée.
+    @rtype: C{bool}
+    """
+    sock = getattr(conn, 'sock', None)
+    if sock is None:
+        return False
+    try:
+        readable = select.select([sock], [], [], 0)[0]
+    except (select.error, socket.error, ValueError):
+        return False
+    return not readable
+
+
+class ConnectionPool(object):
+    """
+    Réservoir de connexions persistantes, partagé entre les threads.
+
+    Seules les connexions au repos sont conservées par le réservoir :
+    une connexion en cours d'utilisation appartient à la réponse
+    qui l'utilise, jusqu'à ce que celle-ci soit entièrement lue.
+    Le réservoir comptabilise en revanche les connexions utilisées
+    pour chaque serveur distant (cf. L{reserve}).
+    """
+
+    def __init__(self, maxsize=10, idle_timeout=30, timer=time.time,
+                 wait_timeout=30):
+        """
+        @param maxsize: Nombre maximal de connexions utilisées
+            simultanément vers un même serveur distant. C'est aussi
+            le nombre maximal de connexions au repos conservées pour
+            ce serveur : les connexions surnuméraires sont fermées
+            lorsqu'elles sont rendues au réservoir.
+        @type maxsize: C{int}
+        @param idle_timeout: Durée (en secondes) au-delà de laquelle
+            une connexion au repos est considérée comme périmée et fermée.
+            Une valeur nulle désactive cette vérification.
+        @type idle_timeout: C{int}
+        @param timer: Fonction retournant l'heure courante.
+        @type timer: C{callable}
+        @param wait_timeout: Durée maximale (en secondes) d'attente
+            d'une connexion lorsque la limite est atteinte pour
+            le serveur distant. C{None} pour attendre indéfiniment.
+        @type wait_timeout: C{float}
+        """
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = {}
+        self._in_use = {}
+
+    def _expired(self, last_used, now):
+        return self.idle_timeout and now - last_used > self.idle_timeout
+
+    def reserve(self, key):
+        """
+        Réserve l'une des connexions autorisées vers un serveur distant,
+        en attendant au besoin (cf. C{wait_timeout}) qu'une connexion
+        utilisée par un autre thread soit libérée. Toute réservation
+        réussie doit être suivie d'un appel à L{unreserve}.
+
+        @param key: Clé identifiant le serveur distant.
+        @type key: C{tuple}
+        @return: C{True} si la réservation a réussi, C{False} si
+            le délai d'attente a expiré.
+        @rtype: C{bool}
+        """
+        deadline = None
+        if self.wait_timeout is not None:
+            deadline = time.time() + self.wait_timeout
+        with self._available:
+            while self._in_use.get(key, 0) >= self.maxsize:
+                if deadline is None:
+                    self._available.wait()
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._available.wait(remaining)
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+        return True
+
+    def unreserve(self, key):
+        """
+        Libère une connexion réservée par L{reserve}, qu'elle ait été
+        rendue au réservoir ou fermée.
+
+        @param key: Clé identifiant le serveur distant.
+        @type key: C{tuple}
+        """
+        with self._available:
+            count = self._in_use.get(key, 0) - 1
+            if count > 0:
+                self._in_use[key] = count
+            else:
+                self._in_use.pop(key, None)
+            self._available.notify()
+
+    def acquire(self, key):
+        """
+        Retourne une connexion saine au repos pour la clé donnée.
+
+        @param key: Clé identifiant le serveur distant.
+        @type key: C{tuple}
+        @return: Une connexion réutilisable ou C{None} si aucune
+            n'est disponible.
+        @rtype: C{httplib.HTTPConnection}
+        """
+        while True:
+            now = self._timer()
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    return None
+                # Les connexions les plus récemment utilisées
+                # sont servies en premier.
+                conn, last_used = idle.pop()
+            if not self._expired(last_used, now) and \
+                is_connection_alive(conn):
+                return conn
+            LOGGER.debug("Discarding stale connection to %r", key)
+            conn.close()
+
+    def release(self, key, conn):
+        """
+        Rend une connexion au réservoir.
+
+        @param key: Clé identifiant le serveur distant.
+        @type key: C{tuple}
+        @param conn: Connexion dont la réponse a été entièrement lue.
+        @type conn: C{httplib.HTTPConnection}
+        """
+        if getattr(conn, 'sock', None) is None:
+            conn.close()
+            return
+
+        now = self._timer()
+        discarded = []
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            # Purge des connexions les plus anciennes, devenues périmées.
+            while idle and self._expired(idle[0][1], now):
+                discarded.append(idle.pop(0)[0])
+            if len(idle) < self.maxsize:
+                idle.append((conn, now))
+            else:
+                discarded.append(conn)
+        for old_conn in discarded:
+            old_conn.close()
+
+    def clear(self):
+        """Ferme toutes les connexions au repos."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.itervalues():
+            for conn, _last_used in connections:
+                conn.close()
+
+
+class _PooledSocket(object):
+    """
+    Façade de type socket autour d'une réponse HTTP, destinée
+    à être encapsulée par C{socket._fileobject} (comme le fait urllib2).
+    La connexion sous-jacente est rendue au réservoir dès que
+    la réponse a été entièrement lue.
+    """
+
+    def __init__(self, pool, key, conn, response):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+
+    def recv(self, amt):
+        response = self._response
+        if response is None:
+            return ''
+        data = response.read(amt)
+        if not data or response.isclosed():
+            self._release()
+        return data
+
+    def _release(self):
+        conn = self._conn
+        self._conn = self._response = None
+        self._pool.release(self._key, conn)
+        self._pool.unreserve(self._key)
+
+    def close(self):
+        response = self._response
+        if response is None:
+            return
+        # Une réponse sans corps (ex : 304) est déjà complète.
+        if not response.isclosed() and not response.chunked and \
+            response.length == 0:
+            response.close()
+        if response.isclosed():
+            self._release()
+            return
+        # La réponse n'a pas été lue entièrement :
+        # la connexion ne peut pas être réutilisée.
+        response.close()
+        self._conn.close()
+        self._conn = self._response = None
+        self._pool.unreserve(self._key)
+
+
+class _PooledHandlerMixin(object):
+    """
+    Implémentation commune des gestionnaires urllib2 utilisant
+    un réservoir de connexions. Le code est calqué sur celui de
+    C{urllib2.AbstractHTTPHandler.do_open}, sans l'en-tête
+    "Connection: close".
+    """
+
+    connection_class = None
+    scheme = None
+
+    def _new_connection(self, host, timeout):
+        return self.connection_class(host, timeout=timeout)
+
+    def _pooled_open(self, req):
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError('no host given')
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict((k, v) for k, v in req.headers.items()
+                            if k not in headers))
+        headers = dict((name.title(), val) for name, val in headers.items())
+
+        tunnel_host = getattr(req, '_tunnel_host', None)
+        tunnel_headers = {}
+        if tunnel_host:
+            proxy_auth_hdr = "Proxy-Authorization"
+            if proxy_auth_hdr in headers:
+                tunnel_headers[proxy_auth_hdr] = headers.pop(proxy_auth_hdr)
+
+        key = (self.scheme, host, tunnel_host, self.pool_key)
+        if not self.pool.reserve(key):
+            raise urllib2.URLError('too many connections to %s' % host)
+        try:
+            conn, response = self._send(req, key, host, headers,
+                                        tunnel_host, tunnel_headers)
+        except:
+            self.pool.unreserve(key)
+            raise
+
+        fp = socket._fileobject(
+            _PooledSocket(self.pool, key, conn, response), close=True)
+        resp = urllib.addinfourl(fp, response.msg, req.get_full_url())
+        resp.code = response.status
+        resp.msg = response.reason
+        return resp
+
+    def _send(self, req, key, host, headers, tunnel_host, tunnel_headers):
+        conn = self.pool.acquire(key)
+        reused = conn is not None
+        while True:
+            if conn is None:
+                conn = self._new_connection(host, req.timeout)
+                conn.set_debuglevel(self._debuglevel)
+                if tunnel_host:
+                    conn.set_tunnel(tunnel_host, headers=tunnel_headers)
+            try:
+                conn.request(req.get_method(), req.get_selector(),
+                             req.data, headers)
+                response = conn.getresponse(buffering=True)
+            except (socket.error, httplib.HTTPException) as err:
+                conn.close()
+                # Le serveur a pu fermer une connexion persistante
+                # entre sa vérification et son utilisation :
+                # on réessaye une fois avec une nouvelle connexion.
+                # Une requête transmettant des données (POST) n'est
+                # pas réémise : elle a pu être traitée par le serveur.
+                if reused and req.data is None:
+                    reused = False
+                    conn = None
+                    continue
+                raise urllib2.URLError(err)
+            return conn, response
+
+
+class PooledHTTPHandler(_PooledHandlerMixin, urllib2.HTTPHandler):
+    """Gestionnaire urllib2 pour HTTP, avec connexions persistantes."""
+
+    connection_class = httplib.HTTPConnection
+    scheme = 'http'
+
+    def __init__(self, pool, pool_key=None, debuglevel=0):
+        """
+        @param pool: Réservoir de connexions à utiliser.
+        @type pool: L{ConnectionPool}
+        @param pool_key: Complément de clé permettant de séparer
+            les connexions selon la configuration d'authentification.
+        @type pool_key: C{tuple}
+        """
+        urllib2.HTTPHandler.__init__(self, debuglevel)
+        self.pool = pool
+        self.pool_key = pool_key
+
+    def http_open(self, req):
+        return self._pooled_open(req)
+
+
+class PooledHTTPSHandler(_PooledHandlerMixin, urllib2.HTTPSHandler):
+    """Gestionnaire urllib2 pour HTTPS, avec connexions persistantes."""
+
+    connection_class = httplib.HTTPSConnection
+    scheme = 'https'
+
+    def __init__(self, pool, pool_key=None, debuglevel=0, context=None):
+        """
+        @param pool: Réservoir de connexions à utiliser.
+        @type pool: L{ConnectionPool}
+        @param pool_key: Complément de clé permettant de séparer
+            les connexions selon la configuration d'authentification.
+        @type pool_key: C{tuple}
+        @param context: Contexte SSL éventuel.
+        @type context: C{ssl.SSLContext}
+        """
+        urllib2.HTTPSHandler.__init__(self, debuglevel)
+        self._context = context
+        self.pool = pool
+        self.pool_key = pool_key
+
+    def _new_connection(self, host, timeout):
+        if self._context is None:
+            return self.connection_class(host, timeout=timeout)
+        return self.connection_class(host, timeout=timeout,
+                                     context=self._context)
+
+    def https_open(self, req):
+        return self._pooled_open(req)
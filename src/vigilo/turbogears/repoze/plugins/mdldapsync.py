@@ -18,6 +18,7 @@ from sqlalchemy.exc import SQLAlchemyError
 
 from vigilo.models.session import DBSession
 from vigilo.models.tables import User, UserGroup
+from vigilo.turbogears.acl import bump_acl_version_on_commit
 
 from vigilo.common.gettext import translate
 _ = translate(__name__)
@@ -318,6 +319,7 @@ class VigiloLdapSync(object):
                 return None
 
         current_user_groups = user.usergroups
+        groups_changed = False
 
         # Suppression des groupes présents qui ne devraient plus l'être.
         for group in current_user_groups:
@@ -329,6 +331,7 @@ class VigiloLdapSync(object):
                         'group': group.group_name,
                     })
                 user.usergroups.remove(group)
+                groups_changed = True
 
         # Ajout des groupes manquants.
         for group_name in user_groups:
@@ -361,9 +364,14 @@ class VigiloLdapSync(object):
                     'group': group_name,
                 })
             user.usergroups.append(group)
+            groups_changed = True
 
         try:
             DBSession.flush()
+            # Les groupes de l'utilisateur ont changé : le cache
+            # des droits d'accès doit être invalidé.
+            if groups_changed:
+                bump_acl_version_on_commit()
             # Nécessaire afin que les modifications soient sauvegardées
             # en base de données. Sans cela, le groupe serait supprimé
             # automatiquement (via un ROLLBACK) en cas d'erreur issue
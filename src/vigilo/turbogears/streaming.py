@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Outils pour la transmission progressive (streaming) de documents,
+notamment ceux obtenus au travers du proxy ou produits par l'API.
+"""
+
+import zlib
+from xml.sax.saxutils import escape, quoteattr
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+__all__ = ('iter_file', 'iter_rewrite', 'StreamRewriter',
+           'iter_json_collection', 'iter_xml_collection', )
+
+# Taille par défaut des blocs transmis (en octets).
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Paramètre "wbits" de zlib pour le format gzip.
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def iter_file(fileobj, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Parcourt le contenu d'un objet de type fichier par blocs
+    de taille fixe. Le fichier est fermé à la fin du parcours,
+    y compris si celui-ci est interrompu.
+
+    Ce générateur peut être utilisé comme "app_iter" WSGI.
+
+    @param fileobj: Objet de type fichier (ex : réponse de urllib2).
+    @type fileobj: C{file-like}
+    @param chunk_size: Taille maximale des blocs retournés.
+    @type chunk_size: C{int}
+    @return: Générateur sur les blocs de données.
+    @rtype: C{generator}
+    """
+    try:
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        close = getattr(fileobj, 'close', None)
+        if close is not None:
+            close()
+
+
+class StreamRewriter(object):
+    """
+    Remplace toutes les occurrences d'une chaîne par une autre
+    dans un flux de données reçu par blocs. Les occurrences
+    à cheval sur deux blocs sont correctement remplacées.
+    """
+
+    def __init__(self, old, new):
+        """
+        @param old: Chaîne à remplacer (non vide).
+        @type old: C{str}
+        @param new: Chaîne de remplacement.
+        @type new: C{str}
+        """
+        if not old:
+            raise ValueError('The string to replace must not be empty')
+        self.old = old
+        self.new = new
+        self._pending = ''
+
+    def feed(self, data):
+        """
+        Traite un nouveau bloc de données.
+
+        @param data: Bloc de données.
+        @type data: C{str}
+        @return: Données réécrites pouvant être transmises immédiatement.
+            La fin du bloc est conservée tant qu'elle peut correspondre
+            au début d'une occurrence.
+        @rtype: C{str}
+        """
+        buf = self._pending + data
+        parts = []
+        start = 0
+        while True:
+            index = buf.find(self.old, start)
+            if index == -1:
+                break
+            parts.append(buf[start:index])
+            parts.append(self.new)
+            start = index + len(self.old)
+
+        # Une occurrence commençant dans les len(old) - 1 derniers
+        # octets peut se terminer dans le bloc suivant.
+        split = max(start, len(buf) - len(self.old) + 1)
+        parts.append(buf[start:split])
+        self._pending = buf[split:]
+        return ''.join(parts)
+
+    def flush(self):
+        """
+        Termine le traitement du flux.
+
+        @return: Données restantes.
+        @rtype: C{str}
+        """
+        data, self._pending = self._pending, ''
+        return data
+
+
+def iter_rewrite(fileobj, old, new, chunk_size=DEFAULT_CHUNK_SIZE,
+                 gzipped=False, compresslevel=6):
+    """
+    Parcourt le contenu d'un objet de type fichier par blocs
+    en remplaçant au passage toutes les occurrences d'une chaîne.
+    Le fichier est fermé à la fin du parcours.
+
+    @param fileobj: Objet de type fichier (ex : réponse de urllib2).
+    @type fileobj: C{file-like}
+    @param old: Chaîne à remplacer.
+    @type old: C{str}
+    @param new: Chaîne de remplacement.
+    @type new: C{str}
+    @param chunk_size: Taille des blocs lus dans le fichier.
+    @type chunk_size: C{int}
+    @param gzipped: Indique que le contenu est compressé au format gzip.
+        Il est alors décompressé pour la réécriture, puis recompressé
+        à la volée.
+    @type gzipped: C{bool}
+    @param compresslevel: Niveau de compression utilisé pour recompresser
+        le contenu.
+    @type compresslevel: C{int}
+    @return: Générateur sur les blocs de données réécrits.
+    @rtype: C{generator}
+    """
+    rewriter = StreamRewriter(old, new)
+    if gzipped:
+        decompressor = zlib.decompressobj(GZIP_WBITS)
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED,
+                                      GZIP_WBITS)
+    else:
+        decompressor = compressor = None
+
+    chunks = iter_file(fileobj, chunk_size)
+    try:
+        for chunk in chunks:
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk)
+            chunk = rewriter.feed(chunk)
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+    finally:
+        chunks.close()
+
+    chunk = ''
+    if decompressor is not None:
+        chunk = decompressor.flush()
+    chunk = rewriter.feed(chunk) + rewriter.flush()
+    if compressor is not None:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def _iter_buffered(parts, chunk_size):
+    """
+    Regroupe des fragments de document en blocs d'au moins
+    C{chunk_size} octets (sauf le dernier).
+    """
+    buf = []
+    size = 0
+    for part in parts:
+        if isinstance(part, unicode):
+            part = part.encode('utf-8')
+        buf.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield ''.join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield ''.join(buf)
+
+def iter_json_collection(key, items, trailer=None,
+                         chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Sérialise progressivement au format JSON un objet de la forme
+    C{{key: [items...], ...}}, sans conserver la liste des éléments
+    en mémoire.
+
+    @param key: Nom de la liste des éléments.
+    @type key: C{str}
+    @param items: Éléments de la liste (sérialisables en JSON).
+    @type items: C{iterable}
+    @param trailer: Fonction appelée une fois les éléments parcourus,
+        retournant les autres attributs de l'objet (ex : lien vers
+        la page suivante).
+    @type trailer: C{callable}
+    @param chunk_size: Taille minimale des blocs retournés.
+    @type chunk_size: C{int}
+    @return: Générateur sur les blocs du document (encodé en UTF-8).
+    @rtype: C{generator}
+    """
+    def parts():
+        yield '{%s: [' % json.dumps(key)
+        separator = ''
+        for item in items:
+            yield separator + json.dumps(item)
+            separator = ', '
+        yield ']'
+        for name, value in sorted((trailer and trailer() or {}).items()):
+            yield ', %s: %s' % (json.dumps(name), json.dumps(value))
+        yield '}'
+    return _iter_buffered(parts(), chunk_size)
+
+def iter_xml_collection(root, tag, items, trailer=None,
+                        chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Sérialise progressivement une liste d'éléments au format XML.
+    Chaque élément (dictionnaire) devient une balise C{tag} dont
+    les attributs XML sont les valeurs simples du dictionnaire ;
+    les valeurs C{None} sont omises. Exemple ::
+
+        <hosts><host href="..." id="1" name="web1"/>...</hosts>
+
+    @param root: Nom de la balise racine.
+    @type root: C{str}
+    @param tag: Nom de la balise de chaque élément.
+    @type tag: C{str}
+    @param items: Éléments (dictionnaires).
+    @type items: C{iterable}
+    @param trailer: Fonction appelée une fois les éléments parcourus,
+        retournant un dictionnaire de balises à ajouter en fin de document
+        (ex : C{{'next': url}}).
+    @type trailer: C{callable}
+    @param chunk_size: Taille minimale des blocs retournés.
+    @type chunk_size: C{int}
+    @return: Générateur sur les blocs du document (encodé en UTF-8).
+    @rtype: C{generator}
+    """
+    def parts():
+        yield '<?xml version="1.0" encoding="utf-8"?>\n<%s>' % root
+        for item in items:
+            attrs = ''.join([
+                ' %s=%s' % (name, quoteattr(unicode(value)))
+                for (name, value) in sorted(item.items())
+                if value is not None
+            ])
+            yield '<%s%s/>' % (tag, attrs)
+        for name, value in sorted((trailer and trailer() or {}).items()):
+            if value is not None:
+                yield '<%s>%s</%s>' % (name, escape(unicode(value)), name)
+        yield '</%s>\n' % root
+    return _iter_buffered(parts(), chunk_size)
@@ -17,6 +17,7 @@ from gearbox.commands.setup_app import SetupAppCommand
 from webtest import TestApp
 
 from vigilo.models.session import metadata, DBSession
+from vigilo.turbogears.acl import bump_acl_version
 
 __all__ = ['setup_db', 'teardown_db', 'TestController']
 
@@ -81,6 +82,10 @@ class TestController(unittest.TestCase):
         box.command_manager.add_command('setup-app', SetupApp)
         box.run(['setup-app', '-q', '--debug', '-c', "%s#%s" %
                 (test_file, self.application_under_test)])
+        # La base de données est recréée pour chaque test :
+        # les données mises en cache par les tests précédents
+        # (droits d'accès, arborescences des groupes) sont périmées.
+        bump_acl_version()
 
     def tearDown(self):
         """Method called by nose after running each test"""
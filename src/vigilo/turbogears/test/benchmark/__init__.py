@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Bancs d'essai, lancés manuellement (ils ne font pas partie
+de la suite de tests automatisés).
+"""
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Compare le filtre historique de visibilité des hôtes (jointures externes
+sur les groupes des hôtes et des services, suivies d'un DISTINCT) avec
+le critère construit par L{vigilo.turbogears.acl.visible_hosts_filter}
+(union de semi-jointures).
+
+Usage ::
+
+    python -m vigilo.turbogears.test.benchmark.acl_hosts \\
+        [url_de_la_base [nb_hotes [nb_services_par_hote]]]
+
+Par défaut, une base SQLite en mémoire est utilisée. Les tables sont
+créées puis supprimées : n'utilisez pas une base de production.
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+
+import transaction
+from sqlalchemy.sql.expression import or_
+
+from vigilo.models.configure import configure_db
+from vigilo.models.session import DBSession, metadata
+from vigilo.models.demo import functions
+from vigilo.models.tables import Host, LowLevelService
+from vigilo.models.tables.secondary_tables import SUPITEM_GROUP_TABLE
+
+from vigilo.turbogears.acl import visible_hosts_filter
+
+GROUPS = 50
+ALLOWED_GROUPS = 5
+ROUNDS = 5
+
+
+def populate(nb_hosts, nb_services):
+    """Crée les hôtes, les services et leurs groupes."""
+    groups = [functions.add_supitemgroup(u'group%d' % i).idgroup
+              for i in xrange(GROUPS)]
+    memberships = []
+    for i in xrange(nb_hosts):
+        host = functions.add_host(u'host%06d' % i)
+        # Un hôte sur deux appartient directement à un groupe ;
+        # les autres ne sont visibles qu'au travers de leurs services.
+        if i % 2:
+            memberships.append({
+                'idsupitem': host.idhost,
+                'idgroup': groups[i % GROUPS],
+            })
+        for j in xrange(nb_services):
+            service = functions.add_lowlevelservice(host, u'svc%d' % j)
+            memberships.append({
+                'idsupitem': service.idservice,
+                'idgroup': groups[(i + j) % GROUPS],
+            })
+    DBSession.execute(SUPITEM_GROUP_TABLE.insert(), memberships)
+    DBSession.flush()
+    transaction.commit()
+    return groups[:ALLOWED_GROUPS]
+
+def legacy_query(user_groups, distinct=True):
+    """Requête historique (jointures externes et DISTINCT)."""
+    hostgroup = SUPITEM_GROUP_TABLE.alias()
+    servicegroup = SUPITEM_GROUP_TABLE.alias()
+    query = DBSession.query(Host.idhost)
+    if distinct:
+        query = query.distinct()
+    return query.outerjoin(
+            (hostgroup, hostgroup.c.idsupitem == Host.idhost),
+            (LowLevelService, LowLevelService.idhost == Host.idhost),
+            (servicegroup, servicegroup.c.idsupitem == \
+                LowLevelService.idservice),
+        ).filter(or_(
+            hostgroup.c.idgroup.in_(user_groups),
+            servicegroup.c.idgroup.in_(user_groups),
+        ))
+
+def semijoin_query(user_groups):
+    """Requête utilisant l'union de semi-jointures."""
+    return DBSession.query(Host.idhost).filter(
+        visible_hosts_filter(user_groups))
+
+def explain(query):
+    """Affiche le plan d'exécution de la requête."""
+    bind = DBSession.get_bind()
+    compiled = query.statement.compile(dialect=bind.dialect)
+    if bind.dialect.name == 'postgresql':
+        prefix = 'EXPLAIN ANALYZE '
+    elif bind.dialect.name == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        prefix = 'EXPLAIN '
+    params = compiled.params
+    if compiled.positional:
+        params = tuple([params[name] for name in compiled.positiontup])
+    for row in bind.execute(prefix + unicode(compiled), params):
+        print('    ', ' | '.join([unicode(col) for col in row]))
+
+def measure(query):
+    """Retourne la durée moyenne d'exécution de la requête."""
+    start = time.time()
+    for _i in xrange(ROUNDS):
+        result = query.all()
+    return (time.time() - start) / ROUNDS, set([row[0] for row in result])
+
+def main(args):
+    url = len(args) > 0 and args[0] or 'sqlite://'
+    nb_hosts = len(args) > 1 and int(args[1]) or 5000
+    nb_services = len(args) > 2 and int(args[2]) or 20
+
+    configure_db({'sqlalchemy.url': url}, 'sqlalchemy.')
+    metadata.create_all(DBSession.get_bind())
+    try:
+        print("Populating %d hosts with %d services each..." %
+              (nb_hosts, nb_services))
+        user_groups = populate(nb_hosts, nb_services)
+
+        rows = legacy_query(user_groups, distinct=False).count()
+        print("Rows before DISTINCT (legacy query): %d" % rows)
+
+        for label, query in (
+                ('legacy (outer joins + DISTINCT)', legacy_query(user_groups)),
+                ('union of semi-joins', semijoin_query(user_groups)),
+            ):
+            duration, hosts = measure(query)
+            print("\n%s: %d hosts, %.1f ms" %
+                  (label, len(hosts), duration * 1000))
+            explain(query)
+            if label.startswith('legacy'):
+                expected = hosts
+            elif hosts != expected:
+                print("ERROR: the two queries return different hosts")
+                return 1
+        return 0
+    finally:
+        transaction.abort()
+        DBSession.remove()
+        metadata.drop_all(DBSession.get_bind())
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
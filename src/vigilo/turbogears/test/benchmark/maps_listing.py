@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Compare l'ancien parcours des cartes accessibles (chargement des cartes
+de chaque groupe puis dédoublonnage dans une liste) avec la requête
+utilisée par L{vigilo.turbogears.controllers.api.maps.MapsV1.get_all}
+(semi-jointure sur les groupes des cartes).
+
+Usage ::
+
+    python -m vigilo.turbogears.test.benchmark.maps_listing \\
+        [url_de_la_base [nb_cartes [nb_groupes]]]
+
+Par défaut, une base SQLite en mémoire est utilisée. Les tables sont
+créées puis supprimées : n'utilisez pas une base de production.
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+
+import transaction
+
+from vigilo.models.configure import configure_db
+from vigilo.models.session import DBSession, metadata
+from vigilo.models.demo import functions
+from vigilo.models.tables import Map, MapGroup
+
+ROUNDS = 5
+
+
+def populate(nb_maps, nb_groups):
+    """
+    Crée les cartes et leurs groupes. Chaque carte appartient à deux
+    groupes, afin que le dédoublonnage soit nécessaire.
+    """
+    groups = [functions.add_mapgroup(u'group%d' % i)
+              for i in xrange(nb_groups)]
+    for i in xrange(nb_maps):
+        m = functions.add_map(u'map%06d' % i, groups[i % nb_groups])
+        m.groups.append(groups[(i + 1) % nb_groups])
+    DBSession.flush()
+    transaction.commit()
+    return [idgroup for (idgroup, ) in DBSession.query(MapGroup.idgroup)]
+
+def legacy_listing(mapgroups):
+    """Ancien parcours : une requête par groupe, dédoublonnage en O(n²)."""
+    result = []
+    for idgroup in mapgroups:
+        mapgroup = DBSession.query(MapGroup).get(idgroup)
+        for m in mapgroup.maps:
+            if m.idmap in [mr["id"] for mr in result]:
+                continue
+            result.append({"id": m.idmap, "title": m.title})
+    return result
+
+def semijoin_listing(mapgroups):
+    """Requête unique utilisant une semi-jointure sur les groupes."""
+    return [{"id": m.idmap, "title": m.title}
+            for m in DBSession.query(Map.idmap, Map.title).filter(
+                Map.groups.any(MapGroup.idgroup.in_(mapgroups))
+            ).order_by(Map.idmap)]
+
+def measure(listing, mapgroups):
+    """Retourne la durée moyenne du parcours et les cartes trouvées."""
+    start = time.time()
+    for _i in xrange(ROUNDS):
+        result = listing(mapgroups)
+        # Les instances chargées ne doivent pas profiter
+        # au tour suivant.
+        DBSession.expunge_all()
+    return (time.time() - start) / ROUNDS, result
+
+def main(args):
+    url = len(args) > 0 and args[0] or 'sqlite://'
+    nb_maps = len(args) > 1 and int(args[1]) or 5000
+    nb_groups = len(args) > 2 and int(args[2]) or 500
+
+    configure_db({'sqlalchemy.url': url}, 'sqlalchemy.')
+    metadata.create_all(DBSession.get_bind())
+    try:
+        print("Populating %d maps in %d groups..." % (nb_maps, nb_groups))
+        mapgroups = populate(nb_maps, nb_groups)
+
+        expected = None
+        for label, listing in (
+                ('legacy (per-group loading + list)', legacy_listing),
+                ('semi-join', semijoin_listing),
+            ):
+            duration, result = measure(listing, mapgroups)
+            print("%s: %d maps, %.1f ms" %
+                  (label, len(result), duration * 1000))
+            ids = set([m["id"] for m in result])
+            if len(ids) != len(result):
+                print("ERROR: duplicate maps in the result")
+                return 1
+            if expected is None:
+                expected = ids
+            elif ids != expected:
+                print("ERROR: the two listings return different maps")
+                return 1
+        return 0
+    finally:
+        transaction.abort()
+        DBSession.remove()
+        metadata.drop_all(DBSession.get_bind())
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# vim: set fileencoding=utf-8 sw=4 ts=4 et :
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Teste les requêtes groupées de l'API (paramètre "ids").
+"""
+
+import transaction
+
+from vigilo.models.demo import functions
+from vigilo.models.session import DBSession
+from vigilo.models.tables import Host, LowLevelService
+from vigilo.turbogears.test import TestController
+
+class TestApiBatch(TestController):
+    """Description de plusieurs éléments en une seule requête."""
+
+    def setUp(self):
+        super(TestApiBatch, self).setUp()
+        functions.add_user(u'direct', u'direct@test', u'', u'', u'direct')
+        group = functions.add_supitemgroup(u'Group')
+        functions.add_supitemgrouppermission(group, u'direct')
+        for name in (u'host1', u'host2'):
+            host = functions.add_host(name)
+            functions.add_host2group(host, group)
+            functions.add_lowlevelservice(host, u'service')
+        # Hôte auquel l'utilisateur n'a pas accès : son service
+        # est accessible à un autre utilisateur uniquement.
+        functions.add_user(u'other', u'other@test', u'', u'', u'other')
+        other = functions.add_supitemgroup(u'Other')
+        functions.add_supitemgrouppermission(other, u'other')
+        hidden = functions.add_host(u'hidden')
+        functions.add_lls2group(
+            functions.add_lowlevelservice(hidden, u'service'), other)
+        DBSession.flush()
+        transaction.commit()
+
+    def _get(self, url, ids, status=200):
+        return self.app.get(url, {'ids': ids},
+                            extra_environ={'REMOTE_USER': 'direct'},
+                            status=status)
+
+    def test_hosts(self):
+        """Hôtes accessibles, interdits et introuvables."""
+        ids = [Host.by_host_name(name).idhost
+               for name in (u'host1', u'host2', u'hidden')]
+        ids.append(max(ids) + 1000)
+        res = self._get('/api/v1/hosts.json',
+                        u','.join([str(i) for i in ids])).json['hosts']
+        self.assertEqual(sorted([str(i) for i in ids]), sorted(res.keys()))
+        self.assertEqual(u'host1', res[str(ids[0])]['name'])
+        self.assertEqual([u'/Group'],
+                         [g['name'] for g in res[str(ids[1])]['groups']])
+        self.assertEqual(403, res[str(ids[2])]['error']['status'])
+        self.assertEqual(404, res[str(ids[3])]['error']['status'])
+
+    def test_services(self):
+        """Services accessibles et interdits."""
+        visible = DBSession.query(LowLevelService.idservice).join(
+            Host).filter(Host.name == u'host1').scalar()
+        hidden = DBSession.query(LowLevelService.idservice).join(
+            Host).filter(Host.name == u'hidden').scalar()
+        res = self._get('/api/v1/lls.json',
+                        u'%d,%d' % (visible, hidden)).json['services']
+        self.assertEqual(u'host1', res[str(visible)]['host']['name'])
+        self.assertEqual(403, res[str(hidden)]['error']['status'])
+
+    def test_invalid(self):
+        """Identifiants invalides ou format non supporté."""
+        self._get('/api/v1/hosts.json', u'1,abc', status=400)
+        self._get('/api/v1/hosts.json', u'', status=400)
+        self._get('/api/v1/hosts.xml', u'1', status=400)
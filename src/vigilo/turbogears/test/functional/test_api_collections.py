@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# vim: set fileencoding=utf-8 sw=4 ts=4 et :
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Teste la pagination, le filtrage et la projection
+des collections de l'API.
+"""
+
+from xml.etree import ElementTree
+
+import transaction
+from tg import config
+
+from vigilo.models.demo import functions
+from vigilo.models.session import DBSession
+from vigilo.turbogears.test import TestController
+
+class TestApiCollections(TestController):
+    """Paramètres communs aux collections de l'API."""
+
+    def setUp(self):
+        super(TestApiCollections, self).setUp()
+        functions.add_user(u'direct', u'direct@test', u'', u'', u'direct')
+        group = functions.add_supitemgroup(u'Group')
+        functions.add_supitemgrouppermission(group, u'direct')
+        # Groupe contenant les mêmes services,
+        # accessible à un autre utilisateur.
+        functions.add_user(u'other', u'other@test', u'', u'', u'other')
+        shared = functions.add_supitemgroup(u'Shared')
+        functions.add_supitemgrouppermission(shared, u'other')
+        for name in (u'web1', u'web2', u'web3', u'db1', u'db2'):
+            host = functions.add_host(name)
+            functions.add_host2group(host, group)
+            service = functions.add_lowlevelservice(host, u'service')
+            functions.add_lls2group(service, shared)
+        # Hôte auquel l'utilisateur n'a pas accès.
+        hidden = functions.add_host(u'web4')
+        functions.add_lls2group(
+            functions.add_lowlevelservice(hidden, u'service'), shared)
+        DBSession.flush()
+        transaction.commit()
+
+    def _get(self, url, status=200, **params):
+        return self.app.get(url, params,
+                            extra_environ={'REMOTE_USER': 'direct'},
+                            status=status)
+
+    def test_pagination(self):
+        """Pagination par clé en suivant les liens "next"."""
+        names = []
+        url = '/api/v1/hosts.json'
+        params = {'limit': 2}
+        while url:
+            res = self._get(url, **params).json
+            self.assertTrue(len(res['hosts']) <= 2)
+            names.extend([h['name'] for h in res['hosts']])
+            url, params = res['next'], {}
+        self.assertEqual(
+            sorted([u'web1', u'web2', u'web3', u'db1', u'db2']),
+            sorted(names))
+
+    def test_services_pagination(self):
+        """Services partagés entre plusieurs utilisateurs."""
+        ids = []
+        url = '/api/v1/lls.json'
+        params = {'limit': 2}
+        while url:
+            res = self._get(url, **params).json
+            self.assertTrue(len(res['services']) <= 2)
+            self.assertTrue(res['next'] is None or len(res['services']) == 2)
+            ids.extend([s['id'] for s in res['services']])
+            url, params = res['next'], {}
+        self.assertEqual(5, len(ids))
+        self.assertEqual(5, len(set(ids)))
+
+    def test_offset(self):
+        """Pagination par décalage."""
+        all_hosts = self._get('/api/v1/hosts.json').json
+        self.assertEqual(5, len(all_hosts['hosts']))
+        self.assertEqual(None, all_hosts['next'])
+        res = self._get('/api/v1/hosts.json', limit=2, offset=3).json
+        self.assertEqual(all_hosts['hosts'][3:], res['hosts'])
+        self.assertEqual(None, res['next'])
+
+    def test_name(self):
+        """Filtrage sur le nom."""
+        res = self._get('/api/v1/hosts.json', name=u'web*').json
+        self.assertEqual([u'web1', u'web2', u'web3'],
+                         sorted([h['name'] for h in res['hosts']]))
+
+    def test_fields(self):
+        """Projection sur certains attributs."""
+        res = self._get('/api/v1/hosts.json', name=u'db1',
+                        fields=u'name').json
+        self.assertEqual([{'name': u'db1'}], res['hosts'])
+        self._get('/api/v1/hosts.json', status=400, fields=u'password')
+
+    def test_fields_xml(self):
+        """Projection au format XML."""
+        # Les modèles XML ignorent la projection.
+        self._get('/api/v1/hosts.xml', status=400, fields=u'id')
+        # Le document transmis progressivement en tient compte.
+        config['api_stream_xml'] = True
+        try:
+            res = self._get('/api/v1/hosts.xml', name=u'db1', fields=u'id')
+        finally:
+            del config['api_stream_xml']
+        hosts = ElementTree.fromstring(res.body).findall('host')
+        self.assertEqual(1, len(hosts))
+        self.assertEqual(['id'], hosts[0].keys())
+
+    def test_invalid(self):
+        """Paramètres de pagination invalides."""
+        self._get('/api/v1/hosts.json', status=400, limit=u'abc')
+        self._get('/api/v1/hosts.json', status=400, offset=-1)
+        self._get('/api/v1/hosts.json', status=400, limit=0)
+
+    def test_stream_json(self):
+        """Transmission progressive au format JSON."""
+        expected = self._get('/api/v1/hosts.json', name=u'web*', limit=2).json
+        config['api_stream'] = True
+        try:
+            res = self._get('/api/v1/hosts.json', name=u'web*', limit=2)
+        finally:
+            del config['api_stream']
+        self.assertEqual('application/json', res.content_type)
+        self.assertEqual(expected, res.json)
+        self.assertTrue('after=' in res.json['next'])
+
+    def test_stream_xml(self):
+        """Transmission progressive au format XML."""
+        config['api_stream_xml'] = True
+        try:
+            res = self._get('/api/v1/hosts/', name=u'web*', limit=2)
+        finally:
+            del config['api_stream_xml']
+        self.assertEqual('application/xml', res.content_type)
+        root = ElementTree.fromstring(res.body)
+        self.assertEqual(2, len(root.findall('host')))
+        self.assertTrue('after=' in root.findtext('next'))
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# vim: set fileencoding=utf-8 sw=4 ts=4 et :
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Teste le parcours de la hiérarchie des groupes via l'API.
+"""
+
+import transaction
+
+from vigilo.models.demo import functions
+from vigilo.models.session import DBSession
+from vigilo.models.tables import SupItemGroup
+from vigilo.turbogears.test import TestController
+
+class TestApiGroups(TestController):
+    """Parcours des groupes d'éléments supervisés."""
+
+    def setUp(self):
+        super(TestApiGroups, self).setUp()
+        functions.add_user(u'direct', u'direct@test', u'', u'', u'direct')
+        root = functions.add_supitemgroup(u'Root')
+        for name in (u'C', u'A', u'B'):
+            child = functions.add_supitemgroup(name, root)
+            if name != u'B':
+                functions.add_supitemgrouppermission(child, u'direct')
+        functions.add_supitemgroup(u'Hidden')
+        DBSession.flush()
+        transaction.commit()
+
+    def _get(self, url):
+        return self.app.get(url, extra_environ={'REMOTE_USER': 'direct'}).json
+
+    def test_get_all(self):
+        """Groupes de premier niveau accessibles."""
+        res = self._get('/api/v1/supitemgroups.json')
+        self.assertEqual([u'/Root'], [g['name'] for g in res['groups']])
+
+    def test_get_one(self):
+        """Sous-groupes accessibles, triés par nom."""
+        idgroup = SupItemGroup.by_group_name(u'Root').idgroup
+        res = self._get('/api/v1/supitemgroups/%d.json' % idgroup)
+        self.assertEqual(u'/Root', res['group']['name'])
+        self.assertEqual([u'/Root/A', u'/Root/C'],
+                         [g['name'] for g in res['group']['children']])
+
+    def test_new_group(self):
+        """Un groupe créé après la mise en cache est trouvé."""
+        self._get('/api/v1/supitemgroups.json')
+        root = SupItemGroup.by_group_name(u'Root')
+        group = functions.add_supitemgroup(u'New', root)
+        functions.add_supitemgrouppermission(group, u'direct')
+        idgroup = group.idgroup
+        DBSession.flush()
+        transaction.commit()
+        res = self._get('/api/v1/supitemgroups/%d.json' % idgroup)
+        self.assertEqual(u'/Root/New', res['group']['name'])
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# vim: set fileencoding=utf-8 sw=4 ts=4 et :
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Vérifie que le nombre de requêtes SQL émises par l'API
+ne dépend pas du nombre d'éléments retournés.
+"""
+
+import transaction
+from sqlalchemy import event
+from tg import config
+
+from vigilo.models.demo import functions
+from vigilo.models.session import DBSession
+from vigilo.models.tables import Host, LowLevelService, SupItemGroup, \
+        Map, MapNode
+from vigilo.turbogears.test import TestController
+
+class TestApiQueries(TestController):
+    """Nombre de requêtes SQL émises par l'API."""
+
+    def setUp(self):
+        super(TestApiQueries, self).setUp()
+        self.statements = []
+        self.engine = config['tg.app_globals'].sa_engine
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+
+        functions.add_user(u'direct', u'direct@test', u'', u'', u'direct')
+        host = functions.add_host(u'host')
+        service = functions.add_lowlevelservice(host, u'service')
+        parent = functions.add_supitemgroup(u'Parent')
+        functions.add_supitemgrouppermission(parent, u'direct')
+        functions.add_host2group(host, parent)
+        functions.add_lls2group(service, parent)
+        DBSession.flush()
+        transaction.commit()
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+        super(TestApiQueries, self).tearDown()
+
+    def _count(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def _get(self, url):
+        del self.statements[:]
+        res = self.app.get(url, extra_environ={'REMOTE_USER': 'direct'})
+        return res.json, len(self.statements)
+
+    def _add_groups(self, count):
+        """Ajoute l'hôte et son service à de nouveaux groupes."""
+        host = DBSession.query(Host).one()
+        service = DBSession.query(LowLevelService).one()
+        parent = SupItemGroup.by_group_name(u'Parent')
+        for i in xrange(count):
+            group = functions.add_supitemgroup(u'Child%d' % i, parent)
+            functions.add_host2group(host, group)
+            functions.add_lls2group(service, group)
+        DBSession.flush()
+        transaction.commit()
+
+    def test_host(self):
+        """HostsV1.get_one : nombre de requêtes constant."""
+        idhost = DBSession.query(Host.idhost).scalar()
+        url = '/api/v1/hosts/%d.json' % idhost
+        res, before = self._get(url)
+        self.assertEqual([u'/Parent'],
+                         [g['name'] for g in res['host']['groups']])
+
+        self._add_groups(5)
+        res, after = self._get(url)
+        self.assertEqual(6, len(res['host']['groups']))
+        self.assertTrue(u'/Parent/Child4' in
+                        [g['name'] for g in res['host']['groups']])
+        self.assertEqual(before, after, self.statements)
+
+    def test_service(self):
+        """ServicesV1.get_one : nombre de requêtes constant."""
+        idservice = DBSession.query(LowLevelService.idservice).scalar()
+        url = '/api/v1/lls/%d.json' % idservice
+        res, before = self._get(url)
+        self.assertEqual(u'host', res['service']['host']['name'])
+
+        self._add_groups(5)
+        res, after = self._get(url)
+        self.assertEqual(6, len(res['service']['groups']))
+        self.assertEqual(before, after, self.statements)
+
+    def test_graphs(self):
+        """GraphsV1.get_all : une seule liste, sans doublon."""
+        functions.add_vigiloserver(u'localhost')
+        functions.add_application(u'vigirrd')
+        graph = functions.add_graph(u'graph')
+        hidden = functions.add_host(u'hidden')
+        for host in (Host.by_host_name(u'host'), hidden):
+            ds = functions.add_perfdatasource(u'load', host)
+            functions.add_perfdatasource2graph(ds, graph)
+        functions.add_perfdatasource2graph(
+            functions.add_perfdatasource(u'other', hidden),
+            functions.add_graph(u'hidden'))
+        DBSession.flush()
+        transaction.commit()
+
+        res, before = self._get('/api/v1/graphs.json')
+        self.assertEqual([u'graph'], [g['name'] for g in res['graphs']])
+
+        # Le graphe est partagé par les deux hôtes,
+        # mais n'apparaît qu'une seule fois.
+        functions.add_host2group(Host.by_host_name(u'hidden'),
+                                 SupItemGroup.by_group_name(u'Parent'))
+        DBSession.flush()
+        transaction.commit()
+        res, after = self._get('/api/v1/graphs.json')
+        self.assertEqual([u'graph', u'hidden'],
+                         [g['name'] for g in res['graphs']])
+        self.assertEqual(before, after, self.statements)
+
+    def test_map(self):
+        """MapsV1.get_one avec include : nombre de requêtes constant."""
+        group = functions.add_mapgroup(u'Maps')
+        functions.add_mapgrouppermission(group, u'direct')
+        m = functions.add_map(u'map', group)
+        host = Host.by_host_name(u'host')
+        first = functions.add_node_host(host, u'first', m)
+        DBSession.flush()
+        idmap, idnode, idhost = m.idmap, first.idmapnode, host.idhost
+        transaction.commit()
+
+        url = '/api/v1/maps/%d.json?include=nodes,links' % idmap
+        res, before = self._get(url)
+        self.assertEqual([u'first'], [n['label'] for n in res['map']['nodes']])
+        self.assertEqual([], res['map']['links'])
+
+        m = DBSession.query(Map).get(idmap)
+        host = DBSession.query(Host).get(idhost)
+        first = DBSession.query(MapNode).get(idnode)
+        for i in xrange(5):
+            node = functions.add_node_host(host, u'node%d' % i, m)
+            segment = functions.add_segment(first, node, m)
+            segment.color = u'#%06x' % i
+        DBSession.flush()
+        transaction.commit()
+        res, after = self._get(url)
+        self.assertEqual(6, len(res['map']['nodes']))
+        self.assertEqual(5, len(res['map']['links']))
+        self.assertEqual(u'/api/v1/hosts/%d' % idhost,
+                         res['map']['nodes'][0]['supitem']['href'])
+        self.assertEqual([u'#%06x' % i for i in xrange(5)],
+                         sorted([l['color'] for l in res['map']['links']]))
+        self.assertEqual(before, after, self.statements)
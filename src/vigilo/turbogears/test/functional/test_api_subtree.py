@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# vim: set fileencoding=utf-8 sw=4 ts=4 et :
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Teste l'export d'une branche de la hiérarchie des groupes via l'API.
+"""
+
+import transaction
+
+from vigilo.models.demo import functions
+from vigilo.models.session import DBSession
+from vigilo.models.tables import SupItemGroup
+from vigilo.turbogears.test import TestController
+
+class TestApiSubtree(TestController):
+    """Export d'une branche de groupes d'éléments supervisés."""
+
+    def setUp(self):
+        super(TestApiSubtree, self).setUp()
+        functions.add_user(u'direct', u'direct@test', u'', u'', u'direct')
+        root = functions.add_supitemgroup(u'Root')
+        functions.add_supitemgrouppermission(root, u'direct')
+        child = functions.add_supitemgroup(u'Child', root)
+        functions.add_supitemgrouppermission(child, u'direct')
+        leaf = functions.add_supitemgroup(u'Leaf', child)
+        functions.add_supitemgrouppermission(leaf, u'direct')
+        # Sous-groupe auquel l'utilisateur n'a pas accès.
+        functions.add_supitemgroup(u'Hidden', root)
+
+        host = functions.add_host(u'host')
+        functions.add_host2group(host, root)
+        lls = functions.add_lowlevelservice(host, u'lls')
+        functions.add_host2group(lls, child)
+        hls = functions.add_highlevelservice(u'hls')
+        functions.add_host2group(hls, leaf)
+        DBSession.flush()
+        transaction.commit()
+
+    def _get(self, idgroup, status=200):
+        return self.app.get('/api/v1/supitemgroups/%s/tree/' % idgroup,
+                            extra_environ={'REMOTE_USER': 'direct'},
+                            status=status)
+
+    def test_subtree(self):
+        """Sous-groupes accessibles et éléments qu'ils contiennent."""
+        idgroup = SupItemGroup.by_group_name(u'Root').idgroup
+        root = self._get(idgroup).json['group']
+        self.assertEqual(u'/Root', root['name'])
+        self.assertEqual([u'host'], [h['name'] for h in root['hosts']])
+        self.assertEqual([u'/Root/Child'],
+                         [g['name'] for g in root['children']])
+
+        child = root['children'][0]
+        self.assertEqual([(u'host', u'lls')],
+                         [(s['host'], s['name']) for s in child['lls']])
+        self.assertEqual([], child['hosts'])
+
+        leaf = child['children'][0]
+        self.assertEqual(u'/Root/Child/Leaf', leaf['name'])
+        self.assertEqual([u'hls'], [s['name'] for s in leaf['hls']])
+        self.assertEqual([], leaf['children'])
+
+    def test_navigation_only(self):
+        """Les éléments d'un groupe seulement traversé sont omis."""
+        nav = functions.add_supitemgroup(u'Nav')
+        sub = functions.add_supitemgroup(u'Sub', nav)
+        functions.add_supitemgrouppermission(sub, u'direct')
+        functions.add_host2group(functions.add_host(u'navhost'), nav)
+        functions.add_host2group(functions.add_host(u'subhost'), sub)
+        DBSession.flush()
+        transaction.commit()
+
+        idgroup = SupItemGroup.by_group_name(u'Nav').idgroup
+        nav = self._get(idgroup).json['group']
+        self.assertEqual([], nav['hosts'])
+        self.assertEqual([u'/Nav/Sub'], [g['name'] for g in nav['children']])
+        self.assertEqual([u'subhost'],
+                         [h['name'] for h in nav['children'][0]['hosts']])
+
+    def test_forbidden(self):
+        """Branche inaccessible ou inexistante."""
+        self._get(SupItemGroup.by_group_name(u'Hidden').idgroup, status=403)
+        self._get(424242, status=404)
+        self._get(u'abc', status=400)
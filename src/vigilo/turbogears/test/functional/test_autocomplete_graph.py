@@ -29,13 +29,13 @@ class TestAutocompleterForGraph(AutoCompleterTest, TestController):
         functions.add_supitemgrouppermission(parent, u'indirect')
         functions.add_supitemgrouppermission(child, u'direct')
 
-    def _query_autocompleter(self, pattern, partial):
+    def _query_autocompleter(self, pattern, partial, **params):
         return self.app.post(
             '/autocomplete/graph',
-            {
+            dict({
                 'graphname': pattern,
                 'host': self.hostname,
                 'partial': partial,
                 'noCache': 42
-            },
+            }, **params),
             extra_environ=self.extra_environ).json
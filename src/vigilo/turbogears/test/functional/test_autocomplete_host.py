@@ -24,12 +24,12 @@ class TestAutocompleterForHost(AutoCompleterTest, TestController):
         functions.add_supitemgrouppermission(parent, u'indirect')
         functions.add_supitemgrouppermission(child, u'direct')
 
-    def _query_autocompleter(self, pattern, partial):
+    def _query_autocompleter(self, pattern, partial, **params):
         return self.app.post(
             '/autocomplete/host',
-            {
+            dict({
                 'host': pattern,
                 'partial': partial,
                 'noCache': 42
-            },
+            }, **params),
             extra_environ=self.extra_environ).json
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# vim: set fileencoding=utf-8 sw=4 ts=4 et :
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+import transaction
+from vigilo.models.demo import functions
+from vigilo.models.session import DBSession
+from vigilo.turbogears.test import TestController
+
+class TestAutocompleterSearch(TestController):
+    """Auto-compléteur global (méthode search)."""
+
+    def setUp(self):
+        super(TestAutocompleterSearch, self).setUp()
+        self.extra_environ = {}
+        for username in (u'nobody', u'direct'):
+            functions.add_user(username, u'%s@test' % username,
+                               u'', u'', username)
+
+        host = functions.add_host(u'foo')
+        functions.add_lowlevelservice(host, u'foobar')
+        functions.add_vigiloserver(u'localhost')
+        functions.add_application(u'vigirrd')
+        ds = functions.add_perfdatasource(u'xfoo', host)
+        graph = functions.add_graph(u'foo')
+        functions.add_perfdatasource2graph(ds, graph)
+
+        # L'hôte appartient au groupe "Child",
+        # l'utilisateur n'a pas accès au groupe "foogroup".
+        parent = functions.add_supitemgroup(u'Parent')
+        child = functions.add_supitemgroup(u'Child', parent)
+        functions.add_supitemgroup(u'foogroup')
+        functions.add_host2group(host, child)
+        functions.add_supitemgrouppermission(child, u'direct')
+        DBSession.flush()
+        transaction.commit()
+
+    def _search(self, user, pattern, **params):
+        self.extra_environ['REMOTE_USER'] = user
+        return self.app.post(
+            '/autocomplete/search',
+            dict({'pattern': pattern, 'noCache': 42}, **params),
+            extra_environ=self.extra_environ).json
+
+    def test_ranking(self):
+        """Résultats typés, classés puis triés par nom."""
+        res = self._search(u'direct', u'*foo', partial=True)
+        self.assertEqual({'more': False, 'results': [
+            {'type': u'graph', 'name': u'foo', 'host': u'foo'},
+            {'type': u'host', 'name': u'foo', 'host': None},
+            {'type': u'service', 'name': u'foobar', 'host': u'foo'},
+            {'type': u'perfdatasource', 'name': u'xfoo', 'host': u'foo'},
+        ]}, res)
+
+    def test_types(self):
+        """Restriction de la recherche à certains types d'éléments."""
+        res = self._search(u'direct', u'foo*', types=u'host, service')
+        self.assertEqual({'more': False, 'results': [
+            {'type': u'host', 'name': u'foo', 'host': None},
+            {'type': u'service', 'name': u'foobar', 'host': u'foo'},
+        ]}, res)
+
+    def test_limit(self):
+        """Le nombre de résultats peut être limité."""
+        res = self._search(u'direct', u'*foo*', limit=1)
+        self.assertEqual({'more': True, 'results': [
+            {'type': u'graph', 'name': u'foo', 'host': u'foo'},
+        ]}, res)
+        res = self._search(u'direct', u'*foo*', limit=1, offset=3)
+        self.assertEqual({'more': False, 'results': [
+            {'type': u'perfdatasource', 'name': u'xfoo', 'host': u'foo'},
+        ]}, res)
+
+    def test_permissions(self):
+        """Un utilisateur sans permission ne voit rien."""
+        res = self._search(u'nobody', u'*')
+        self.assertEqual({'more': False, 'results': []}, res)
@@ -25,27 +25,27 @@ class TestAutocompleterForServiceWithoutHost(AutoCompleterTest, TestController):
         functions.add_supitemgrouppermission(parent, u'indirect')
         functions.add_supitemgrouppermission(child, u'direct')
 
-    def _query_autocompleter(self, pattern, partial):
+    def _query_autocompleter(self, pattern, partial, **params):
         return self.app.post(
             '/autocomplete/service',
-            {
+            dict({
                 'service': pattern,
                 'partial': partial,
                 'noCache': 42
-            },
+            }, **params),
             extra_environ=self.extra_environ).json
 
 
 class TestAutocompleterForServiceWithHost(TestAutocompleterForServiceWithoutHost):
-    def _query_autocompleter(self, pattern, partial):
+    def _query_autocompleter(self, pattern, partial, **params):
         return self.app.post(
             '/autocomplete/service',
-            {
+            dict({
                 'service': pattern,
                 'host': self.hostname,
                 'partial': partial,
                 'noCache': 42
-            },
+            }, **params),
             extra_environ=self.extra_environ).json
 
     # @TODO: ajouter d'autres tests...
@@ -27,10 +27,10 @@ class TestAutocompleterForSupItemGroup(AutoCompleterTest, TestController):
             self._change_user(username)
             if username in (u'manager', u'direct', u'indirect'):
                 # Ces utilisateurs doivent voir l'élément.
-                expected = {'results': [u'foobarbaz']}
+                expected = {'results': [u'foobarbaz'], 'more': False}
             else:
                 # Les autres ne voient rien.
-                expected = {'results': []}
+                expected = {'results': [], 'more': False}
 
             # Recherche sur le nom exact.
             res = self._query_autocompleter(u'foobarbaz', False)
@@ -51,7 +51,7 @@ class TestAutocompleterForSupItemGroup(AutoCompleterTest, TestController):
             # Ces utilisateurs doivent voir l'élément et son parent.
             if username in (u'manager', u'indirect'):
                 expected['results'].insert(0, u'Parent')
-                expected = {'results': [u'Parent', u'foobarbaz']}
+                expected = {'results': [u'Parent', u'foobarbaz'], 'more': False}
 
             # Recherche en utilisant uniquement le joker '*'.
             res = self._query_autocompleter(u'*', False)
@@ -59,12 +59,12 @@ class TestAutocompleterForSupItemGroup(AutoCompleterTest, TestController):
                 u"Uniquement '*' en tant que %s (%r != %r)" %
                 (username, expected, res))
 
-    def _query_autocompleter(self, pattern, partial):
+    def _query_autocompleter(self, pattern, partial, **params):
         return self.app.post(
             '/autocomplete/supitemgroup',
-            {
+            dict({
                 'supitemgroup': pattern,
                 'partial': partial,
                 'noCache': 42
-            },
+            }, **params),
             extra_environ=self.extra_environ).json
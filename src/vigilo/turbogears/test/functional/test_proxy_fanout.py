@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# vim: set fileencoding=utf-8 sw=4 ts=4 et :
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Teste la récupération parallèle de documents au travers du proxy
+(get_many_through_proxy), depuis le traitement d'une requête HTTP
+jusqu'aux threads chargés des requêtes vers les serveurs distants.
+"""
+
+import threading
+import urllib
+import httplib
+from StringIO import StringIO
+
+import transaction
+from tg import config
+
+from vigilo.models.demo import functions
+from vigilo.models.session import DBSession
+from vigilo.turbogears.controllers import proxy
+from vigilo.turbogears.test import TestController
+from vigilo.turbogears.test_stack.controllers.root import RootController
+
+
+def make_response(body, url, content_type='text/plain'):
+    """Construit une réponse semblable à celles de urllib2."""
+    headers = httplib.HTTPMessage(
+        StringIO('Content-Type: %s\r\n\r\n' % content_type))
+    res = urllib.addinfourl(StringIO(body), headers, url)
+    res.code = 200
+    res.msg = 'OK'
+    return res
+
+
+class StubOpener(object):
+    """Opener urllib2 factice, qui mémorise les requêtes reçues."""
+
+    def __init__(self):
+        self.requests = []
+
+    def open(self, req):
+        self.requests.append((req.get_full_url(), threading.current_thread()))
+        return make_response('<%s>' % req.get_full_url(), req.get_full_url())
+
+
+def fanout_retriever(server_type, host, url, data=None, headers=None):
+    """
+    Récupère deux fois le document demandé via get_many_through_proxy
+    et retourne la concaténation des résultats (ou des erreurs).
+    """
+    requests = [(server_type, host, url, data, headers),
+                (server_type, host, url + '?second', data, headers)]
+    results = proxy.get_many_through_proxy(requests, lambda res: res.read())
+    body = '\n'.join([
+        error is None and result or 'error:%s' % error.__class__.__name__
+        for (result, error) in results
+    ])
+    return make_response(body, url)
+
+
+class TestProxyFanout(TestController):
+    """Récupération parallèle de documents au travers du proxy."""
+
+    def setUp(self):
+        super(TestProxyFanout, self).setUp()
+        functions.add_user(u'direct', u'direct@test', u'', u'', u'direct')
+        group = functions.add_supitemgroup(u'Group')
+        functions.add_supitemgrouppermission(group, u'direct')
+        host = functions.add_host(u'host')
+        functions.add_host2group(host, group)
+        server = functions.add_vigiloserver(u'localhost')
+        app = functions.add_application(u'nagios')
+        functions.add_ventilation(host, server, app)
+        DBSession.flush()
+        transaction.commit()
+
+        config['app_path.nagios'] = '/nagios/'
+        self.opener = StubOpener()
+        self._get_opener = proxy._get_opener
+        proxy._get_opener = lambda server_type, manager_url: self.opener
+        RootController.nagios.data_retriever = fanout_retriever
+
+    def tearDown(self):
+        RootController.nagios.data_retriever = proxy.get_through_proxy
+        proxy._get_opener = self._get_opener
+        del config['app_path.nagios']
+        super(TestProxyFanout, self).tearDown()
+
+    def _get(self, url):
+        return self.app.get(url, extra_environ={'REMOTE_USER': 'direct'})
+
+    def test_fanout(self):
+        """Les documents sont récupérés depuis des threads dédiés."""
+        res = self._get('/nagios/host/status')
+        self.assertEqual(
+            '<http://localhost:80/nagios/status>\n'
+            '<http://localhost:80/nagios/status?second>',
+            res.body)
+        self.assertEqual(2, len(self.opener.requests))
+        current = threading.current_thread()
+        for _url, thread in self.opener.requests:
+            self.assertNotEqual(current, thread)
+
+    def test_redirect(self):
+        """Les documents des serveurs avec redirection ne sont pas obtenus."""
+        config['app_redirect.nagios'] = True
+        try:
+            res = self._get('/nagios/host/status')
+        finally:
+            del config['app_redirect.nagios']
+        self.assertEqual('error:HTTPFound\nerror:HTTPFound', res.body)
+        self.assertEqual([], self.opener.requests)
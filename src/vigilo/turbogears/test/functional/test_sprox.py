@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# vim: set fileencoding=utf-8 sw=4 ts=4 et :
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Teste l'invalidation du cache des droits d'accès par les écrans
+d'administration (contrôleurs Sprox).
+"""
+
+import transaction
+
+from vigilo.models.demo import functions
+from vigilo.models.session import DBSession
+from vigilo.models.tables import SupItemGroup
+from vigilo.turbogears.acl import get_acl_version
+from vigilo.turbogears.test import TestController
+
+class TestSproxController(TestController):
+    """Modifications effectuées au travers d'un contrôleur Sprox."""
+
+    def setUp(self):
+        super(TestSproxController, self).setUp()
+        functions.add_user(u'manager', u'manager@test', u'', u'', u'managers')
+        idgroup = functions.add_supitemgroup(u'Group').idgroup
+        DBSession.flush()
+        transaction.commit()
+        self.idgroup = idgroup
+
+    def test_delete_bumps_acl_version(self):
+        """Une suppression invalide le cache des droits d'accès."""
+        version = get_acl_version()
+        self.app.post('/supitemgroups/%d' % self.idgroup,
+                      {'_method': 'DELETE'},
+                      extra_environ={'REMOTE_USER': 'manager'},
+                      status=302)
+        self.assertEqual(None, SupItemGroup.by_group_name(u'Group'))
+        self.assertNotEqual(version, get_acl_version())
+
@@ -47,7 +47,7 @@ class AutoCompleterTest(object):
     def test_no_such_item(self):
         """Autocomplétion sur un élément inexistant."""
         # L'élément n'existe pas : on attend une liste de résultats vide.
-        expected = {'results': []}
+        expected = {'results': [], 'more': False}
         for username, group in self.accounts:
             self._change_user(username)
 
@@ -70,10 +70,10 @@ class AutoCompleterTest(object):
             if (not self.check_permissions) or \
                 username in (u'manager', u'direct', u'indirect'):
                 # Ces utilisateurs doivent voir l'élément.
-                expected = {'results': [u'foobarbaz']}
+                expected = {'results': [u'foobarbaz'], 'more': False}
             else:
                 # Les autres ne voient rien.
-                expected = {'results': []}
+                expected = {'results': [], 'more': False}
 
             # Recherche sur le nom exact.
             res = self._query_autocompleter(u'foobarbaz', False)
@@ -106,17 +106,17 @@ class AutoCompleterTest(object):
             if (not self.check_permissions) or \
                 username in (u'manager', u'direct', u'indirect'):
                 # Ces utilisateurs doivent voir l'élément.
-                expected = {'results': [u'foobarbaz']}
+                expected = {'results': [u'foobarbaz'], 'more': False}
             else:
                 # Les autres ne voient rien.
-                expected = {'results': []}
+                expected = {'results': [], 'more': False}
 
             # La correspondance partielle se fait par rapport à un préfixe.
             res = self._query_autocompleter(u'foobar', True)
             self.assertEqual(res, expected,
                 u"Recherche partielle avec prefixe en tant que %s (%r != %r)" %
                 (username, expected, res))
-            expected = {'results': []}
+            expected = {'results': [], 'more': False}
             res = self._query_autocompleter(u'bar', True)
             self.assertEqual(res, expected,
                 u"Recherche partielle avec infixe en tant que %s (%r != %r)" %
@@ -125,3 +125,16 @@ class AutoCompleterTest(object):
             self.assertEqual(res, expected,
                 u"Recherche partielle avec suffixe en tant que %s (%r != %r)" %
                 (username, expected, res))
+
+    def test_pagination(self):
+        """Pagination des résultats de l'autocomplétion."""
+        self._change_user(u'direct')
+        for params, expected in (
+                # Une page vide : d'autres résultats suivent.
+                ({'limit': 0}, {'results': [], 'more': True}),
+                ({'limit': 1}, {'results': [u'foobarbaz'], 'more': False}),
+                ({'offset': 1}, {'results': [], 'more': False}),
+            ):
+            res = self._query_autocompleter(u'foobarbaz', False, **params)
+            self.assertEqual(res, expected,
+                u"Pagination avec %r (%r != %r)" % (params, expected, res))
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Teste le contexte de contrôle d'accès associé à une requête.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from tg import config
+
+from vigilo.turbogears.acl import AclContext, get_acl_version, \
+        bump_acl_version
+
+class FakeUser(object):
+    def __init__(self):
+        self.calls = []
+
+    def supitemgroups(self):
+        self.calls.append('supitemgroups')
+        return [(1, False), (2, True), (3, True)]
+
+    def mapgroups(self, only_id=True, only_direct=False):
+        self.calls.append(('mapgroups', only_id, only_direct))
+        return only_direct and [4] or [4, 5]
+
+
+class FakePredicate(object):
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def is_met(self, environ):
+        self.calls += 1
+        return self.result
+
+
+class TestAclContext(unittest.TestCase):
+    """Contexte de contrôle d'accès."""
+
+    def test_memoization(self):
+        """Les informations ne sont calculées qu'une seule fois."""
+        user = FakeUser()
+        predicate = FakePredicate(False)
+        acl = AclContext(user, {}, predicate)
+        for _i in xrange(3):
+            self.assertFalse(acl.is_manager)
+            self.assertEqual([2, 3], acl.supitem_group_ids)
+            self.assertEqual([1, 2, 3], acl.visible_supitem_group_ids)
+            self.assertEqual([4], acl.mapgroups(only_direct=True))
+            self.assertEqual([4, 5], acl.mapgroups())
+        self.assertEqual(1, predicate.calls)
+        self.assertEqual([
+            'supitemgroups',
+            ('mapgroups', True, True),
+            ('mapgroups', True, False),
+        ], user.calls)
+
+    def test_manager(self):
+        """Détection des "managers"."""
+        acl = AclContext(FakeUser(), {}, FakePredicate(True))
+        self.assertTrue(acl.is_manager)
+
+    def test_anonymous(self):
+        """Un utilisateur anonyme n'a accès à rien."""
+        acl = AclContext(None, {}, FakePredicate(True))
+        self.assertFalse(acl.is_manager)
+        self.assertEqual([], acl.supitem_group_ids)
+        self.assertEqual([], acl.mapgroups())
+
+    def test_shared(self):
+        """Les identifiants des groupes sont partagés entre requêtes."""
+        shared = {}
+        user = FakeUser()
+        first = AclContext(user, {}, FakePredicate(False), shared)
+        self.assertEqual([2, 3], first.supitem_group_ids)
+        self.assertEqual([4, 5], first.mapgroups())
+        second = AclContext(user, {}, FakePredicate(False), shared)
+        self.assertEqual([2, 3], second.supitem_group_ids)
+        self.assertEqual([4, 5], second.mapgroups())
+        self.assertEqual([
+            'supitemgroups',
+            ('mapgroups', True, False),
+        ], user.calls)
+        # Les instances ne sont pas partagées.
+        second.mapgroups(only_id=False)
+        second.mapgroups(only_id=False)
+        self.assertEqual(('mapgroups', False, False), user.calls[-1])
+        self.assertEqual(3, len(user.calls))
+
+    def test_cache_key(self):
+        """Les utilisateurs ayant les mêmes droits partagent une empreinte."""
+        first = AclContext(FakeUser(), {}, FakePredicate(False))
+        second = AclContext(FakeUser(), {}, FakePredicate(False))
+        self.assertEqual(first.cache_key, second.cache_key)
+        manager = AclContext(FakeUser(), {}, FakePredicate(True))
+        self.assertEqual('manager', manager.cache_key)
+        other = AclContext(FakeUser(), {}, FakePredicate(False),
+                           {'supitemgroups': [(2, True)]})
+        self.assertNotEqual(first.cache_key, other.cache_key)
+
+
+class TestAclVersion(unittest.TestCase):
+    """Version des droits d'accès partagée entre les processus."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'acl.stamp')
+        config['acl_cache_stamp'] = self.path
+        config['acl_cache_stamp_interval'] = 3600
+        bump_acl_version()
+
+    def tearDown(self):
+        del config['acl_cache_stamp']
+        del config['acl_cache_stamp_interval']
+        shutil.rmtree(self.tmpdir)
+
+    def _write_stamp(self, value):
+        """Simule une modification des droits par un autre processus."""
+        with open(self.path, 'wb') as stamp_file:
+            stamp_file.write(value)
+
+    def test_interval(self):
+        """Le fichier n'est relu qu'après le délai configuré."""
+        version = get_acl_version()
+        self._write_stamp('other')
+        self.assertEqual(version, get_acl_version())
+        config['acl_cache_stamp_interval'] = 0
+        self.assertEqual('other', get_acl_version()[1])
+
+    def test_local_bump(self):
+        """Une modification locale est prise en compte immédiatement."""
+        version = get_acl_version()
+        bump_acl_version()
+        self.assertNotEqual(version, get_acl_version())
+        self.assertEqual(open(self.path, 'rb').read(), get_acl_version()[1])
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Teste les caches en mémoire.
+"""
+import unittest
+
+from vigilo.turbogears.cache import TTLCache
+
+class TestTTLCache(unittest.TestCase):
+    """Cache avec expiration des entrées."""
+
+    def setUp(self):
+        self.now = 1000
+        self.cache = TTLCache(10, maxsize=2, timer=lambda: self.now)
+
+    def test_get_set(self):
+        """Lecture d'une entrée présente ou absente."""
+        self.cache.set('a', 1)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertEqual(None, self.cache.get('b'))
+        self.assertEqual(42, self.cache.get('b', 42))
+
+    def test_expiration(self):
+        """Les entrées expirent au bout de leur durée de vie."""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2, ttl=20)
+        self.now += 10
+        self.assertEqual(None, self.cache.get('a'))
+        self.assertEqual(2, self.cache.get('b'))
+
+    def test_lookup(self):
+        """Les entrées expirées restent accessibles via lookup()."""
+        self.cache.set('a', 1)
+        self.assertEqual((1, True), self.cache.lookup('a'))
+        self.now += 10
+        self.assertEqual((1, False), self.cache.lookup('a'))
+        self.assertEqual((None, False), self.cache.lookup('b'))
+
+    def test_lru(self):
+        """Les entrées les moins récemment utilisées sont évincées."""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertEqual(None, self.cache.get('b'))
+        self.assertEqual(3, self.cache.get('c'))
+
+    def test_invalidate(self):
+        """Invalidation d'une entrée ou de tout le cache."""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.invalidate('a')
+        self.assertEqual(None, self.cache.get('a'))
+        self.assertEqual(2, self.cache.get('b'))
+        self.cache.clear()
+        self.assertEqual(0, len(self.cache))
+
+    def test_weight(self):
+        """Éviction selon le poids total des entrées."""
+        cache = TTLCache(10, weigher=len, maxweight=5)
+        cache.set('a', 'xx')
+        cache.set('b', 'yyy')
+        self.assertEqual(5, cache.weight)
+        cache.set('c', 'z')
+        self.assertEqual(None, cache.get('a'))
+        self.assertEqual('yyy', cache.get('b'))
+        self.assertEqual(4, cache.weight)
+        # Une valeur trop lourde n'est pas stockée.
+        cache.set('d', 'tooheavy')
+        self.assertEqual(None, cache.get('d'))
+        self.assertEqual(4, cache.weight)
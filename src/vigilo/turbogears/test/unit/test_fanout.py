@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Teste l'exécution concurrente de tâches.
+"""
+import time
+import threading
+import unittest
+
+from vigilo.turbogears.fanout import run_concurrently, DeadlineExceeded, \
+    WorkerPool
+
+class TestRunConcurrently(unittest.TestCase):
+    """Exécution concurrente d'un ensemble de tâches."""
+
+    def test_order(self):
+        """Les résultats et les erreurs sont retournés dans l'ordre."""
+        def fail():
+            raise ValueError('boom')
+        def slow():
+            time.sleep(0.05)
+            return 'slow'
+        results = run_concurrently([
+            ('a', slow),
+            ('b', lambda: 'fast'),
+            ('c', fail),
+        ])
+        self.assertEqual(('slow', None), results[0])
+        self.assertEqual(('fast', None), results[1])
+        self.assertEqual(None, results[2][0])
+        self.assertTrue(isinstance(results[2][1], ValueError))
+        self.assertEqual([], run_concurrently([]))
+
+    def test_concurrency(self):
+        """Les tâches s'exécutent en parallèle."""
+        barrier = threading.Event()
+        def wait():
+            return barrier.wait(1)
+        results = run_concurrently([
+            ('a', wait),
+            ('b', barrier.set),
+        ], timeout=2)
+        self.assertEqual((True, None), results[0])
+
+    def test_per_key(self):
+        """Le nombre de tâches simultanées par clé est limité."""
+        lock = threading.Lock()
+        state = {'running': 0, 'max': 0}
+        def task():
+            with lock:
+                state['running'] += 1
+                state['max'] = max(state['max'], state['running'])
+            time.sleep(0.01)
+            with lock:
+                state['running'] -= 1
+        results = run_concurrently([('a', task)] * 10, per_key=2)
+        self.assertEqual([(None, None)] * 10, results)
+        self.assertEqual(2, state['max'])
+
+    def test_deadline(self):
+        """Les tâches non terminées à l'échéance sont abandonnées."""
+        class Response(object):
+            closed = False
+            def close(self):
+                self.closed = True
+        late = Response()
+        event = threading.Event()
+        def slow():
+            event.wait(1)
+            return late
+        start = time.time()
+        results = run_concurrently([
+            ('a', lambda: 'ok'),
+            ('b', slow),
+        ], timeout=0.1)
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual(('ok', None), results[0])
+        self.assertTrue(isinstance(results[1][1], DeadlineExceeded))
+        # Le résultat obtenu après l'échéance est fermé.
+        event.set()
+        for _i in xrange(100):
+            if late.closed:
+                break
+            time.sleep(0.01)
+        self.assertTrue(late.closed)
+
+
+class TestWorkerPool(unittest.TestCase):
+    """Groupe de threads partagé entre plusieurs appels."""
+
+    def setUp(self):
+        self.pool = WorkerPool(max_workers=2, per_key=1)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_threads_reused(self):
+        """Les threads sont conservés d'un appel à l'autre."""
+        threads = set()
+        def task():
+            threads.add(threading.current_thread())
+        for _i in xrange(5):
+            self.assertEqual([(None, None)] * 2,
+                             self.pool.run([('a', task), ('b', task)]))
+        self.assertTrue(len(threads) <= 2)
+        self.assertEqual(2, self.pool._workers)
+
+    def test_per_key_shared(self):
+        """La limite par clé s'applique à l'ensemble des appels."""
+        lock = threading.Lock()
+        state = {'running': 0, 'max': 0}
+        def task():
+            with lock:
+                state['running'] += 1
+                state['max'] = max(state['max'], state['running'])
+            time.sleep(0.01)
+            with lock:
+                state['running'] -= 1
+        callers = [
+            threading.Thread(target=self.pool.run, args=([('a', task)] * 5, ))
+            for _i in xrange(2)
+        ]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join(2)
+        self.assertEqual(1, state['max'])
+
+    def test_deadline_pending(self):
+        """Les tâches non démarrées à l'échéance sont retirées."""
+        event = threading.Event()
+        results = self.pool.run([('a', lambda: event.wait(1))] * 3,
+                                timeout=0.1)
+        event.set()
+        self.assertEqual([], self.pool._pending)
+        for result in results:
+            self.assertTrue(isinstance(result[1], DeadlineExceeded))
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Teste l'arborescence en mémoire des groupes.
+"""
+import unittest
+
+from vigilo.turbogears.grouptree import GroupTree
+
+class TestGroupTree(unittest.TestCase):
+    """Arborescence des groupes."""
+
+    def setUp(self):
+        self.tree = GroupTree([
+            (1, u'Root', u'/Root', None),
+            (2, u'B', u'/Root/B', 1),
+            (3, u'A', u'/Root/A', 1),
+            (4, u'Leaf', u'/Root/A/Leaf', 3),
+            (5, u'Other', u'/Other', None),
+        ])
+
+    def test_hierarchy(self):
+        """Parents, enfants et groupes de premier niveau."""
+        self.assertEqual(5, len(self.tree))
+        self.assertEqual((5, 1), self.tree.top_groups())
+        self.assertEqual((3, 2), self.tree.children(1))
+        self.assertEqual((), self.tree.children(4))
+        self.assertEqual(3, self.tree.parent(4))
+        self.assertEqual(u'/Root/A/Leaf', self.tree.path(4))
+        self.assertEqual(u'Leaf', self.tree.name(4))
+        self.assertFalse(42 in self.tree)
+
+    def test_closure(self):
+        """Ancêtres et descendants."""
+        self.assertEqual((3, 1), self.tree.ancestors(4))
+        self.assertEqual((), self.tree.ancestors(1))
+        self.assertEqual(frozenset([2, 3, 4]), self.tree.descendants(1))
+        self.assertEqual(frozenset(), self.tree.descendants(5))
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Teste l'index en mémoire des noms d'hôtes.
+"""
+import time
+import unittest
+
+from vigilo.turbogears.hostindex import HostIndex, RefreshingIndex
+
+class TestHostIndex(unittest.TestCase):
+    """Recherche dans l'index des noms d'hôtes."""
+
+    def setUp(self):
+        self.index = HostIndex([
+            (u'host', [1]),
+            (u'Hostile', [2]),
+            (u'honte', [1, 3]),
+            (u'hote', []),
+            (u'hopital', [2]),
+            (u'server', [3]),
+        ])
+
+    def test_exact(self):
+        """Recherche exacte, insensible à la casse."""
+        self.assertEqual([u'host'], self.index.search(u'host'))
+        self.assertEqual([u'Hostile'], self.index.search(u'hostile'))
+        self.assertEqual([], self.index.search(u'hos'))
+
+    def test_partial(self):
+        """Recherche par préfixe."""
+        self.assertEqual([u'Hostile', u'host'],
+                         self.index.search(u'hos', partial=True))
+        self.assertEqual(6, len(self.index.search(u'', partial=True)))
+
+    def test_wildcards(self):
+        """Recherche utilisant les jokers '*' et '?'."""
+        self.assertEqual([u'Hostile', u'honte', u'host'],
+                         self.index.search(u'ho?t*'))
+        self.assertEqual([u'server'], self.index.search(u'*v?r'))
+        self.assertEqual([], self.index.search(u'h.*'))
+
+    def test_acl(self):
+        """Filtrage selon les groupes accessibles à l'utilisateur."""
+        self.assertEqual([u'honte', u'host'],
+                         self.index.search(u'ho', True, set([1])))
+        self.assertEqual([], self.index.search(u'ho', True, set()))
+
+
+class TestRefreshingIndex(unittest.TestCase):
+    """Reconstruction périodique d'un index."""
+
+    def _wait_for(self, condition):
+        for _i in xrange(100):
+            if condition():
+                return
+            time.sleep(0.01)
+        self.fail("Timeout")
+
+    def test_refresh(self):
+        """L'index n'est utilisé que s'il est suffisamment récent."""
+        clock = {'now': 0}
+        builds = []
+        def loader():
+            builds.append(clock['now'])
+            return HostIndex([])
+        container = RefreshingIndex(loader, 10, 20, lambda: clock['now'])
+
+        # Pas encore d'index : reconstruction en arrière-plan.
+        self.assertEqual(None, container.get())
+        self._wait_for(lambda: container.get() is not None)
+        self.assertEqual([0], builds)
+
+        # Index à rafraîchir, mais toujours utilisable.
+        clock['now'] = 15
+        self.assertNotEqual(None, container.get())
+        self._wait_for(lambda: len(builds) == 2)
+        self.assertEqual([0, 15], builds)
+
+        # Index trop ancien.
+        clock['now'] = 40
+        self.assertEqual(None, container.get())
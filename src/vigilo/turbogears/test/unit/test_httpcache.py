@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Teste les outils de mise en cache des réponses HTTP.
+"""
+import httplib
+import unittest
+from StringIO import StringIO
+
+from vigilo.turbogears.httpcache import CachedResponse, CachingReader, \
+                                        get_freshness, etag_matches
+
+def make_headers(**headers):
+    raw = ''.join(['%s: %s\r\n' % (k.replace('_', '-'), v)
+                   for k, v in headers.iteritems()])
+    return httplib.HTTPMessage(StringIO(raw))
+
+
+class TestFreshness(unittest.TestCase):
+    """Interprétation des en-têtes de cache du serveur distant."""
+
+    def test_default(self):
+        """Sans directive, la durée de vie par défaut s'applique."""
+        self.assertEqual(60, get_freshness(make_headers(), 60))
+
+    def test_max_age(self):
+        """La directive max-age réduit la durée de vie."""
+        headers = make_headers(Cache_Control='public, max-age=10')
+        self.assertEqual(10, get_freshness(headers, 60))
+        headers = make_headers(Cache_Control='max-age=600')
+        self.assertEqual(60, get_freshness(headers, 60))
+
+    def test_not_cacheable(self):
+        """Réponses ne devant pas être mises en cache."""
+        for headers in (
+                make_headers(Cache_Control='no-store'),
+                make_headers(Cache_Control='private, max-age=60'),
+                make_headers(Set_Cookie='foo=bar'),
+            ):
+            self.assertEqual(None, get_freshness(headers, 60))
+
+    def test_revalidate(self):
+        """Réponses devant être revalidées avant chaque usage."""
+        for headers in (
+                make_headers(Cache_Control='no-cache'),
+                make_headers(Cache_Control='max-age=0'),
+            ):
+            self.assertEqual(0, get_freshness(headers, 60))
+
+
+class TestEtagMatches(unittest.TestCase):
+    """Comparaison des étiquettes d'entités."""
+
+    def test_matches(self):
+        """Correspondances simples, multiples et faibles."""
+        self.assertTrue(etag_matches('"a"', '"a"'))
+        self.assertTrue(etag_matches('"b", "a"', '"a"'))
+        self.assertTrue(etag_matches('W/"a"', '"a"'))
+        self.assertTrue(etag_matches('*', '"a"'))
+        self.assertFalse(etag_matches('"b"', '"a"'))
+        self.assertFalse(etag_matches(None, '"a"'))
+        self.assertFalse(etag_matches('"a"', None))
+
+
+class TestCachingReader(unittest.TestCase):
+    """Copie du corps d'une réponse au fil de sa lecture."""
+
+    def setUp(self):
+        self.stored = []
+
+    def test_complete_read(self):
+        """Le corps est transmis une fois la réponse entièrement lue."""
+        reader = CachingReader(StringIO('abcdef'), 10, self.stored.append)
+        self.assertEqual('abc', reader.read(3))
+        self.assertEqual([], self.stored)
+        self.assertEqual('def', reader.read(3))
+        self.assertEqual('', reader.read(3))
+        self.assertEqual(['abcdef'], self.stored)
+
+    def test_too_large(self):
+        """Un corps trop volumineux n'est pas conservé."""
+        reader = CachingReader(StringIO('abcdef'), 5, self.stored.append)
+        self.assertEqual('abcdef', reader.read())
+        self.assertEqual([], self.stored)
+
+    def test_closed_early(self):
+        """Une réponse fermée avant la fin n'est pas conservée."""
+        reader = CachingReader(StringIO('abcdef'), 10, self.stored.append)
+        reader.read(3)
+        reader.close()
+        self.assertEqual([], self.stored)
+
+
+class TestCachedResponse(unittest.TestCase):
+    """Reconstruction d'une réponse depuis le cache."""
+
+    def test_to_response(self):
+        """La réponse reconstruite est équivalente à l'originale."""
+        headers = make_headers(Content_Type='image/png', ETag='"x"')
+        entry = CachedResponse('http://localhost/a', 200, 'OK',
+                               headers, 'data')
+        self.assertEqual('"x"', entry.etag)
+        self.assertEqual({'If-None-Match': '"x"'},
+                         entry.get_conditional_headers())
+        res = entry.to_response()
+        self.assertEqual(200, res.getcode())
+        self.assertEqual('http://localhost/a', res.geturl())
+        self.assertEqual('image/png', res.info()['Content-Type'])
+        self.assertEqual('data', res.read())
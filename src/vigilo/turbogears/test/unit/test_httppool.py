@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Teste le réservoir de connexions HTTP persistantes.
+"""
+import socket
+import threading
+import unittest
+import urllib2
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+from vigilo.turbogears.httppool import ConnectionPool, PooledHTTPHandler
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """Gestionnaire HTTP/1.1 renvoyant le port client utilisé."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = str(self.client_address[1])
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    """Serveur HTTP capable de gérer plusieurs connexions simultanées."""
+    daemon_threads = True
+
+
+class FakeConnection(object):
+    """Connexion factice, toujours considérée comme ouverte."""
+    def __init__(self):
+        self.sock = None
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class BrokenConnection(FakeConnection):
+    """Connexion au repos que le serveur distant a fermée."""
+    def request(self, *args):
+        raise socket.error('Connection reset by peer')
+
+    @staticmethod
+    def acquire_once(acquire):
+        """Fournit une connexion inutilisable lors du premier appel."""
+        conns = [BrokenConnection()]
+        def wrapper(key):
+            if conns:
+                return conns.pop()
+            return acquire(key)
+        return wrapper
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Gestion des connexions au repos par le réservoir."""
+
+    def setUp(self):
+        self.now = 1000
+        self.pool = ConnectionPool(maxsize=2, idle_timeout=30,
+                                   timer=lambda: self.now)
+
+    def test_release_closed_connection(self):
+        """Une connexion fermée n'est pas conservée."""
+        conn = FakeConnection()
+        self.pool.release('key', conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(None, self.pool.acquire('key'))
+
+    def test_maxsize(self):
+        """Les connexions surnuméraires sont fermées."""
+        conns = [FakeConnection() for _i in xrange(3)]
+        for conn in conns:
+            conn.sock = object()
+            self.pool.release('key', conn)
+        self.assertEqual([False, False, True], [c.closed for c in conns])
+
+    def test_idle_timeout(self):
+        """Les connexions périmées sont fermées."""
+        conn = FakeConnection()
+        conn.sock = object()
+        self.pool.release('key', conn)
+        self.now += 31
+        self.assertEqual(None, self.pool.acquire('key'))
+        self.assertTrue(conn.closed)
+
+    def test_reserve(self):
+        """Le nombre de connexions utilisées par serveur est limité."""
+        self.pool.wait_timeout = 0.1
+        self.assertTrue(self.pool.reserve('key'))
+        self.assertTrue(self.pool.reserve('key'))
+        self.assertFalse(self.pool.reserve('key'))
+        # La limite s'applique à chaque serveur distant.
+        self.assertTrue(self.pool.reserve('other'))
+        self.pool.unreserve('key')
+        self.assertTrue(self.pool.reserve('key'))
+
+    def test_reserve_wait(self):
+        """Une réservation attend qu'une connexion soit libérée."""
+        self.pool.wait_timeout = 5
+        self.pool.reserve('key')
+        self.pool.reserve('key')
+        timer = threading.Timer(0.1, self.pool.unreserve, ('key', ))
+        timer.start()
+        try:
+            self.assertTrue(self.pool.reserve('key'))
+        finally:
+            timer.cancel()
+
+
+class TestPooledHTTPHandler(unittest.TestCase):
+    """Réutilisation des connexions au travers de urllib2."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_port
+        self.pool = ConnectionPool()
+        self.opener = urllib2.build_opener(PooledHTTPHandler(self.pool))
+
+    def tearDown(self):
+        self.pool.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_reused(self):
+        """La connexion est réutilisée une fois la réponse lue."""
+        first = self.opener.open(self.url).read()
+        second = self.opener.open(self.url).read()
+        self.assertEqual(first, second)
+
+    def test_unread_response(self):
+        """Une réponse non lue n'est pas réutilisée."""
+        res = self.opener.open(self.url)
+        second = self.opener.open(self.url).read()
+        self.assertNotEqual(res.read(), second)
+
+    def test_server_closed_connection(self):
+        """Une connexion devenue inutilisable est remplacée."""
+        first = self.opener.open(self.url).read()
+        for conns in self.pool._idle.values():
+            for conn, _last_used in conns:
+                conn.sock.close()
+        second = self.opener.open(self.url).read()
+        self.assertNotEqual(first, second)
+
+    def test_connection_limit(self):
+        """Une réponse en cours de lecture occupe une connexion."""
+        self.pool.maxsize = 1
+        self.pool.wait_timeout = 0.1
+        res = self.opener.open(self.url)
+        self.assertRaises(urllib2.URLError, self.opener.open, self.url)
+        # La connexion est libérée une fois la réponse lue...
+        res.read()
+        res = self.opener.open(self.url)
+        # ... ou fermée.
+        res.close()
+        self.opener.open(self.url).read()
+        self.assertEqual({}, self.pool._in_use)
+
+    def test_no_retry_with_data(self):
+        """Une requête avec données n'est pas réémise."""
+        self.pool.acquire = BrokenConnection.acquire_once(self.pool.acquire)
+        self.assertRaises(urllib2.URLError, self.opener.open,
+                          self.url, 'data')
+        # Une requête sans données est réémise.
+        self.pool.acquire = BrokenConnection.acquire_once(self.pool.acquire)
+        self.opener.open(self.url).read()
+        self.assertEqual({}, self.pool._in_use)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Teste les outils de transmission progressive des documents.
+"""
+import gzip
+import json
+import unittest
+from StringIO import StringIO
+from xml.etree import ElementTree
+
+from vigilo.turbogears.streaming import iter_file, iter_rewrite, \
+                                        StreamRewriter, iter_json_collection, \
+                                        iter_xml_collection
+
+class TestIterFile(unittest.TestCase):
+    """Parcours d'un fichier par blocs."""
+
+    def test_chunks(self):
+        """Découpage en blocs de taille fixe."""
+        fileobj = StringIO('abcdefgh')
+        self.assertEqual(['abc', 'def', 'gh'], list(iter_file(fileobj, 3)))
+        self.assertTrue(fileobj.closed)
+
+    def test_close_on_interrupt(self):
+        """Le fichier est fermé si le parcours est interrompu."""
+        fileobj = StringIO('abcdefgh')
+        chunks = iter_file(fileobj, 3)
+        self.assertEqual('abc', chunks.next())
+        chunks.close()
+        self.assertTrue(fileobj.closed)
+
+
+class TestStreamRewriter(unittest.TestCase):
+    """Réécriture d'un flux de données reçu par blocs."""
+
+    def _rewrite(self, chunks):
+        rewriter = StreamRewriter('/nagios/', '/proxy/nagios/host/')
+        result = ''.join([rewriter.feed(chunk) for chunk in chunks])
+        return result + rewriter.flush()
+
+    def test_single_chunk(self):
+        """Remplacement dans un bloc unique."""
+        self.assertEqual(
+            '<a href="/proxy/nagios/host/a">/proxy/nagios/host/b',
+            self._rewrite(['<a href="/nagios/a">/nagios/b']))
+
+    def test_chunk_boundaries(self):
+        """Remplacement d'occurrences à cheval sur plusieurs blocs."""
+        doc = '<a href="/nagios/cgi-bin/status.cgi">/nagios//nagios/</a>'
+        expected = doc.replace('/nagios/', '/proxy/nagios/host/')
+        for size in xrange(1, len(doc) + 1):
+            chunks = [doc[i:i + size] for i in xrange(0, len(doc), size)]
+            self.assertEqual(expected, self._rewrite(chunks),
+                             "Chunk size: %d" % size)
+
+    def test_partial_match(self):
+        """Un début d'occurrence non complété est conservé."""
+        self.assertEqual('/nagi', self._rewrite(['/na', 'gi']))
+
+
+class TestIterRewrite(unittest.TestCase):
+    """Réécriture d'un fichier lu par blocs."""
+
+    def test_plain(self):
+        """Réécriture d'un contenu non compressé."""
+        doc = 'x/nagios/y' * 100
+        result = ''.join(iter_rewrite(StringIO(doc), '/nagios/', '/p/', 7))
+        self.assertEqual(doc.replace('/nagios/', '/p/'), result)
+
+    def test_gzip(self):
+        """Réécriture d'un contenu compressé avec gzip."""
+        doc = 'x/nagios/y' * 1000
+        compressed = StringIO()
+        gzfile = gzip.GzipFile(fileobj=compressed, mode='wb')
+        gzfile.write(doc)
+        gzfile.close()
+        result = ''.join(iter_rewrite(StringIO(compressed.getvalue()),
+                                      '/nagios/', '/p/', 100, gzipped=True))
+        result = gzip.GzipFile(fileobj=StringIO(result)).read()
+        self.assertEqual(doc.replace('/nagios/', '/p/'), result)
+
+
+class TestCollections(unittest.TestCase):
+    """Sérialisation progressive des collections de l'API."""
+
+    def _items(self, consumed):
+        for i in xrange(3):
+            consumed.append(i)
+            yield {'id': i, 'name': u'h\xf4te<%d>' % i}
+
+    def test_json(self):
+        """Sérialisation au format JSON."""
+        consumed = []
+        chunks = iter_json_collection(
+            'hosts', self._items(consumed),
+            lambda: {'next': len(consumed) == 3 and u'/next' or None}, 1)
+        first = chunks.next()
+        self.assertEqual('{"hosts": [', first)
+        self.assertEqual([], consumed)
+        self.assertEqual({
+            'hosts': [{'id': i, 'name': u'h\xf4te<%d>' % i}
+                      for i in xrange(3)],
+            'next': u'/next',
+        }, json.loads(first + ''.join(chunks)))
+
+    def test_json_empty(self):
+        """Sérialisation d'une liste vide."""
+        self.assertEqual({'maps': []},
+                         json.loads(''.join(iter_json_collection('maps', []))))
+
+    def test_xml(self):
+        """Sérialisation au format XML."""
+        doc = ''.join(iter_xml_collection(
+            'hosts', 'host', self._items([]), lambda: {'next': u'/n?a&b'}))
+        root = ElementTree.fromstring(doc)
+        self.assertEqual('hosts', root.tag)
+        hosts = root.findall('host')
+        self.assertEqual(['0', '1', '2'], [h.get('id') for h in hosts])
+        self.assertEqual(u'h\xf4te<1>', hosts[1].get('name'))
+        self.assertEqual(u'/n?a&b', root.findtext('next'))
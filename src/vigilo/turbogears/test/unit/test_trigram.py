@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Teste la création des index trigrammes de l'auto-compléteur.
+"""
+import unittest
+
+from vigilo.turbogears.trigram import create_trigram_indexes, \
+                                        drop_trigram_indexes
+
+class FakeResult(object):
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class FakeDialect(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeBind(object):
+    def __init__(self, dialect, existing=()):
+        self.dialect = FakeDialect(dialect)
+        self.existing = set(existing)
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        if params is not None:
+            return FakeResult(params['name'] in self.existing or None)
+        self.statements.append(statement)
+        return FakeResult(None)
+
+
+class TestTrigramIndexes(unittest.TestCase):
+    """Index trigrammes."""
+
+    def test_other_dialects(self):
+        """Aucun index n'est créé en dehors de PostgreSQL."""
+        bind = FakeBind('sqlite')
+        self.assertEqual([], create_trigram_indexes(bind))
+        self.assertEqual([], drop_trigram_indexes(bind))
+        self.assertEqual([], bind.statements)
+
+    def test_create(self):
+        """Seuls les index manquants sont créés."""
+        bind = FakeBind('postgresql')
+        created = create_trigram_indexes(bind)
+        self.assertTrue(created)
+        self.assertEqual("CREATE EXTENSION IF NOT EXISTS pg_trgm",
+                         bind.statements[0])
+        self.assertEqual(len(created) + 1, len(bind.statements))
+        for statement in bind.statements[1:]:
+            self.assertTrue("USING gin" in statement)
+            self.assertTrue("gin_trgm_ops" in statement)
+
+        bind = FakeBind('postgresql', created[1:])
+        self.assertEqual(created[:1], create_trigram_indexes(bind))
+
+    def test_drop(self):
+        """Seuls les index existants sont supprimés."""
+        names = create_trigram_indexes(FakeBind('postgresql'))
+        bind = FakeBind('postgresql', names[:2])
+        self.assertEqual(names[:2], drop_trigram_indexes(bind))
+        self.assertEqual(['DROP INDEX "%s"' % name for name in names[:2]],
+                         bind.statements)
@@ -9,6 +9,12 @@ from vigilo.turbogears.controllers.error import ErrorController
 from vigilo.turbogears.controllers.autocomplete import AutoCompleteController
 from vigilo.turbogears.controllers.proxy import ProxyController
 from vigilo.turbogears.controllers.api.root import ApiRootController
+from vigilo.turbogears.controllers.sprox import BaseSproxController
+from vigilo.models.session import DBSession
+from vigilo.models.tables import SupItemGroup
+
+class SupItemGroupAdminController(BaseSproxController):
+    model = SupItemGroup
 
 class RootController(AuthController, SelfMonitoringController):
     error = ErrorController()
@@ -16,3 +22,4 @@ class RootController(AuthController, SelfMonitoringController):
     nagios = ProxyController('nagios', '/nagios/')
     api = ApiRootController()
     custom = CustomController()
+    supitemgroups = SupItemGroupAdminController(DBSession)
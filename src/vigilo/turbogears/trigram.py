@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Index trigrammes (extension pg_trgm de PostgreSQL) utilisés par
+l'auto-compléteur.
+
+Les recherches de l'auto-compléteur utilisent l'opérateur ILIKE.
+Lorsque le motif commence par un joker (ex : "*web*"), un index B-tree
+classique est inutilisable et la table entière est parcourue.
+PostgreSQL sait en revanche exploiter un index GIN "gin_trgm_ops"
+pour ces recherches, sans modification des requêtes : les autres
+bases de données (SQLite, utilisée par les tests) conservent donc
+le même fonctionnement, sans index supplémentaire.
+
+Les index peuvent être créés (ou supprimés) sur une base existante ::
+
+    python -m vigilo.turbogears.trigram url_de_la_base [--drop]
+"""
+
+import sys
+import logging
+
+from vigilo.models.tables import Host, LowLevelService, HighLevelService, \
+                                    SupItemGroup, PerfDataSource, Graph
+
+__all__ = ('create_trigram_indexes', 'drop_trigram_indexes', )
+
+LOGGER = logging.getLogger(__name__)
+
+# Colonnes interrogées par l'auto-compléteur.
+TRIGRAM_COLUMNS = (
+    Host.name,
+    LowLevelService.servicename,
+    HighLevelService.servicename,
+    SupItemGroup.name,
+    PerfDataSource.name,
+    Graph.name,
+)
+
+
+def _get_indexes():
+    """
+    Retourne la liste des index trigrammes à créer,
+    sous la forme de tuples (nom de l'index, table, colonne).
+    """
+    indexes = []
+    for attribute in TRIGRAM_COLUMNS:
+        column = attribute.property.columns[0]
+        table = column.table.name
+        index = (u'ix_%s_%s_trgm' % (table, column.name), table, column.name)
+        # Certaines colonnes sont héritées d'une même table
+        # (ex : les noms des services de bas et de haut niveau).
+        if index not in indexes:
+            indexes.append(index)
+    return indexes
+
+def _index_exists(bind, name):
+    return bind.execute(
+        "SELECT 1 FROM pg_indexes WHERE indexname = %(name)s",
+        {'name': name}).scalar() is not None
+
+def create_trigram_indexes(bind):
+    """
+    Crée l'extension pg_trgm et les index trigrammes utilisés
+    par l'auto-compléteur, s'ils n'existent pas déjà.
+    Cette fonction n'a aucun effet sur les autres bases de données.
+
+    @param bind: Connexion ou moteur SQLAlchemy.
+    @type bind: C{sqlalchemy.engine.base.Connectable}
+    @return: Noms des index créés.
+    @rtype: C{list}
+    """
+    if bind.dialect.name != 'postgresql':
+        return []
+    bind.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    created = []
+    for name, table, column in _get_indexes():
+        if _index_exists(bind, name):
+            continue
+        LOGGER.info("Creating trigram index %s on %s.%s", name, table, column)
+        bind.execute('CREATE INDEX "%s" ON "%s" USING gin ("%s" gin_trgm_ops)'
+                     % (name, table, column))
+        created.append(name)
+    return created
+
+def drop_trigram_indexes(bind):
+    """
+    Supprime les index créés par L{create_trigram_indexes}.
+    L'extension pg_trgm est conservée.
+
+    @param bind: Connexion ou moteur SQLAlchemy.
+    @type bind: C{sqlalchemy.engine.base.Connectable}
+    @return: Noms des index supprimés.
+    @rtype: C{list}
+    """
+    if bind.dialect.name != 'postgresql':
+        return []
+    dropped = []
+    for name, _table, _column in _get_indexes():
+        if not _index_exists(bind, name):
+            continue
+        bind.execute('DROP INDEX "%s"' % name)
+        dropped.append(name)
+    return dropped
+
+def main(args):
+    if not args or args[0].startswith('-'):
+        print >> sys.stderr, "Usage: %s url_de_la_base [--drop]" % sys.argv[0]
+        return 2
+    from vigilo.models.configure import configure_db
+    engine = configure_db({'sqlalchemy.url': args[0]}, 'sqlalchemy.')
+    if '--drop' in args[1:]:
+        names = drop_trigram_indexes(engine)
+    else:
+        names = create_trigram_indexes(engine)
+    for name in names:
+        print name
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))